@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+CRC 评估系统 · 无 Streamlit 依赖的核心逻辑（页面、脚本、后台任务、基准测试共同导入）
+
+稳定接口以本文件导出为准；子模块内的下划线函数属于实现细节。
+"""
+from .indicators import parse_indicator, parse_first_level
+from .cases import CASE_COLUMNS, prepare_cases, read_cases, search_cases, dataset_version
+from .questions import (ERROR_CATS, question_id, make_stem, build_question_from_row, content_hash, stem_to_qid,
+                        QuestionBank, compile_bank)
+from .sampling import StratIndex
+from .exams import generate_exam, generate_exam_cover7
+from .advice import build_paragraph_advice
+from .results import RESULT_FIELDS, detail_row, load_results_csv, rebuild_results_from_runs
+from .store import ResultStore, migrate_files
+from .cohort import CohortStats
+from .mastery import Mastery, project_mastery
+from .export import export_results, iter_runs, iter_answers, prune_exports, runs_path
+from .static_server import StaticServer, publish_asset
+from .jobs import JOB_KINDS, JobRunner, bm25_path, bank_path
+from .spans import span, traced, start_rerun, finish_rerun, SpanSink
+from .profiling import PROFILE_MODES, ProfileTrigger
+from .writer import BackgroundWriter, atomic_write_json
+from .qa import shorten, simple_retrieve, synthesize_answer
+from .retrieval import tokenize, BM25Index
+from .graph import GraphNeighbors, graph_from_cases, export_neighbors, latest_neighbors
+from .graphdb import GraphDB
+from .fulltext import FulltextSearch, lucene_escape
+from .embeddings import OllamaEmbedder, HashingEmbedder, SemanticIndex, fuse_rankings
+from .llm import DEFAULT_MODEL, ChatStream, LLMScheduler, build_prompt
+from .answer_cache import AnswerCache, normalize_question, case_key, answer_key
+from .item_stats import DIFFICULTY_BANDS, ItemStats, AdaptiveTest, update_item_stats
+
+__all__ = [
+    "parse_indicator", "parse_first_level",
+    "CASE_COLUMNS", "prepare_cases", "read_cases", "search_cases", "dataset_version",
+    "ERROR_CATS", "question_id", "make_stem", "build_question_from_row", "content_hash", "stem_to_qid",
+    "QuestionBank", "compile_bank",
+    "StratIndex",
+    "generate_exam", "generate_exam_cover7",
+    "build_paragraph_advice",
+    "RESULT_FIELDS", "detail_row", "load_results_csv", "rebuild_results_from_runs",
+    "ResultStore", "migrate_files", "CohortStats", "Mastery", "project_mastery",
+    "export_results", "iter_runs", "iter_answers", "prune_exports", "runs_path",
+    "StaticServer", "publish_asset",
+    "JOB_KINDS", "JobRunner", "bm25_path", "bank_path",
+    "span", "traced", "start_rerun", "finish_rerun", "SpanSink",
+    "PROFILE_MODES", "ProfileTrigger",
+    "BackgroundWriter", "atomic_write_json",
+    "shorten", "simple_retrieve", "synthesize_answer",
+    "tokenize", "BM25Index",
+    "GraphNeighbors", "graph_from_cases", "export_neighbors", "latest_neighbors",
+    "GraphDB", "FulltextSearch", "lucene_escape",
+    "OllamaEmbedder", "HashingEmbedder", "SemanticIndex", "fuse_rankings",
+    "DEFAULT_MODEL", "ChatStream", "LLMScheduler", "build_prompt",
+    "AnswerCache", "normalize_question", "case_key", "answer_key",
+    "DIFFICULTY_BANDS", "ItemStats", "AdaptiveTest", "update_item_stats",
+]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# 讲评：按本次明细生成总评与薄弱指标段落（HTML 片段，样式类见 streamlit_app.inject_theme_css）
+
+# —— 段落化个性化建议（总评 + 指标段落）——
+def build_paragraph_advice(detail_rows, top_k=3, mastery=None):
+    """mastery：{指标编号: {"attempts","correct","score"}}（core.mastery.Mastery.as_dict），给出时附上累计表现"""
+    ERROR_CATS = ["延后处理","口头代替","越权修改","不留痕或不同步"]
+    total = len(detail_rows)
+    correct = sum(1 for r in detail_rows if r["your_answer"] == r["correct"])
+    score100 = correct * 5
+    wrong_rows = [r for r in detail_rows if r["your_answer"] != r["correct"]]
+
+    cat_count = {c:0 for c in ERROR_CATS}
+    for r in wrong_rows:
+        for c in r.get("error_cats", []):
+            cat_count[c] += 1
+    cat_desc = []
+    if any(cat_count.values()):
+        if cat_count["延后处理"]:
+            cat_desc.append("【延后处理】纠偏不及时，易扩大时间窗/依从性风险。落地做法：为关键窗口与里程碑设置提醒，尽量实现当日闭环。")
+        if cat_count["口头代替"]:
+            cat_desc.append("【口头代替】记录不可追溯。落地做法：所有沟通转化为书面/系统留痕，统一标注日期与责任人。")
+        if cat_count["越权修改"]:
+            cat_desc.append("【越权修改】CRC 代替研究者批注/修改不合规。落地做法：严格执行“研究者复核+签名”，并记录修改原因与日期。")
+        if cat_count["不留痕或不同步"]:
+            cat_desc.append("【不留痕/不同步】纸质与系统不同步。落地做法：双端同步修订并完成版本控制。")
+    cat_text = " ".join(cat_desc) if cat_desc else "本次未见明显共性误区。"
+
+    agg = {}
+    for r in wrong_rows:
+        key = (r.get("indicator_id",""), r.get("indicator_name","未标注指标"))
+        ph = r.get("phase") or "未标注阶段"
+        agg.setdefault(key, {"cnt":0, "phase":{}})
+        agg[key]["cnt"] += 1
+        agg[key]["phase"][ph] = agg[key]["phase"].get(ph,0) + 1
+    top_inds = sorted(agg.items(), key=lambda kv: -kv[1]["cnt"])[:top_k]
+
+    weak_list = "、".join([f"{iid or ''} {iname}".strip() for (iid, iname), _ in top_inds]) or "—"
+    long_text = ""
+    if mastery:
+        leaves = [(i, m) for i, m in mastery.items()
+                  if i.count(".") == 2 and m["attempts"] >= 3 and m["score"] < 0.6]
+        leaves = sorted(leaves, key=lambda x: x[1]["score"])[:top_k]
+        if leaves:
+            long_text = "长期掌握度偏低：<b>" + "、".join(f"{i}（{m['score']:.0%}）" for i, m in leaves) + "</b>。"
+    summary_html = (
+        f"<div class='review-card'>"
+        f"总评：本次答对 <b>{correct}/{total}</b> 题（<b>{score100} 分/100 分</b>）。"
+        f"薄弱能力集中在：<b>{weak_list}</b>。{long_text}{cat_text}"
+        f"</div>"
+    )
+
+    def tips_by_indicator(name: str):
+        if not name:
+            return ["研究者复核签名","纸质与系统同步修订","注明原因与日期","卷宗归档与版本控制"]
+        if ("知情" in name) or ("ICF" in name.upper()):
+            return ["版本一致与签署先后","谈话要点与撤回/再签记录","签字日期与身份核验","纸质/系统一致"]
+        if "样本" in name:
+            return ["采集-处理-保存-运输时间链完整","标签与记录双核对","温控/离心参数留痕","交接与异常说明"]
+        if ("AE" in name.upper()) or ("不良" in name):
+            return ["定义与分级判定","关联性与严重性评估","时限内上报流程","原始依据与记录一致性"]
+        return ["研究者复核签名","纸质与系统同步修订","注明原因与日期","按方案与窗口处理"]
+
+    indicator_html_list = []
+    for (iid, iname), v in top_inds:
+        ph = sorted(v["phase"].items(), key=lambda x: -x[1])[0][0] if v["phase"] else "未标注阶段"
+        tips = "；".join(tips_by_indicator(iname)) + "。"
+        m = (mastery or {}).get(iid)
+        hist = (f"累计作答 {m['attempts']} 题、答对 {m['correct']} 题，掌握度 <b>{m['score']:.0%}</b>。"
+                if m else "")
+        indicator_html_list.append(
+            f"<div class='review-card'>"
+            f"<b>{iid or ''} {iname or '未标注指标'}</b>：本次主要在 <b>{ph}</b> 暴露薄弱。{hist}"
+            f"建议复习路径：到 <b>『案例题库』</b> 中用关键字 “{iname or '相关指标'}” 过滤该阶段的相关案例，先通读再对照 SOP/方案逐项核查；"
+            f"操作训练按以下要点完成：{tips} 完成后再做 10 题专项小测巩固。"
+            f"</div>"
+        )
+
+    return summary_html, indicator_html_list
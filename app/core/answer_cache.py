@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+AI 润色答案缓存：进程内 LRU + SQLite（带过期时间）两级
+
+键 = 规范化问题 + 模型 + 检索到的各案例内容哈希（按检索顺序）。案例内容哈希即"内容寻址的案例编号"：
+被引用的案例一旦改动，哈希随之变化，旧键自然不再命中；数据集其他行的改动不影响已有答案。
+数据集版本作为列记录，过期条目与旧版本条目由 purge 清理。
+预热：统计各用户 qa_log.jsonl 中最常问的问题，把其缓存条目提前载入 LRU；
+库中没有而日志里有成功的 AI 答案（带 key）时，用日志补回 SQLite。
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+
+from .paths import STATS_DIR, USER_DATA_DIR
+
+CACHE_DB = os.path.join(STATS_DIR, "answer_cache.db")
+TTL = 7 * 24 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key      TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    answer   TEXT NOT NULL,
+    model    TEXT,
+    version  TEXT,
+    created  REAL NOT NULL,
+    expires  REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_answers_question ON answers (question);
+CREATE INDEX IF NOT EXISTS ix_answers_expires  ON answers (expires);
+"""
+
+
+def normalize_question(q):
+    """全半角统一、小写、去空白与标点：'V2 访视，心电图缺签名？' 与 'v2访视心电图缺签名' 同键"""
+    s = unicodedata.normalize("NFKC", str(q or "")).lower()
+    return re.sub(r"[\s\W_]+", "", s)
+
+def case_key(row):
+    """案例内容哈希（只含送入提示词的字段），案例改动即变"""
+    s = "||".join(str(getattr(row, c, "") or "") for c in ("案例", "问题", "解决方法", "整改结果", "反思"))
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:12]
+
+def answer_key(question, cases, model):
+    """cases：检索到的案例内容哈希列表（case_key）"""
+    s = "\x1f".join([normalize_question(question), model or "", ",".join(cases)])
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:24]
+
+
+class AnswerCache:
+    def __init__(self, path=CACHE_DB, ttl=TTL, lru_size=512):
+        self.path = path
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self._lru = OrderedDict()  # key → (answer, expires)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = {"memory": 0, "disk": 0, "miss": 0}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.conn() as c:
+            c.executescript(SCHEMA)
+
+    def conn(self):
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def _remember(self, key, answer, expires):
+        with self._lock:
+            self._lru[key] = (answer, expires)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None:
+                if hit[1] > now:
+                    self._lru.move_to_end(key)
+                    self.hits["memory"] += 1
+                    return hit[0]
+                del self._lru[key]
+        row = self.conn().execute("SELECT answer, expires FROM answers WHERE key = ? AND expires > ?",
+                                  (key, now)).fetchone()
+        if row is None:
+            self.hits["miss"] += 1
+            return None
+        self.hits["disk"] += 1
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key, question, answer, model="", version="", created=None):
+        created = created or time.time()
+        expires = created + self.ttl
+        with self.conn() as c:
+            c.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (key, normalize_question(question), answer, model, version, created, expires))
+        if expires > time.time():
+            self._remember(key, answer, expires)
+
+    def purge(self, keep_version=None):
+        """删过期条目；给出 keep_version 时一并删除其他数据集版本的条目；返回删除条数"""
+        with self.conn() as c:
+            n = c.execute("DELETE FROM answers WHERE expires <= ?", (time.time(),)).rowcount
+            if keep_version is not None:
+                n += c.execute("DELETE FROM answers WHERE version != ?", (keep_version,)).rowcount
+        with self._lock:
+            self._lru.clear()
+        return n
+
+    def warm(self, user_data_dir=USER_DATA_DIR, top=100, version=None):
+        """按 qa_log.jsonl 中的提问频次预热；给出 version 时只补回 / 载入该数据集版本的答案。返回载入 LRU 的条目数"""
+        freq, logged = Counter(), {}
+        if os.path.isdir(user_data_dir):
+            for uid in os.listdir(user_data_dir):
+                p = os.path.join(user_data_dir, uid, "qa_log.jsonl")
+                if not os.path.isfile(p):
+                    continue
+                with open(p, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            rec = json.loads(line)
+                        except Exception:
+                            continue
+                        nq = normalize_question(rec.get("q", ""))
+                        if not nq:
+                            continue
+                        freq[nq] += 1
+                        llm = rec.get("llm") or {}
+                        if version is not None and rec.get("version", "") != version:
+                            continue  # 其他数据集版本的答案：只计频次，不补回
+                        if rec.get("key") and llm.get("status") in ("ok", "cache"):
+                            logged[rec["key"]] = (rec.get("q", ""), rec.get("a", ""), llm.get("model", ""),
+                                                  rec.get("version", ""), rec.get("time", ""))
+        if logged:  # 日志里有而库里没有的成功答案：补回（沿用日志时间计算过期）
+            have = set()
+            keys = list(logged)
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                have.update(r[0] for r in self.conn().execute(
+                    f"SELECT key FROM answers WHERE key IN ({','.join('?' * len(part))})", part))
+            for key in keys:
+                if key in have:
+                    continue
+                q, a, model, version, t = logged[key]
+                try:
+                    created = time.mktime(time.strptime(t, "%Y-%m-%d %H:%M:%S"))
+                except Exception:
+                    created = None
+                self.put(key, q, a, model, version, created)
+        n = 0
+        now = time.time()
+        q = "SELECT key, answer, expires FROM answers WHERE question = ? AND expires > ?"
+        args = () if version is None else (version,)
+        if version is not None:
+            q += " AND version = ?"
+        for nq, _ in freq.most_common(top):
+            for key, answer, expires in self.conn().execute(q, (nq, now, *args)):
+                self._remember(key, answer, expires)
+                n += 1
+        return n
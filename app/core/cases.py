@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+# 案例库读取（预建搜索列 _search_blob）
+import hashlib
+import os
+
+import pandas as pd
+
+from .spans import traced
+
+CASE_COLUMNS = ["案例", "能力指标", "试验项目", "试验阶段", "岗位职责", "问题", "解决方法", "整改结果", "反思"]
+
+def prepare_cases(df):
+    """补齐列、统一为字符串并预建搜索列 _search_blob"""
+    need = CASE_COLUMNS
+    for c in need:
+        if c not in df.columns:
+            df[c] = ""
+        df[c] = df[c].fillna("").astype(str)
+    df["_search_blob"] = (df["案例"] + " " + df["能力指标"] + " " + df["试验项目"] + " " + df["试验阶段"] + " " + df["问题"]).str.lower()
+    return df[need + ["_search_blob"]].copy()
+
+def dataset_version(df):
+    """案例库内容指纹（12 位十六进制）：内容不变则不变，派生索引/缓存以此为键"""
+    h = pd.util.hash_pandas_object(df[CASE_COLUMNS], index=False).to_numpy()
+    return hashlib.sha256(h.tobytes()).hexdigest()[:12]
+
+@traced()
+def read_cases(path):
+    if not os.path.exists(path):
+        df = pd.DataFrame({c: [] for c in CASE_COLUMNS})
+        df["_search_blob"] = ""
+        return df[CASE_COLUMNS + ["_search_blob"]].copy()
+    return prepare_cases(pd.read_excel(path))
+
+@traced()
+def search_cases(df, q="", stage=None):
+    """案例题库筛选：阶段精确匹配 + 关键字在 _search_blob 中的包含匹配（大小写不敏感）"""
+    df_view = df
+    if stage:
+        df_view = df_view[df_view["试验阶段"] == stage]
+    if q and q.strip():
+        qs = q.strip().lower()
+        df_view = df_view[df_view["_search_blob"].str.contains(qs, regex=False)]
+    return df_view
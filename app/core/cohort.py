@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+全体学员统计（管理后台）：物化聚合表，随每次交卷在同一事务内增量更新
+
+- agg_user        ：每人测评次数 / 得分率之和 / 最好 / 最近一次
+- agg_score_hist  ：全部测评的得分率分布（0..100 分，按整数分桶）
+- agg_latest_hist ：每人最近一次得分率的分布 → 任一学员的百分位只需扫 101 个桶
+- agg_ind_phase   ：指标 × 试验阶段 的作答数 / 错题数（错误率热力图）
+- agg_question    ：逐题作答数 / 错题数（最常错的题）
+读取只查这些小表，与学员人数、测评次数无关。
+"""
+from collections import Counter
+
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg_user (
+    user_id   TEXT PRIMARY KEY,
+    runs      INTEGER NOT NULL,
+    sum_pct   INTEGER NOT NULL,
+    best_pct  INTEGER NOT NULL,
+    last_pct  INTEGER NOT NULL,
+    last_time TEXT    NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_score_hist  (pct INTEGER PRIMARY KEY, runs  INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS agg_latest_hist (pct INTEGER PRIMARY KEY, users INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS agg_ind_phase (
+    indicator_id   TEXT NOT NULL,
+    phase          TEXT NOT NULL,
+    indicator_name TEXT,
+    attempts       INTEGER NOT NULL,
+    wrong          INTEGER NOT NULL,
+    PRIMARY KEY (indicator_id, phase)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_question (
+    qid          TEXT PRIMARY KEY,
+    indicator_id TEXT,
+    attempts     INTEGER NOT NULL,
+    wrong        INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_agg_question_wrong ON agg_question (wrong);
+"""
+
+AGG_TABLES = ("agg_user", "agg_score_hist", "agg_latest_hist", "agg_ind_phase", "agg_question")
+
+
+def score_pct(score, total):
+    return int(round(100 * score / total)) if total else 0
+
+
+def update_cohort(c, user_id, time, score, total, answers):
+    """写入一次测评后调用（与写入同一事务）；answers: [(qid, indicator_id, indicator_name, phase, is_correct), ...]"""
+    pct = score_pct(score, total)
+    c.execute("INSERT INTO agg_score_hist (pct, runs) VALUES (?, 1) "
+              "ON CONFLICT (pct) DO UPDATE SET runs = runs + 1", (pct,))
+    prev = c.execute("SELECT last_pct, last_time FROM agg_user WHERE user_id = ?", (user_id,)).fetchone()
+    if prev is None:
+        c.execute("INSERT INTO agg_user VALUES (?, 1, ?, ?, ?, ?)", (user_id, pct, pct, pct, time))
+        _bump_latest(c, pct, 1)
+    else:
+        newer = time >= prev[1]
+        c.execute("UPDATE agg_user SET runs = runs + 1, sum_pct = sum_pct + ?, best_pct = max(best_pct, ?)"
+                  + (", last_pct = ?, last_time = ?" if newer else "") + " WHERE user_id = ?",
+                  (pct, pct, pct, time, user_id) if newer else (pct, pct, user_id))
+        if newer and prev[0] != pct:
+            _bump_latest(c, prev[0], -1)
+            _bump_latest(c, pct, 1)
+
+    cell, names, ques = Counter(), {}, Counter()
+    for qid, iid, iname, phase, ok in answers:
+        k = (iid or "", phase or "")
+        cell[k, "n"] += 1
+        cell[k, "w"] += int(not ok)
+        names[k] = iname or ""
+        if qid:
+            ques[qid, iid or "", "n"] += 1
+            ques[qid, iid or "", "w"] += int(not ok)
+    c.executemany(
+        "INSERT INTO agg_ind_phase VALUES (?, ?, ?, ?, ?) ON CONFLICT (indicator_id, phase) "
+        "DO UPDATE SET attempts = attempts + excluded.attempts, wrong = wrong + excluded.wrong",
+        [(iid, ph, names[iid, ph], cell[(iid, ph), "n"], cell[(iid, ph), "w"]) for iid, ph in names])
+    c.executemany(
+        "INSERT INTO agg_question VALUES (?, ?, ?, ?) ON CONFLICT (qid) "
+        "DO UPDATE SET attempts = attempts + excluded.attempts, wrong = wrong + excluded.wrong",
+        [(qid, iid, n, ques[qid, iid, "w"]) for (qid, iid, kind), n in ques.items() if kind == "n"])
+
+
+def _bump_latest(c, pct, d):
+    c.execute("INSERT INTO agg_latest_hist (pct, users) VALUES (?, ?) "
+              "ON CONFLICT (pct) DO UPDATE SET users = users + excluded.users", (pct, d))
+
+
+def rebuild_cohort(c):
+    """由 runs/answers 全量重建聚合表（建表后首次启用、或人工修库后执行一次）"""
+    for t in AGG_TABLES:
+        c.execute(f"DELETE FROM {t}")
+    runs = c.execute("SELECT id, user_id, time, score, total FROM runs ORDER BY id").fetchall()
+    for pk, user_id, time, score, total in runs:
+        answers = c.execute("SELECT qid, indicator_id, indicator_name, phase, is_correct FROM answers WHERE run = ?",
+                            (pk,)).fetchall()
+        update_cohort(c, user_id, time, score, total, answers)
+    return len(runs)
+
+
+class CohortStats:
+    """管理后台读取的全体统计（只读聚合表）"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def overview(self):
+        """学员数 / 测评次数 / 平均得分率"""
+        c = self.store.conn()
+        users = c.execute("SELECT coalesce(sum(users), 0) FROM agg_latest_hist").fetchone()[0]
+        runs, s = c.execute("SELECT coalesce(sum(runs), 0), coalesce(sum(pct * runs), 0) FROM agg_score_hist").fetchone()
+        return {"users": users, "runs": runs, "mean_pct": s / runs if runs else 0.0}
+
+    def score_distribution(self):
+        rows = self.store.conn().execute("SELECT pct, runs FROM agg_score_hist ORDER BY pct").fetchall()
+        return pd.DataFrame([tuple(r) for r in rows], columns=["pct", "runs"])
+
+    def percentile(self, user_id):
+        """该学员最近一次得分率超过了多少比例的学员（0..100）；无记录返回 None"""
+        c = self.store.conn()
+        me = c.execute("SELECT last_pct FROM agg_user WHERE user_id = ?", (user_id,)).fetchone()
+        if me is None:
+            return None
+        below, total = c.execute("SELECT coalesce(sum(CASE WHEN pct < ? THEN users END), 0), sum(users) "
+                                 "FROM agg_latest_hist", (me[0],)).fetchone()
+        return 100.0 * below / total if total else None
+
+    def user_summary(self, user_id):
+        r = self.store.conn().execute("SELECT * FROM agg_user WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(r) if r is not None else None
+
+    def indicator_phase_errors(self):
+        """指标 × 阶段 错误率长表：indicator_id / indicator_name / phase / attempts / wrong / error_rate"""
+        rows = self.store.conn().execute(
+            "SELECT indicator_id, indicator_name, phase, attempts, wrong FROM agg_ind_phase").fetchall()
+        df = pd.DataFrame([tuple(r) for r in rows],
+                          columns=["indicator_id", "indicator_name", "phase", "attempts", "wrong"])
+        df["error_rate"] = df["wrong"] / df["attempts"].where(df["attempts"] > 0)
+        return df
+
+    def most_missed(self, k=10, min_attempts=5):
+        """错误率最高的题（作答数 ≥ min_attempts），按错题数索引取候选后排序"""
+        rows = self.store.conn().execute(
+            "SELECT qid, indicator_id, attempts, wrong FROM agg_question WHERE attempts >= ? "
+            "ORDER BY wrong DESC LIMIT ?", (min_attempts, k * 10)).fetchall()
+        df = pd.DataFrame([tuple(r) for r in rows], columns=["qid", "indicator_id", "attempts", "wrong"])
+        df["error_rate"] = df["wrong"] / df["attempts"]
+        return df.sort_values(["error_rate", "attempts"], ascending=False).head(k).reset_index(drop=True)
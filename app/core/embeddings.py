@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+语义检索（可选）：案例 问题/解决方法/整改结果/反思 → 向量，落盘缓存，NumPy 求 top-k，可与 BM25 融合
+
+- 向量器：本地 Ollama embeddings（OllamaEmbedder）；离线/测试用 HashingEmbedder（字二元组特征哈希，
+  只是词面相似度的替身，不具备语义能力）
+- 缓存：stats/embeddings/<模型>-<内容哈希>.f16（float16 memmap，单位向量）+ <模型>.json（维度、各行的行哈希、
+  当前向量文件名）。按行内容哈希复用：案例库改动后只为新增/改动的行重新计算向量，失效行过多时压缩；
+  每次变化都写出新一代向量文件再原子替换 json，从不原地追加（应用与后台任务可同时同步）；
+  模型维度变化（先用探测文本取维度）时旧缓存整体作废
+- 查询：按存储顺序分块读 memmap 转 float32 做点积（余弦），argpartition 取 top-k
+- 融合：fuse_rankings 用倒数排名融合（RRF），不依赖两路分数的量纲
+
+用法（在 app/ 目录下预先算好向量）：
+    python -m core.embeddings --model nomic-embed-text
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from .paths import DATA_XLSX, STATS_DIR
+from .spans import traced
+
+EMBED_COLUMNS = ["问题", "解决方法", "整改结果", "反思"]
+EMBED_DIR = os.path.join(STATS_DIR, "embeddings")
+
+
+def row_text(row):
+    return "\n".join(str(getattr(row, c, "") or "") for c in EMBED_COLUMNS)
+
+def row_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+def _normalize(v):
+    v = np.asarray(v, dtype=np.float32)
+    n = np.linalg.norm(v, axis=1, keepdims=True)
+    return v / np.where(n > 0, n, 1)
+
+
+# ---------- 向量器 ----------
+class OllamaEmbedder:
+    """本地 Ollama /api/embed；需要 `pip install ollama` 且已 `ollama pull <model>`"""
+
+    def __init__(self, model="nomic-embed-text", batch=64):
+        import ollama  # 可选依赖：未安装时由调用方降级为纯 BM25
+        self.client = ollama
+        self.model = model
+        self.name = f"ollama-{model}"
+        self.batch = batch
+
+    def __call__(self, texts):
+        out = []
+        for i in range(0, len(texts), self.batch):
+            resp = self.client.embed(model=self.model, input=list(texts[i:i + self.batch]))
+            out.extend(resp["embeddings"])
+        return np.asarray(out, dtype=np.float32)
+
+
+class HashingEmbedder:
+    """离线替身：字二元组 → 特征哈希（带符号）；用于无 Ollama 环境下跑通流程与基准"""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def __call__(self, texts):
+        m = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            s = re.sub(r"\s+", "", str(t).lower())
+            for j in range(len(s) - 1):
+                h = int.from_bytes(hashlib.blake2b(s[j:j + 2].encode("utf-8"), digest_size=4).digest(), "little")
+                m[i, h % self.dim] += 1.0 if h & 1 << 31 else -1.0
+        return m
+
+
+# ---------- 向量缓存 + 检索 ----------
+class SemanticIndex:
+    def __init__(self, df_src, embedder, cache_dir=EMBED_DIR, chunk=8192, stale_seconds=600):
+        self.embedder = embedder
+        self.chunk = chunk
+        self.stale_seconds = stale_seconds
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.slug = re.sub(r"[^\w.-]+", "_", embedder.name)
+        self.meta_path = os.path.join(cache_dir, f"{self.slug}.json")
+        self.path = None
+        texts = [row_text(r) for r in df_src.itertuples()]
+        hashes = [row_hash(t) for t in texts]
+        self.embedded = self._sync(texts, hashes)
+        self.size = len(hashes)
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if os.path.getsize(os.path.join(self.cache_dir, meta["file"])) == len(meta["hashes"]) * meta["dim"] * 2:
+                return meta
+        except Exception:
+            pass
+        return {"dim": 0, "hashes": [], "file": None}
+
+    def _probe_dim(self):
+        return int(np.asarray(self.embedder(["维度探测"])).shape[1])
+
+    def _sync(self, texts, hashes):
+        """补算缺失行的向量，有变化时发布新一代向量文件；返回本次新算的行数"""
+        meta = self._load_meta()
+        stored, dim = meta["hashes"], meta["dim"]
+        if stored and self._probe_dim() != dim:  # 模型维度变了：旧缓存整体作废，所有行重算
+            stored, dim = [], 0
+        pos = {h: i for i, h in enumerate(stored)}
+        todo = [i for i, h in enumerate(hashes) if h not in pos]
+        todo = list({hashes[i]: i for i in todo}.values())  # 同内容的行只算一次
+        fresh, vecs = {}, None
+        if todo:
+            vecs = _normalize(self.embedder([texts[i] for i in todo])).astype(np.float16)
+            dim = vecs.shape[1]
+            fresh = {hashes[i]: j for j, i in enumerate(todo)}
+        keep = stored + [hashes[i] for i in todo]
+        if len(set(hashes)) < len(keep) / 2:  # 失效行过半：只保留当前行，压缩重写
+            keep = list(dict.fromkeys(hashes))
+        name = meta["file"]
+        if keep and keep != stored:
+            name = self._publish(keep, dim, meta["file"] if stored else None, pos, vecs, fresh)
+        self.dim = dim
+        self.path = os.path.join(self.cache_dir, name) if keep else None
+        self.mm = np.memmap(self.path, dtype=np.float16, mode="r", shape=(len(keep), dim)) if keep else None
+        kp = {h: i for i, h in enumerate(keep)}
+        self.rows = np.asarray([kp[h] for h in hashes], dtype=np.int64)
+        return len(todo)
+
+    def _publish(self, keep, dim, old_file, old_pos, vecs, fresh):
+        """写出新一代向量文件（按内容命名，不改动旧文件：其他会话 / 后台任务可能正映射着），
+        再原子替换 meta 指向它；应用与 search_index 任务同时同步时各自完整，后写的 meta 生效"""
+        h = hashlib.sha256("\n".join([str(dim)] + keep).encode("utf-8")).hexdigest()[:12]
+        name = f"{self.slug}-{h}.f16"
+        path = os.path.join(self.cache_dir, name)
+        if not os.path.exists(path):
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            new = np.memmap(tmp, dtype=np.float16, mode="w+", shape=(len(keep), dim))
+            if old_file:
+                old = np.memmap(os.path.join(self.cache_dir, old_file), dtype=np.float16, mode="r",
+                                shape=(len(old_pos), dim))
+                if keep[:len(old_pos)] == list(old_pos):  # 只追加：旧行按块原样拷贝
+                    for a in range(0, len(old_pos), self.chunk):
+                        b = min(a + self.chunk, len(old_pos))
+                        new[a:b] = old[a:b]
+                else:
+                    src = [(i, old_pos[x]) for i, x in enumerate(keep) if x in old_pos]
+                    if src:
+                        new[[i for i, _ in src]] = old[[j for _, j in src]]
+                del old
+            if fresh:
+                src = [(i, fresh[x]) for i, x in enumerate(keep) if x in fresh]
+                new[[i for i, _ in src]] = vecs[[j for _, j in src]]
+            new.flush()
+            del new
+            os.replace(tmp, path)
+        self._write_meta({"dim": dim, "hashes": keep, "file": name})
+        self._prune(name)
+        return name
+
+    def _prune(self, current):
+        """删除不再引用的旧代文件；只删足够旧的（别的进程可能刚写完、还没来得及替换 meta）"""
+        now = time.time()
+        for fn in os.listdir(self.cache_dir):
+            if fn == current or not (fn == f"{self.slug}.f16" or (fn.startswith(f"{self.slug}-") and fn.endswith(".f16"))):
+                continue
+            path = os.path.join(self.cache_dir, fn)
+            try:
+                if now - os.path.getmtime(path) > self.stale_seconds:
+                    os.remove(path)
+            except OSError:
+                pass  # Windows 上仍被映射的文件删不掉，下次再试
+
+    def _write_meta(self, meta):
+        tmp = f"{self.meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.meta_path)
+
+    @traced("semantic_search")
+    def search(self, q, k=5):
+        """→ [(行号, 余弦相似度), ...]，按相似度降序"""
+        if self.mm is None or not self.size or not str(q).strip():
+            return []
+        qv = _normalize(self.embedder([q]))[0]
+        # 按存储顺序连续分块算点积（失效行不超过一半），再按行号取出当前各行的分数
+        stored = np.empty(len(self.mm), dtype=np.float32)
+        for a in range(0, len(self.mm), self.chunk):
+            stored[a:a + self.chunk] = self.mm[a:a + self.chunk].astype(np.float32) @ qv
+        scores = stored[self.rows]
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+
+def fuse_rankings(*rankings, k=5, c=60):
+    """倒数排名融合：每路 [(行号, 分数), ...] 按名次记 1/(c+名次)，相加后取前 k → [(行号, 融合分), ...]"""
+    fused = {}
+    for ranking in rankings:
+        for rank, (i, _) in enumerate(ranking, 1):
+            fused[i] = fused.get(i, 0.0) + 1.0 / (c + rank)
+    return sorted(fused.items(), key=lambda x: -x[1])[:k]
+
+
+if __name__ == "__main__":
+    from .cases import read_cases
+
+    ap = argparse.ArgumentParser(description="预计算案例向量（增量）")
+    ap.add_argument("--cases", default=DATA_XLSX)
+    ap.add_argument("--model", default="nomic-embed-text", help="Ollama 向量模型")
+    ap.add_argument("--hashing", action="store_true", help="不用 Ollama，改用离线特征哈希替身")
+    args = ap.parse_args()
+    emb = HashingEmbedder() if args.hashing else OllamaEmbedder(args.model)
+    ix = SemanticIndex(read_cases(args.cases), emb)
+    print(f"{ix.size} 行；本次新算 {ix.embedded} 行 → {ix.path}")
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# 组卷：随机卷 / 覆盖七大一级卷（在 StratIndex 的行号数组上抽样）
+import random
+
+from .questions import build_question_from_row
+from .sampling import StratIndex
+from .spans import traced
+
+def _rows_to_questions(df_src, ids):
+    return [build_question_from_row(r, i) for i, r in enumerate(df_src.iloc[ids].itertuples(), 1)]
+
+@traced()
+def generate_exam(df_src, n=20, seed=None, filter_indicator=None, filter_phase=None,
+                  index=None, weights=None, exact_code=False, band=None, item_stats=None):
+    """
+    随机卷（保留）：可按指标文本/阶段过滤；weights={指标编号/一级: 权重} 时按指标加权抽样；
+    band=(lo, hi) 且给出 item_stats 时只抽答对率落在该区间的题
+    """
+    rng = random.Random(seed if seed is not None else 2025)
+    index = index or StratIndex(df_src)
+    ids = index.candidates(filter_indicator, filter_phase, exact_code=exact_code)
+    if band and item_stats is not None:
+        ids = item_stats.restrict_to_band(index, ids, band, n=n)
+    if weights:
+        picked = index.sample_weighted(ids, n, rng, weights)
+    else:
+        picked = index.sample(ids, n, rng)
+    return _rows_to_questions(df_src, picked)
+
+@traced()
+def generate_exam_cover7(df_src, n=20, seed=None, filter_indicator=None, filter_phase=None, index=None,
+                         band=None, item_stats=None):
+    """
+    “尽量覆盖七大一级指标”的出题器：
+    - 先按能力编号的一级（1/2/3/…）分桶（分桶在 StratIndex 中预先完成）
+    - 均匀轮询各桶抓题，保证题目尽量覆盖到不同一级
+    - 如题量 > 桶数，继续轮询补齐
+    - 可选 band=(lo, hi)：只在该答对率区间内抽题（需 item_stats）
+    """
+    rng = random.Random(seed if seed is not None else 2026)
+    index = index or StratIndex(df_src)
+    ids = index.candidates(filter_indicator, filter_phase)
+    if band and item_stats is not None:
+        ids = item_stats.restrict_to_band(index, ids, band, n=n)
+    return _rows_to_questions(df_src, index.sample_cover(ids, n, rng))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+成绩批量导出（管理员）：全体用户的测评 + 逐题作答 → Parquet / XLSX
+
+- 按用户分块从成绩库读取（每块 chunk_users 人），逐块写出，内存只占一块
+- Parquet：pyarrow.ParquetWriter 逐块追加 row group；作答写 <名>.parquet，测评表另写 <名>.runs.parquet
+- XLSX：openpyxl write-only，"测评" 与 "作答" 两张表；作答超过单表行数上限时续写 "作答_2"…
+- 过滤：起止日期（含当天）、指标编号（含下级，如 '5.2' 包含 '5.2.3'）
+- 清理：prune_exports 只保留最近 keep 份、且不超过 max_age_days 天的导出（管理后台的导出任务每次结束时调用）
+
+用法（在 app/ 目录下）：
+    python -m core.export results.parquet --start 2025-01-01 --indicator 5.2
+    python -m core.export results.xlsx
+"""
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from .paths import EXPORT_DIR, RESULTS_DB
+from .store import ResultStore
+
+RUN_COLS = ["user_id", "run_id", "time", "mode", "score", "total"]
+ANSWER_COLS = ["user_id", "run_id", "time", "idx", "qid", "your_answer", "correct", "is_correct",
+               "indicator_id", "indicator_name", "phase", "error_cats"]
+XLSX_MAX_ROWS = 1_048_575  # 单表行数上限（扣除表头）
+
+
+def _filters(start=None, end=None, indicator=None, alias="r"):
+    where, args = [], []
+    if start:
+        where.append(f"{alias}.time >= ?"); args.append(str(start))
+    if end:
+        where.append(f"{alias}.time < date(?, '+1 day')"); args.append(str(end))
+    if indicator:
+        where.append("(a.indicator_id = ? OR a.indicator_id LIKE ?)"); args += [indicator, f"{indicator}.%"]
+    return where, args
+
+
+def _user_chunks(store, chunk_users, start=None, end=None, indicator=None):
+    where, args = _filters(start, end, indicator)
+    join = " JOIN answers a ON a.run = r.id" if indicator else ""
+    q = f"SELECT DISTINCT r.user_id FROM runs r{join}" + (" WHERE " + " AND ".join(where) if where else "") \
+        + " ORDER BY r.user_id"
+    users = [r[0] for r in store.conn().execute(q, args)]
+    for i in range(0, len(users), chunk_users):
+        yield users[i:i + chunk_users]
+
+
+def iter_runs(store, start=None, end=None, indicator=None, chunk_users=200):
+    """按用户分块 yield 测评表 DataFrame（有指标过滤时只保留含该指标作答的测评）"""
+    for users in _user_chunks(store, chunk_users, start, end, indicator):
+        where, args = _filters(start, end, indicator)
+        where.insert(0, f"r.user_id IN ({','.join('?' * len(users))})")
+        if indicator:
+            where[-1] = f"EXISTS (SELECT 1 FROM answers a WHERE a.run = r.id AND {where[-1]})"
+        rows = store.conn().execute(
+            f"SELECT r.user_id, r.run_id, r.time, r.mode, r.score, r.total FROM runs r WHERE {' AND '.join(where)} "
+            "ORDER BY r.user_id, r.time, r.id", users + args).fetchall()
+        yield pd.DataFrame([tuple(r) for r in rows], columns=RUN_COLS)
+
+
+def iter_answers(store, start=None, end=None, indicator=None, chunk_users=200):
+    """按用户分块 yield 逐题作答 DataFrame"""
+    for users in _user_chunks(store, chunk_users, start, end, indicator):
+        where, args = _filters(start, end, indicator)
+        where.insert(0, f"r.user_id IN ({','.join('?' * len(users))})")
+        rows = store.conn().execute(
+            "SELECT r.user_id, r.run_id, r.time, a.idx, a.qid, a.your_answer, a.correct, a.is_correct, "
+            "a.indicator_id, a.indicator_name, a.phase, a.error_cats "
+            f"FROM runs r JOIN answers a ON a.run = r.id WHERE {' AND '.join(where)} "
+            "ORDER BY r.user_id, r.time, r.id, a.idx", users + args).fetchall()
+        yield pd.DataFrame([tuple(r) for r in rows], columns=ANSWER_COLS)
+
+
+def runs_path(path):
+    """Parquet 导出的测评表路径：results.parquet → results.runs.parquet"""
+    return os.path.splitext(path)[0] + ".runs.parquet"
+
+
+def export_parquet(store, path, start=None, end=None, indicator=None, chunk_users=200):
+    """逐题作答 → path，测评表 → runs_path(path)（每个用户块一个 row group）；返回作答行数"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    run_schema = pa.schema([("user_id", pa.string()), ("run_id", pa.string()), ("time", pa.string()),
+                            ("mode", pa.string()), ("score", pa.int32()), ("total", pa.int32())])
+    tmp = runs_path(path) + ".tmp"
+    with pq.ParquetWriter(tmp, run_schema, compression="zstd") as w:
+        for chunk in iter_runs(store, start, end, indicator, chunk_users):
+            if len(chunk):
+                w.write_table(pa.Table.from_pandas(chunk, schema=run_schema, preserve_index=False))
+    os.replace(tmp, runs_path(path))
+
+    schema = pa.schema([("user_id", pa.string()), ("run_id", pa.string()), ("time", pa.string()),
+                        ("idx", pa.int32()), ("qid", pa.string()), ("your_answer", pa.string()),
+                        ("correct", pa.string()), ("is_correct", pa.int8()), ("indicator_id", pa.string()),
+                        ("indicator_name", pa.string()), ("phase", pa.string()), ("error_cats", pa.string())])
+    n = 0
+    tmp = path + ".tmp"
+    with pq.ParquetWriter(tmp, schema, compression="zstd") as w:
+        for chunk in iter_answers(store, start, end, indicator, chunk_users):
+            if len(chunk):
+                w.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                n += len(chunk)
+    os.replace(tmp, path)
+    return n
+
+
+def export_xlsx(store, path, start=None, end=None, indicator=None, chunk_users=200):
+    """测评表 + 作答表 → XLSX（write-only 流式写出）；返回作答行数"""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("测评")
+    ws.append(["用户", "测评编号", "时间", "模式", "答对题数", "题量"])
+    for chunk in iter_runs(store, start, end, indicator, chunk_users):
+        for row in chunk.itertuples(index=False):
+            ws.append(list(row))
+
+    header = ["用户", "测评编号", "时间", "题号", "题目编号", "作答", "正确答案", "是否正确",
+              "指标编号", "指标名称", "试验阶段", "误区类型"]
+    n, sheet_no, rows_in_sheet = 0, 1, XLSX_MAX_ROWS
+    for chunk in iter_answers(store, start, end, indicator, chunk_users):
+        for row in chunk.itertuples(index=False):
+            if rows_in_sheet >= XLSX_MAX_ROWS:
+                ws = wb.create_sheet("作答" if sheet_no == 1 else f"作答_{sheet_no}")
+                ws.append(header)
+                sheet_no, rows_in_sheet = sheet_no + 1, 0
+            ws.append(list(row))
+            rows_in_sheet += 1
+            n += 1
+    tmp = path + ".tmp"
+    wb.save(tmp)
+    os.replace(tmp, path)
+    return n
+
+
+EXPORTERS = {".parquet": export_parquet, ".xlsx": export_xlsx}
+
+
+def export_results(store, path, **filters):
+    """按扩展名选择格式；返回作答行数"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in EXPORTERS:
+        raise ValueError(f"不支持的导出格式：{ext}（可选 {' / '.join(EXPORTERS)}）")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return EXPORTERS[ext](store, path, **filters)
+
+
+def prune_exports(out_dir=EXPORT_DIR, keep=10, max_age_days=7):
+    """删除旧导出：只保留最近 keep 份且不超过 max_age_days 天（Parquet 的测评表随作答文件一起删）；返回删除的文件数"""
+    try:
+        names = os.listdir(out_dir)
+    except FileNotFoundError:
+        return 0
+    now = time.time()
+    exports = sorted((n for n in names if os.path.splitext(n)[1].lower() in EXPORTERS and not n.endswith(".runs.parquet")),
+                     key=lambda n: os.path.getmtime(os.path.join(out_dir, n)), reverse=True)
+    doomed = []
+    for i, n in enumerate(exports):
+        if i >= keep or now - os.path.getmtime(os.path.join(out_dir, n)) > max_age_days * 86400:
+            doomed += [n, os.path.basename(runs_path(n))]
+    doomed += [n for n in names if n.endswith(".tmp") and now - os.path.getmtime(os.path.join(out_dir, n)) > 86400]
+    removed = 0
+    for n in doomed:
+        try:
+            os.remove(os.path.join(out_dir, n))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="成绩批量导出")
+    ap.add_argument("out", nargs="?", default=os.path.join(EXPORT_DIR, "results.parquet"), help="*.parquet / *.xlsx")
+    ap.add_argument("--db", default=RESULTS_DB)
+    ap.add_argument("--start", default=None, help="起始日期 YYYY-MM-DD")
+    ap.add_argument("--end", default=None, help="截止日期 YYYY-MM-DD（含当天）")
+    ap.add_argument("--indicator", default=None, help="指标编号（含下级）")
+    ap.add_argument("--chunk-users", type=int, default=200)
+    args = ap.parse_args()
+    n = export_results(ResultStore(args.db), args.out, start=args.start, end=args.end,
+                       indicator=args.indicator, chunk_users=args.chunk_users)
+    print(f"已导出 {n} 条作答 → {args.out}" + (f"（测评表 → {runs_path(args.out)}）" if args.out.endswith(".parquet") else ""))
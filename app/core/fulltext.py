@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Neo4j 全文检索下推（可选）：案例题库搜索与问答检索直接查询 scripts/builder.py 建好的全文索引
+
+- 索引：caseText，覆盖 Case.name 与 Problem/Action/Result/Reflection.desc，CJK 分析器（由 builder.py 创建）
+- 一次往返：db.index.fulltext.queryNodes 命中节点 → 沿 出现/采用/产生/形成 归到所属案例（分数累加）
+  → 按阶段过滤、取前 k → 取回案例各字段。返回与案例表同列的行，调用方无需在本进程加载全部案例
+- 连接与结果缓存：core.graphdb.GraphDB（应用内经 st.cache_resource 每进程共享一个）
+"""
+import re
+from collections import namedtuple
+
+import pandas as pd
+
+from .cases import CASE_COLUMNS, prepare_cases
+from .graph import STAGE_MAP
+from .graphdb import GraphDB
+from .spans import traced
+
+FULLTEXT_INDEX = "caseText"  # 与 scripts/builder.py 保持一致
+CaseRow = namedtuple("CaseRow", CASE_COLUMNS)
+_RE_LUCENE = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+_QUERY = """
+CALL db.index.fulltext.queryNodes($index, $q) YIELD node, score
+WITH node, score LIMIT $limit
+OPTIONAL MATCH (c1:Case)-[:`出现`|`形成`]->(node)
+OPTIONAL MATCH (c2:Case)-[:`出现`]->(:Problem)-[:`采用`]->(node)
+OPTIONAL MATCH (c3:Case)-[:`出现`]->(:Problem)-[:`采用`]->(:Action)-[:`产生`]->(node)
+WITH coalesce(CASE WHEN node:Case THEN node END, c1, c2, c3) AS c, score
+WHERE c IS NOT NULL
+WITH c, sum(score) AS score
+OPTIONAL MATCH (c)-[:`处于`]->(s:Stage)
+WITH c, score, head(collect(s.name)) AS stage
+WHERE $stage IS NULL OR stage = $stage
+WITH c, score, stage ORDER BY score DESC LIMIT $k
+OPTIONAL MATCH (c)-[:`出现`]->(p:Problem)
+OPTIONAL MATCH (p)-[:`采用`]->(a:Action)
+OPTIONAL MATCH (a)-[:`产生`]->(r:Result)
+OPTIONAL MATCH (c)-[:`形成`]->(f:Reflection)
+OPTIONAL MATCH (c)-[:`对应`]->(i:Indicator)
+OPTIONAL MATCH (c)-[:`涉及`]->(ro:Role)
+OPTIONAL MATCH (c)-[:`来源`]->(prj:Project)
+RETURN c.name AS 案例, head(collect(DISTINCT coalesce(i.display, i.name))) AS 能力指标,
+       head(collect(DISTINCT prj.name)) AS 试验项目, stage AS 试验阶段, head(collect(DISTINCT ro.name)) AS 岗位职责,
+       head(collect(DISTINCT p.desc)) AS 问题, head(collect(DISTINCT a.desc)) AS 解决方法,
+       head(collect(DISTINCT r.desc)) AS 整改结果, head(collect(DISTINCT f.desc)) AS 反思, score
+ORDER BY score DESC
+"""
+
+
+def lucene_escape(q):
+    """用户输入按字面检索：转义 Lucene 语法字符"""
+    return _RE_LUCENE.sub(r"\\\1", str(q or "").strip())
+
+
+class FulltextSearch:
+    def __init__(self, db, index=FULLTEXT_INDEX):
+        self.db = db  # core.graphdb.GraphDB（连接池 + 结果缓存）
+        self.index = index
+
+    @classmethod
+    def connect(cls, **kw):
+        return cls(GraphDB.connect(**kw))
+
+    @traced("fulltext_search")
+    def search(self, q, k=5, stage=None):
+        """→ [(CaseRow, 分数), ...]，按分数降序；stage 为案例表中的阶段（按 builder 同一规则归一）"""
+        text = lucene_escape(q)
+        if not text:
+            return []
+        if stage:
+            stage = STAGE_MAP.get(stage, stage)
+        params = {"index": self.index, "q": text, "limit": max(k * 10, 50), "stage": stage or None, "k": k}
+        rows = self.db.query(_QUERY, params)
+        return [(CaseRow(*[str(r.get(c) or "") for c in CASE_COLUMNS]), float(r["score"])) for r in rows]
+
+    def search_frame(self, q, stage=None, limit=500):
+        """案例题库用：与 read_cases 同列的 DataFrame（按相关度排序）"""
+        hits = self.search(q, k=limit, stage=stage)
+        return prepare_cases(pd.DataFrame([r for r, _ in hits], columns=CASE_COLUMNS))
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+批量阅卷：答题卡 CSV + 固定试卷 → 向量化评分 → 逐人写入成绩/明细 + 汇总表 + 个性化建议
+
+答题卡（宽表，一行一人）：
+    user_id, paper_id, 1, 2, ..., N      （题号列也可写作 Q1 / 题1；paper_id 列可省略，用 --paper 指定）
+试卷：papers/<paper_id>.json = {"paper_id": ..., "qids": [...]}，可用 paper 子命令生成。
+
+用法（在 app/ 目录下）：
+    python -m core.grading paper --n 20 --seed 7 --id P2025A
+    python -m core.grading grade answers.csv --paper P2025A --out out/
+成绩写入成绩库（core.store），全批共用一个事务。
+"""
+import argparse
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .advice import build_paragraph_advice
+from .cases import read_cases
+from .exams import generate_exam_cover7
+from .paths import DATA_XLSX, PAPERS_DIR
+from .questions import QuestionBank
+from .results import detail_row
+from .sampling import StratIndex
+from .store import ResultStore
+from .writer import atomic_write_json
+
+LETTERS = "ABCD"
+USER_COLS = ["user_id", "账号", "学号", "user"]
+PAPER_COLS = ["paper_id", "试卷", "paper"]
+RE_QCOL = re.compile(r"^\s*(?:Q|q|题)?\s*(\d+)\s*$")
+
+
+# ---------- 试卷 ----------
+def save_paper(paper_id, qids, papers_dir=PAPERS_DIR, **meta):
+    atomic_write_json(os.path.join(papers_dir, f"{paper_id}.json"), {"paper_id": paper_id, "qids": list(qids), **meta})
+
+def load_paper(paper_id, papers_dir=PAPERS_DIR):
+    with open(os.path.join(papers_dir, f"{paper_id}.json"), "r", encoding="utf-8") as f:
+        return json.load(f)["qids"]
+
+
+# ---------- 答题卡 ----------
+def _pick(df, cands):
+    for c in cands:
+        if c in df.columns:
+            return c
+    return None
+
+def answer_codes(frame):
+    """字母答案表 → 整数矩阵（A..D → 0..3，空白/非法 → -1）"""
+    arr = frame.fillna("").astype(str).apply(lambda s: s.str.strip().str.upper().str[:1]).to_numpy()
+    codes = np.full(arr.shape, -1, dtype=np.int8)
+    for k, letter in enumerate(LETTERS):
+        codes[arr == letter] = k
+    return codes
+
+def read_sheet(path, default_paper=None):
+    """读答题卡 → (DataFrame[user_id, paper_id], 题号列名按题号排序)"""
+    sheet = pd.read_csv(path, dtype=str, encoding="utf-8-sig").fillna("")
+    ucol, pcol = _pick(sheet, USER_COLS), _pick(sheet, PAPER_COLS)
+    if not ucol:
+        raise ValueError(f"答题卡缺少用户列（{' / '.join(USER_COLS)}）")
+    sheet = sheet.rename(columns={ucol: "user_id"})
+    if pcol:
+        sheet = sheet.rename(columns={pcol: "paper_id"})
+        if default_paper:
+            sheet.loc[sheet["paper_id"].str.strip() == "", "paper_id"] = default_paper
+    elif default_paper:
+        sheet["paper_id"] = default_paper
+    else:
+        raise ValueError("答题卡没有 paper_id 列时需用 --paper 指定试卷")
+    qcols = sorted((c for c in sheet.columns if RE_QCOL.match(str(c))), key=lambda c: int(RE_QCOL.match(c).group(1)))
+    sheet["user_id"] = sheet["user_id"].str.strip()
+    sheet["paper_id"] = sheet["paper_id"].str.strip()
+    return sheet, qcols
+
+
+# ---------- 评分 ----------
+def pad_codes(codes, n):
+    """作答矩阵补齐到 n 题：答题卡列数少于题量时，缺列视为未作答（-1）"""
+    if codes.shape[1] < n:
+        codes = np.pad(codes, ((0, 0), (0, n - codes.shape[1])), constant_values=-1)
+    return codes
+
+def grade_paper(questions, codes):
+    """codes: 人×题 的作答矩阵 → (对错矩阵, 每人得分)"""
+    key = np.asarray([LETTERS.index(q["answer"]) for q in questions], dtype=np.int8)
+    n = len(questions)
+    codes = pad_codes(codes, n)
+    ok = codes[:, :n] == key
+    return ok, ok.sum(axis=1)
+
+def grade_batch(sheet, qcols, bank, paper_ids=None, papers_dir=PAPERS_DIR):
+    """逐试卷分组向量化评分；返回 [{user_id, paper_id, score, total, detail}, ...]（保持答题卡行序）"""
+    out = []
+    for pid, grp in sheet.groupby("paper_id", sort=False):
+        if paper_ids and pid not in paper_ids:
+            continue
+        questions = bank.paper(load_paper(pid, papers_dir))
+        codes = pad_codes(answer_codes(grp[qcols]), len(questions))  # 评分与明细用同一份补齐后的矩阵
+        ok, scores = grade_paper(questions, codes)
+        for r, uid in enumerate(grp["user_id"].tolist()):
+            detail = [detail_row(q, LETTERS[c] if c >= 0 else None) for q, c in zip(questions, codes[r])]
+            out.append({"row": grp.index[r], "user_id": uid, "paper_id": pid,
+                        "score": int(scores[r]), "total": len(questions), "detail": detail})
+    out.sort(key=lambda x: x["row"])
+    return out
+
+def write_results(graded, out_dir, store=None, mode="BATCH", when=None):
+    """逐人写入成绩库（同人多卷时 run_id 顺延 1 秒避免冲突），并输出 summary.csv / advice.jsonl；store=None 时只出汇总"""
+    when = when or datetime.now()
+    os.makedirs(out_dir, exist_ok=True)
+    used = {}
+    summary = []
+    conn = store.conn() if store else None
+    with open(os.path.join(out_dir, "advice.jsonl"), "w", encoding="utf-8") as adv:
+        for g in graded:
+            uid = g["user_id"]
+            if not uid:
+                continue
+            k = used.get(uid, 0); used[uid] = k + 1
+            t = when + timedelta(seconds=k)
+            run_id = t.strftime("%Y%m%d_%H%M%S")
+            if store:
+                store.add_run(uid, run_id, g["detail"], g["score"], mode=mode, when=t, conn=conn)
+            summary_html, indicator_html_list = build_paragraph_advice(g["detail"])
+            adv.write(json.dumps({"user_id": uid, "paper_id": g["paper_id"], "run_id": run_id,
+                                  "summary_html": summary_html, "indicator_html": indicator_html_list},
+                                 ensure_ascii=False) + "\n")
+            summary.append({"user_id": uid, "paper_id": g["paper_id"], "run_id": run_id,
+                            "score": g["score"], "total": g["total"], "分数": g["score"] * 5})
+    if conn is not None:
+        conn.commit()
+    df_sum = pd.DataFrame(summary, columns=["user_id", "paper_id", "run_id", "score", "total", "分数"])
+    df_sum.to_csv(os.path.join(out_dir, "summary.csv"), index=False, encoding="utf-8-sig")
+    return df_sum
+
+
+# ---------- CLI ----------
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="CRC 能力评估 · 批量阅卷")
+    ap.add_argument("--cases", default=DATA_XLSX, help="案例库 xlsx")
+    ap.add_argument("--papers-dir", default=PAPERS_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    sp = sub.add_parser("paper", help="按覆盖七大一级的规则生成固定试卷")
+    sp.add_argument("--id", dest="paper_id", default=None)
+    sp.add_argument("--n", type=int, default=20)
+    sp.add_argument("--seed", type=int, default=None)
+    sp.add_argument("--indicator", default=None)
+    sp.add_argument("--phase", default=None)
+
+    sg = sub.add_parser("grade", help="批量评分并写入各用户成绩")
+    sg.add_argument("sheet", help="答题卡 CSV")
+    sg.add_argument("--paper", action="append", default=[], help="试卷编号（可多次）；答题卡无 paper_id 列时取第一个")
+    sg.add_argument("--out", default=".", help="summary.csv / advice.jsonl 输出目录")
+    sg.add_argument("--dry-run", action="store_true", help="只输出汇总，不写入成绩库")
+    args = ap.parse_args(argv)
+
+    df = read_cases(args.cases)
+    index = StratIndex(df)
+    bank = QuestionBank(df, index.qids)
+
+    if args.cmd == "paper":
+        qs = generate_exam_cover7(df, n=args.n, seed=args.seed, filter_indicator=args.indicator,
+                                  filter_phase=args.phase, index=index)
+        pid = args.paper_id or "P" + datetime.now().strftime("%Y%m%d_%H%M%S")
+        save_paper(pid, [q["qid"] for q in qs], args.papers_dir, n=len(qs), seed=args.seed,
+                   created=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        print(f"试卷 {pid}：{len(qs)} 题 → {os.path.join(args.papers_dir, pid + '.json')}")
+        return 0
+
+    sheet, qcols = read_sheet(args.sheet, args.paper[0] if args.paper else None)
+    graded = grade_batch(sheet, qcols, bank, set(args.paper) or None, args.papers_dir)
+    df_sum = write_results(graded, args.out, None if args.dry_run else ResultStore())
+    print(f"已评分 {len(df_sum)} 份；平均 {df_sum['分数'].mean() if len(df_sum) else 0:.1f} 分 → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
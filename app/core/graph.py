@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+图谱邻居扩展检索：BM25 / 语义命中的案例，沿知识图谱的 对应（三级指标）/ 处于（阶段）/ 涉及（岗位）
+扩展到"同一指标 / 阶段 / 岗位"的案例，再按 文本分 + 图谱加分 重排
+
+- 邻居集合按图谱版本导出一次：stats/graph/neighbors-<版本>.npz，内容为案例名数组 + 每种关系
+  一个 int32 组号数组（同组即互为邻居，-1 表示未挂该关系）与组名数组；latest.json 指向当前版本
+- 来源：Neo4j（scripts/builder.py 建好的图，需 py2neo）；或直接按 builder 的同一规则由案例表推出
+  （未从 Neo4j 导出过时，应用按当前案例表自动推出，随数据集版本更新）
+- 查询时只做 NumPy 向量运算，不访问 Neo4j
+
+用法（在 app/ 目录下）：
+    python -m core.graph              # 由案例表导出
+    python -m core.graph --neo4j      # 从 Neo4j 导出（NEO4J_URI / NEO4J_USER / NEO4J_PASS / NEO4J_DB）
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from .indicators import parse_indicator
+from .paths import DATA_XLSX, STATS_DIR
+from .spans import traced
+
+GRAPH_DIR = os.path.join(STATS_DIR, "graph")
+# 关系 → (图谱中的关系名, 加分权重)
+RELATIONS = {"indicator": ("对应", 0.5), "role": ("涉及", 0.2), "stage": ("处于", 0.1)}
+RELATION_LABELS = {"indicator": "同指标", "role": "同岗位", "stage": "同阶段"}
+# 与 scripts/builder.py 的阶段归一保持一致
+STAGE_MAP = {"随访阶段": "进行阶段", "结束阶段": "结题阶段", "收尾阶段": "结题阶段"}
+
+
+def _sval(x):
+    return re.sub(r"\s+", " ", str(x or "").strip().replace("　", " "))
+
+def graph_from_cases(df_src):
+    """按 builder.py 的建图规则由案例表推出 {案例名: {关系: 组名}}（只认三级指标）"""
+    out = {}
+    for r in df_src.itertuples():
+        name = _sval(getattr(r, "案例", ""))
+        if not name:
+            continue
+        code, _ = parse_indicator(_sval(getattr(r, "能力指标", "")))
+        stage = _sval(getattr(r, "试验阶段", ""))
+        out[name] = {"indicator": code if code.count(".") == 2 else "",
+                     "stage": STAGE_MAP.get(stage, stage),
+                     "role": _sval(getattr(r, "岗位职责", ""))}
+    return out
+
+def graph_from_neo4j(g):
+    """从 Neo4j 读出 {案例名: {关系: 组名}}；g 为 py2neo.Graph"""
+    out = {}
+    queries = {
+        "indicator": "MATCH (c:Case)-[:`对应`]->(i:Indicator {level:'三级'}) RETURN c.name AS c, i.code AS v",
+        "stage": "MATCH (c:Case)-[:`处于`]->(s:Stage) RETURN c.name AS c, s.name AS v",
+        "role": "MATCH (c:Case)-[:`涉及`]->(ro:Role) RETURN c.name AS c, ro.name AS v",
+    }
+    for name, in g.run("MATCH (c:Case) RETURN c.name"):
+        out[name] = {rel: "" for rel in RELATIONS}
+    for rel, q in queries.items():
+        for row in g.run(q).data():
+            out.setdefault(row["c"], {r: "" for r in RELATIONS})[rel] = row["v"] or ""
+    return out
+
+def export_neighbors(case_links, out_dir=GRAPH_DIR, source="cases"):
+    """{案例名: {关系: 组名}} → npz（内容哈希作图谱版本）；返回 (版本, 路径)；source 记入 latest.json"""
+    names = sorted(case_links)
+    arrays = {"cases": np.asarray(names, dtype=str)}
+    for rel in RELATIONS:
+        vals = [case_links[n].get(rel, "") for n in names]
+        keys = sorted({v for v in vals if v})
+        pos = {k: i for i, k in enumerate(keys)}
+        arrays[f"{rel}_keys"] = np.asarray(keys, dtype=str)
+        arrays[f"{rel}_gid"] = np.asarray([pos.get(v, -1) for v in vals], dtype=np.int32)
+    h = hashlib.sha256()
+    for k in sorted(arrays):
+        h.update(k.encode("utf-8"))
+        h.update(arrays[k].tobytes())
+    version = h.hexdigest()[:12]
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"neighbors-{version}.npz")
+    if not os.path.exists(path):
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+    tmp = os.path.join(out_dir, "latest.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "path": os.path.basename(path), "source": source}, f)
+    os.replace(tmp, os.path.join(out_dir, "latest.json"))
+    return version, path
+
+def latest_neighbors(out_dir=GRAPH_DIR):
+    """当前图谱版本 → (npz 路径, 来源 'neo4j' / 'cases')；未导出过返回 (None, None)"""
+    try:
+        with open(os.path.join(out_dir, "latest.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        path = os.path.join(out_dir, meta["path"])
+        if os.path.exists(path):
+            return path, meta.get("source", "cases")
+    except Exception:
+        pass
+    return None, None
+
+
+class GraphNeighbors:
+    """把导出的组号映射到案例表的行号；expand 对检索结果做图谱扩展与重排"""
+
+    def __init__(self, path, df_src):
+        with np.load(path) as z:
+            arrays = {k: z[k] for k in z.files}
+        self.version = os.path.basename(path)[len("neighbors-"):-len(".npz")]
+        row_of = {n: i for i, n in enumerate(arrays["cases"].tolist())}
+        idx = np.asarray([row_of.get(_sval(n), -1) for n in df_src["案例"].tolist()], dtype=np.int64)
+        self.size = len(idx)
+        self.gid, self.keys = {}, {}
+        for rel in RELATIONS:
+            g = arrays[f"{rel}_gid"]
+            self.gid[rel] = np.where(idx >= 0, g[np.maximum(idx, 0)] if len(g) else -1, -1).astype(np.int32)
+            self.keys[rel] = arrays[f"{rel}_keys"]
+
+    @traced("graph_expand")
+    def expand(self, scored, k=5, seeds=3, alpha=0.5):
+        """scored：[(行号, 分数), ...]（文本检索结果，降序）
+        → ([(行号, 综合分), ...], {行号: ['同指标 5.2.3', ...]})
+        综合分 = 文本分/最高分 + alpha·Σ(种子归一分 × 共享关系权重) / Σ种子归一分，种子为前 seeds 个命中；
+        图谱加分最多 alpha·(0.5+0.2+0.1)，只调整次序、补入强关联案例，不盖过文本相关性"""
+        if not scored or not self.size:
+            return scored[:k], {}
+        top = scored[0][1] or 1.0
+        total = np.zeros(self.size, dtype=np.float32)
+        for i, sc in scored:
+            total[i] += sc / top
+        norm = sum(sc for _, sc in scored[:seeds]) or 1.0
+        for i, sc in scored[:seeds]:
+            w = alpha * sc / norm
+            for rel, (_, weight) in RELATIONS.items():
+                g = self.gid[rel][i]
+                if g >= 0:
+                    total[self.gid[rel] == g] += w * weight
+        k = min(k, int((total > 0).sum()))
+        if k <= 0:
+            return [], {}
+        best = np.argpartition(-total, k - 1)[:k]
+        best = best[np.argsort(-total[best], kind="stable")]
+        lexical = {i for i, _ in scored}
+        via = {}
+        for i in best.tolist():
+            if i in lexical:
+                continue
+            via[i] = [f"{RELATION_LABELS[rel]} {self.keys[rel][self.gid[rel][i]]}"
+                      for rel in RELATIONS
+                      if self.gid[rel][i] >= 0 and any(self.gid[rel][s] == self.gid[rel][i] for s, _ in scored[:seeds])]
+        return [(int(i), float(total[i])) for i in best], via
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="导出图谱邻居集合（按图谱版本）")
+    ap.add_argument("--cases", default=DATA_XLSX)
+    ap.add_argument("--neo4j", action="store_true", help="从 Neo4j 读取（默认按案例表推出）")
+    args = ap.parse_args()
+    if args.neo4j:
+        from py2neo import Graph  # 可选依赖
+        g = Graph(os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+                  auth=(os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASS", "dsm123456")),
+                  name=os.getenv("NEO4J_DB", "neo4j"))
+        links, source = graph_from_neo4j(g), "neo4j"
+    else:
+        from .cases import read_cases
+        links, source = graph_from_cases(read_cases(args.cases)), "cases"
+    version, path = export_neighbors(links, source=source)
+    print(f"{len(links)} 个案例；图谱版本 {version} → {path}")
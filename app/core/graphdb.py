@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Neo4j 访问层（可选，需 py2neo）：一个连接池 + 查询结果缓存（过期时间 + 容量上限 LRU）
+
+- 连接：py2neo.Graph 自带连接池；应用内经 st.cache_resource 每进程共享一个 GraphDB
+- 缓存键 = Cypher 文本 + 参数（JSON，键排序）+ 图谱指纹；图谱改动后指纹变化，旧结果不再命中
+- 图谱指纹 = 节点数 : 关系数（Neo4j 计数存储，O(1)），最多每 fingerprint_ttl 秒取一次；
+  只改属性不改结构的更新由结果的 ttl 兜底
+- query 返回的列表在多个会话间共享，调用方只读不改
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class GraphDB:
+    def __init__(self, graph, ttl=300, maxsize=256, fingerprint_ttl=30):
+        self.graph = graph
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.fingerprint_ttl = fingerprint_ttl
+        self._cache = OrderedDict()  # 键 → (过期时间, 结果)
+        self._fp = (0.0, "")
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @classmethod
+    def connect(cls, uri=None, user=None, password=None, name=None, **kw):
+        """按 visualize.py 同一组环境变量连接；连不上直接抛错"""
+        from py2neo import Graph  # 可选依赖
+        g = Graph(uri or os.getenv("NEO4J_URI", "bolt://localhost:7687"),
+                  auth=(user or os.getenv("NEO4J_USER", "neo4j"), password or os.getenv("NEO4J_PASS", "dsm123456")),
+                  name=name or os.getenv("NEO4J_DB", "neo4j"))
+        g.run("RETURN 1").evaluate()
+        return cls(g, **kw)
+
+    def fingerprint(self):
+        now = time.time()
+        t, fp = self._fp
+        if now - t < self.fingerprint_ttl and fp:
+            return fp
+        n = self.graph.run("MATCH (n) RETURN count(n)").evaluate() or 0
+        r = self.graph.run("MATCH ()-[r]->() RETURN count(r)").evaluate() or 0
+        fp = f"{n}:{r}"
+        self._fp = (now, fp)
+        return fp
+
+    def _key(self, cypher, params):
+        s = json.dumps([cypher, params or {}, self.fingerprint()], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(s.encode("utf-8")).hexdigest()
+
+    def query(self, cypher, params=None, cache=True):
+        """→ [dict, ...]（py2neo Cursor.data()）；cache=False 时直连且不写缓存"""
+        if not cache:
+            return self.graph.run(cypher, params or {}).data()
+        key = self._key(cypher, params)
+        now = time.time()
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None and hit[0] > now:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return hit[1]
+        rows = self.graph.run(cypher, params or {}).data()
+        with self._lock:
+            self.stats["misses"] += 1
+            self._cache[key] = (now + self.ttl, rows)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return rows
+
+    def evaluate(self, cypher, params=None, cache=True):
+        """首行首列；无结果返回 None"""
+        rows = self.query(cypher, params, cache)
+        return next(iter(rows[0].values()), None) if rows else None
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        self._fp = (0.0, "")
+
+    # ---------- 常用图谱查询 ----------
+    def indicators(self, level="三级"):
+        """[{code, name, cases}, ...]：某级指标及其挂载的案例数"""
+        return self.query(
+            "MATCH (i:Indicator {level:$level}) OPTIONAL MATCH (c:Case)-[:`对应`]->(i) "
+            "RETURN i.code AS code, i.name AS name, count(c) AS cases ORDER BY code", {"level": level})
+
+    def indicator_cases(self, code, limit=200):
+        """指标下钻：该指标（含下级）对应的案例及其阶段 / 岗位 / 问题"""
+        return self.query(
+            "MATCH (c:Case)-[:`对应`]->(i:Indicator) WHERE i.code = $code OR i.code STARTS WITH $prefix "
+            "OPTIONAL MATCH (c)-[:`处于`]->(s:Stage) OPTIONAL MATCH (c)-[:`涉及`]->(ro:Role) "
+            "OPTIONAL MATCH (c)-[:`出现`]->(p:Problem) "
+            "RETURN c.name AS 案例, i.name AS 能力指标, head(collect(DISTINCT s.name)) AS 试验阶段, "
+            "head(collect(DISTINCT ro.name)) AS 岗位职责, head(collect(DISTINCT p.desc)) AS 问题 "
+            "ORDER BY 能力指标, 案例 LIMIT $limit", {"code": code, "prefix": code + ".", "limit": limit})
+
+    def related_cases(self, case_name, limit=20):
+        """与某案例共享 指标 / 岗位 / 阶段 的案例，按共享关系数排序"""
+        return self.query(
+            "MATCH (c:Case {name:$name})-[:`对应`|`涉及`|`处于`]->(x)<-[:`对应`|`涉及`|`处于`]-(o:Case) "
+            "WHERE o <> c RETURN o.name AS 案例, collect(DISTINCT coalesce(x.code, x.name)) AS 共享, "
+            "count(DISTINCT x) AS n ORDER BY n DESC, 案例 LIMIT $limit", {"name": case_name, "limit": limit})
+
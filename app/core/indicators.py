@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# 能力指标解析（编号 / 名称 / 一级）
+import re
+
+def parse_indicator(text):
+    """从'能力指标'解析编号和名称，支持多种写法：'5.2.3 XXX' / 'XXX(5.2.3)' / 'XXX'"""
+    t = str(text).strip()
+    if not t: return "", ""
+    m = re.search(r'(\d+(?:\.\d+){0,3})', t)
+    id_ = m.group(1) if m else ""
+    name = re.sub(r'^\s*\d+(?:\.\d+){0,3}\s*[-．。\s]*', '', t)
+    name = re.sub(r'[\(（]\s*\d+(?:\.\d+){0,3}\s*[\)）]', '', name).strip()
+    return id_, name or t
+
+def parse_first_level(id_str: str) -> str:
+    """从 '5.2.3' 取一级 '5'；不合法则返空"""
+    m = re.match(r'^\s*(\d+)', str(id_str).strip())
+    return m.group(1) if m else ""
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+题目统计（难度 / 区分度 / 干扰项选择率）：增量汇总成绩库（core.store）中的全部作答
+
+- 难度 p：答对率（越低越难）
+- 区分度：本题对错 与 该次测评其余题得分率 的点二列相关（只存充分统计量，可增量累加）
+- 干扰项选择率：A/B/C/D 各被选比例（选项顺序由稳定种子决定，同一题字母含义固定）
+
+增量方式：记录已处理的最大 runs.id，每次只读取其后的新测评。
+用法：cd app && python -m core.item_stats
+"""
+import hashlib
+import json
+import math
+import os
+import random
+
+import numpy as np
+
+from .paths import STATS_DIR
+from .store import ResultStore
+
+STATS_PATH = os.path.join(STATS_DIR, "item_stats.npz")
+PICKS = "ABCD"
+
+# 难度档（按答对率 p）
+DIFFICULTY_BANDS = {"易": (0.7, 1.01), "中": (0.4, 0.7), "难": (0.0, 0.4)}
+
+
+class StatTable:
+    """键 → 行号；各统计量为按行对齐的紧凑数组（新键追加时按倍数扩容）"""
+
+    def __init__(self, keys=(), attempts=None, correct=None, picks=None, sums=None):
+        self.keys = list(keys)
+        self.pos = {k: i for i, k in enumerate(self.keys)}
+        n = len(self.keys)
+        cap = max(n, 16)
+        self.attempts = np.zeros(cap, dtype=np.int32)
+        self.correct = np.zeros(cap, dtype=np.int32)
+        self.picks = np.zeros((cap, len(PICKS)), dtype=np.int32)
+        self.sums = np.zeros((cap, 3), dtype=np.float64)  # Σy, Σxy, Σy²（y=其余题得分率）
+        if n:
+            self.attempts[:n] = attempts
+            self.correct[:n] = correct
+            self.picks[:n] = picks
+            self.sums[:n] = sums
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _row(self, key):
+        i = self.pos.get(key)
+        if i is not None:
+            return i
+        i = len(self.keys)
+        if i >= len(self.attempts):
+            cap = 2 * len(self.attempts)
+            self.attempts = np.resize(self.attempts, cap); self.attempts[i:] = 0
+            self.correct = np.resize(self.correct, cap); self.correct[i:] = 0
+            self.picks = np.resize(self.picks, (cap, len(PICKS))); self.picks[i:] = 0
+            self.sums = np.resize(self.sums, (cap, 3)); self.sums[i:] = 0
+        self.keys.append(key)
+        self.pos[key] = i
+        return i
+
+    def add(self, key, letter, ok, rest):
+        i = self._row(key)
+        x = 1.0 if ok else 0.0
+        self.attempts[i] += 1
+        self.correct[i] += int(ok)
+        if letter and letter in PICKS:
+            self.picks[i, PICKS.index(letter)] += 1
+        self.sums[i] += (rest, x * rest, rest * rest)
+
+    # ---------- 派生指标（按 keys 顺序） ----------
+    def _view(self):
+        n = len(self.keys)
+        return self.attempts[:n], self.correct[:n], self.picks[:n], self.sums[:n]
+
+    def difficulty(self):
+        a, c, _, _ = self._view()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(a > 0, c / a, np.nan)
+
+    def discrimination(self):
+        a, c, _, s = self._view()
+        n, sx = a.astype(np.float64), c.astype(np.float64)
+        sy, sxy, syy = s[:, 0], s[:, 1], s[:, 2]
+        num = n * sxy - sx * sy
+        den = np.sqrt((n * sx - sx * sx) * (n * syy - sy * sy))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(den > 0, num / den, np.nan)
+
+    def pick_rates(self):
+        a, _, p, _ = self._view()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(a[:, None] > 0, p / a[:, None], np.nan)
+
+    def to_arrays(self, prefix):
+        a, c, p, s = self._view()
+        return {f"{prefix}_keys": np.asarray(self.keys, dtype=str), f"{prefix}_attempts": a,
+                f"{prefix}_correct": c, f"{prefix}_picks": p, f"{prefix}_sums": s}
+
+    @classmethod
+    def from_arrays(cls, z, prefix):
+        return cls(z[f"{prefix}_keys"].tolist(), z[f"{prefix}_attempts"], z[f"{prefix}_correct"],
+                   z[f"{prefix}_picks"], z[f"{prefix}_sums"])
+
+
+def question_key(row, resolve=None):
+    """明细行 → 题目编号：新记录自带 qid；旧记录用题干反查题库，查不到则用题干哈希"""
+    qid = row.get("qid")
+    if qid:
+        return qid
+    stem = str(row.get("stem", ""))
+    if resolve and stem in resolve:
+        return resolve[stem]
+    return "s:" + hashlib.sha256(stem.encode("utf-8")).hexdigest()[:12]
+
+
+class ItemStats:
+    def __init__(self, items=None, indicators=None, last_pk=0, runs=0):
+        self.items = items or StatTable()
+        self.indicators = indicators or StatTable()
+        self.last_pk = last_pk  # 已处理的最大 runs.id
+        self.runs = runs
+
+    def add_run(self, detail, resolve=None):
+        total = len(detail)
+        if not total:
+            return
+        oks = [r.get("your_answer") == r.get("correct") for r in detail]
+        n_ok = sum(oks)
+        for r, ok in zip(detail, oks):
+            rest = (n_ok - int(ok)) / (total - 1) if total > 1 else 0.0
+            letter = r.get("your_answer")
+            self.items.add(question_key(r, resolve), letter, ok, rest)
+            self.indicators.add(r.get("indicator_id") or "", letter, ok, rest)
+        self.runs += 1
+
+    # ---------- 持久化（原子替换） ----------
+    def save(self, path=STATS_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {**self.items.to_arrays("item"), **self.indicators.to_arrays("ind")}
+        arrays["meta"] = np.asarray(json.dumps({"last_pk": self.last_pk, "runs": self.runs}))
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path=STATS_PATH):
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                meta = json.loads(str(z["meta"]))
+                if "last_pk" not in meta:  # 旧版按文件水位线汇总的结果，与成绩库口径不同：重建
+                    return cls()
+                return cls(StatTable.from_arrays(z, "item"), StatTable.from_arrays(z, "ind"),
+                           meta["last_pk"], meta.get("runs", 0))
+        except Exception:
+            return cls()
+
+    # ---------- 查询 ----------
+    def difficulty_of(self, qids, min_attempts=5):
+        """按 qids 顺序返回答对率；作答次数不足的题为 NaN（视为未校准）"""
+        p = self.items.difficulty()
+        a = self.items.attempts[:len(self.items)]
+        out = np.full(len(qids), np.nan)
+        for j, q in enumerate(qids):
+            i = self.items.pos.get(q)
+            if i is not None and a[i] >= min_attempts:
+                out[j] = p[i]
+        return out
+
+    def restrict_to_band(self, index, ids, band, n=0, min_attempts=5):
+        """
+        在候选行号 ids 中保留答对率落在 band=(lo, hi) 的题；
+        档内题量不足 n 时用未校准的题补足；完全没有校准数据时原样返回。
+        """
+        lo, hi = band
+        p = self.difficulty_of(index.qids[ids], min_attempts)
+        calibrated = ~np.isnan(p)
+        if not calibrated.any():
+            return ids
+        with np.errstate(invalid="ignore"):
+            in_band = ids[calibrated & (p >= lo) & (p < hi)]
+        if len(in_band) < n:
+            in_band = np.sort(np.concatenate([in_band, ids[~calibrated]]))
+        return in_band
+
+    def rasch_b(self, qids, min_attempts=5):
+        """1PL 难度参数 b = logit(1-p)；未校准的题取 0（中等）"""
+        p = np.clip(self.difficulty_of(qids, min_attempts), 0.02, 0.98)
+        return np.where(np.isnan(p), 0.0, np.log((1 - p) / p))
+
+
+def update_item_stats(store=None, path=STATS_PATH, resolve=None, stats=None):
+    """增量更新：只读取 runs.id 大于上次水位线的测评；返回更新后的 ItemStats"""
+    store = store or ResultStore()
+    stats = stats or ItemStats.load(path)
+    changed = False
+    for pk, _, detail in store.runs_since(stats.last_pk):
+        stats.add_run(detail, resolve)
+        stats.last_pk = pk
+        changed = True
+    if changed:
+        stats.save(path)
+    return stats
+
+
+class AdaptiveTest:
+    """
+    1PL（Rasch）自适应测评：每次选 b 最接近当前能力估计 θ 的未作答题（信息量最大），
+    θ 用 N(0,1) 先验的 EAP 估计；标准误 < se_stop（且已答 ≥ min_items）或达到 max_items 即停止。
+    """
+    GRID = np.linspace(-4, 4, 81)
+
+    def __init__(self, qids, b, max_items=20, min_items=5, se_stop=0.45, seed=None):
+        self.qids = list(qids)
+        self.b = np.asarray(b, dtype=np.float64)
+        self.max_items, self.min_items, self.se_stop = max_items, min_items, se_stop
+        self.rng = random.Random(seed)
+        self.asked = []      # 已出题在 qids 中的位置
+        self.responses = []  # 对应对错
+        self.log_post = -0.5 * self.GRID ** 2
+        self.theta, self.se = 0.0, 1.0
+
+    def record(self, qid, ok):
+        j = self.qids.index(qid)
+        p = 1.0 / (1.0 + np.exp(-(self.GRID - self.b[j])))
+        self.log_post += np.log(p if ok else 1 - p)
+        w = np.exp(self.log_post - self.log_post.max()); w /= w.sum()
+        self.theta = float((w * self.GRID).sum())
+        self.se = float(math.sqrt((w * (self.GRID - self.theta) ** 2).sum()))
+        self.asked.append(j)
+        self.responses.append(bool(ok))
+
+    @property
+    def done(self):
+        n = len(self.asked)
+        return n >= min(self.max_items, len(self.qids)) or (n >= self.min_items and self.se < self.se_stop)
+
+    def next_qid(self):
+        if self.done:
+            return None
+        left = np.setdiff1d(np.arange(len(self.qids)), self.asked)
+        gap = np.abs(self.b[left] - self.theta)
+        best = left[gap <= gap.min() + 1e-9]
+        return self.qids[int(self.rng.choice(list(best)))]
+
+
+if __name__ == "__main__":
+    s = update_item_stats()
+    print(f"已汇总 {s.runs} 次测评；题目 {len(s.items)} 道；指标 {len(s.indicators)} 个 → {STATS_PATH}")
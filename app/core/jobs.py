@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务（管理后台触发）：图数据库导入 / 知识图谱页面生成 / 题库预编译 / 检索索引构建 / 成绩批量导出
+
+- 执行：进程池（spawn），不占 Streamlit 会话线程，也不与页面进程抢 GIL
+- 状态：stats/jobs.db（SQLite）记录 排队/运行/完成/失败、进度、当前信息、各步骤耗时与产物；
+  子进程直接写库，页面只读库展示；进程重启时未完成的任务标记为中断
+- 发布：产物先写临时文件再 os.replace，应用的加载函数以数据集版本 / 文件修改时间为缓存键，
+  新产物发布后自然生效，无需重启
+
+同类型、同参数的任务在排队或运行中时不重复提交（参数不同的照常排队，如不同筛选条件的导出）。
+"""
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+from .paths import APP_DIR, DATA_XLSX, EXPORT_DIR, GRAPH_HTML, RESULTS_DB, STATS_DIR
+
+JOBS_DB = os.path.join(STATS_DIR, "jobs.db")
+JOB_KINDS = {
+    "import": "导入图数据库（builder.py）",
+    "graph_html": "生成知识图谱页面（visualize.py）",
+    "question_bank": "预编译题库",
+    "search_index": "构建检索索引",
+    "export": "批量导出成绩",
+}
+BUILDER = os.path.join(os.path.dirname(APP_DIR), "scripts", "builder.py")
+VISUALIZE = os.path.join(APP_DIR, "visualize.py")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind     TEXT NOT NULL,
+    params   TEXT,
+    status   TEXT NOT NULL,          -- queued / running / done / failed
+    progress REAL NOT NULL DEFAULT 0,
+    message  TEXT,
+    created  REAL NOT NULL,
+    started  REAL,
+    finished REAL,
+    result   TEXT,                   -- JSON：steps [[步骤, 秒], ...]、产物路径等
+    error    TEXT
+);
+"""
+
+
+def bm25_path(version):
+    return os.path.join(STATS_DIR, "bm25", f"{version}.npz")
+
+def bank_path(version):
+    return os.path.join(STATS_DIR, "question_bank", f"{version}.db")
+
+def _connect(db_path):
+    c = sqlite3.connect(db_path, timeout=30)
+    c.execute("PRAGMA journal_mode=WAL")
+    return c
+
+
+# ---------- 子进程一侧 ----------
+class _Report:
+    """任务函数的进度回调：report(进度0~1 或 None, 信息)；with report.step(名称): 记录步骤耗时"""
+
+    def __init__(self, conn, job_id):
+        self.conn = conn
+        self.job_id = job_id
+        self.steps = []
+        self._last = 0.0
+
+    def __call__(self, progress=None, message=None, force=False):
+        now = time.time()
+        if not force and now - self._last < 0.5:  # 限频：逐行日志不必每行写库
+            return
+        self._last = now
+        with self.conn:
+            if progress is not None:
+                self.conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (float(progress), self.job_id))
+            if message is not None:
+                self.conn.execute("UPDATE jobs SET message = ? WHERE id = ?", (str(message)[:500], self.job_id))
+
+    @contextmanager
+    def step(self, name, progress=None):
+        self(progress, name, force=True)
+        t = time.perf_counter()
+        yield
+        self.steps.append([name, round(time.perf_counter() - t, 3)])
+
+
+def _run_job(db_path, job_id, kind, params):
+    conn = _connect(db_path)
+    with conn:
+        conn.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), job_id))
+    report = _Report(conn, job_id)
+    try:
+        result = RUNNERS[kind](params, report) or {}
+        result["steps"] = report.steps
+        with conn:
+            conn.execute("UPDATE jobs SET status = 'done', progress = 1, message = '完成', finished = ?, result = ? "
+                         "WHERE id = ?", (time.time(), json.dumps(result, ensure_ascii=False), job_id))
+    except Exception as e:
+        with conn:
+            conn.execute("UPDATE jobs SET status = 'failed', finished = ?, message = ?, error = ?, result = ? WHERE id = ?",
+                         (time.time(), f"{type(e).__name__}: {e}"[:500], traceback.format_exc(),
+                          json.dumps({"steps": report.steps}, ensure_ascii=False), job_id))
+    finally:
+        conn.close()
+
+
+def _run_script(cmd, report, env=None, cwd=None):
+    """运行脚本并把输出逐行作为进度信息；失败时抛出最后 20 行"""
+    tail = deque(maxlen=20)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8",
+                            errors="replace", env=env, cwd=cwd)
+    for line in proc.stdout:
+        line = line.rstrip()
+        if line:
+            tail.append(line)
+            report(None, line)
+    if proc.wait() != 0:
+        raise RuntimeError(f"{os.path.basename(cmd[-1])} 退出码 {proc.returncode}：\n" + "\n".join(tail))
+    return list(tail)
+
+
+def _job_import(params, report):
+    indicators = params.get("indicators") or os.getenv("INDICATOR_XLSX")
+    if not indicators or not os.path.exists(indicators):
+        raise ValueError(f"未找到指标体系表：{indicators or '（未填写）'}")
+    env = dict(os.environ, CASE_XLSX=params.get("cases") or DATA_XLSX, INDICATOR_XLSX=indicators,
+               PYTHONIOENCODING="utf-8")
+    with report.step("builder.py 导入", 0.05):
+        log = _run_script([sys.executable, "-u", BUILDER], report, env=env, cwd=os.path.dirname(BUILDER))
+    out = {"log": log}
+    with report.step("导出图谱邻居集合", 0.9):
+        try:
+            from .graph import export_neighbors, graph_from_neo4j
+            from .graphdb import GraphDB
+            out["graph_version"], out["neighbors"] = export_neighbors(graph_from_neo4j(GraphDB.connect().graph),
+                                                                      source="neo4j")
+        except ImportError:
+            pass
+    return out
+
+
+def _job_graph_html(params, report):
+    from .static_server import publish_asset
+
+    os.makedirs(STATS_DIR, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=STATS_DIR) as tmp:  # 与目标同一文件系统，os.replace 原子
+        with report.step("visualize.py 生成", 0.05):
+            _run_script([sys.executable, "-u", VISUALIZE], report, env=dict(os.environ, PYTHONIOENCODING="utf-8"),
+                        cwd=tmp)
+        out = os.path.join(tmp, "knowledge_graph.html")
+        with open(out, "r", encoding="utf-8") as f:
+            if "节点 0 · 关系 0" in f.read():
+                raise RuntimeError("图数据库无数据或连接失败，未替换现有知识图谱页面")
+        with report.step("发布", 0.9):
+            os.replace(out, GRAPH_HTML)
+            asset = publish_asset(GRAPH_HTML)
+    return {"artifact": GRAPH_HTML, "static": asset}
+
+
+def _job_question_bank(params, report):
+    from .cases import dataset_version, read_cases
+    from .questions import compile_bank
+
+    with report.step("读取案例库", 0.02):
+        df = read_cases(params.get("cases") or DATA_XLSX)
+        version = dataset_version(df)
+    path = bank_path(version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with report.step("编译题目"):
+        n = compile_bank(df, path, progress=lambda p, m: report(0.05 + 0.9 * p, m))
+    return {"version": version, "questions": n, "artifact": path}
+
+
+def _job_search_index(params, report):
+    from .cases import dataset_version, read_cases
+    from .graph import export_neighbors, graph_from_cases, latest_neighbors
+    from .retrieval import BM25Index
+
+    with report.step("读取案例库", 0.02):
+        df = read_cases(params.get("cases") or DATA_XLSX)
+        version = dataset_version(df)
+    out = {"version": version}
+    with report.step("BM25 倒排索引", 0.1):
+        path = bm25_path(version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        BM25Index(df, version=version).save(path)
+        out["bm25"] = path
+    with report.step("图谱邻居集合", 0.5):
+        if latest_neighbors()[1] != "neo4j":  # 已从 Neo4j 导出的以图数据库为准
+            out["graph_version"], out["neighbors"] = export_neighbors(graph_from_cases(df))
+    model = params.get("semantic_model")
+    if model:
+        from .embeddings import OllamaEmbedder, SemanticIndex
+        with report.step(f"语义向量（{model}）", 0.6):
+            out["embedded"] = SemanticIndex(df, OllamaEmbedder(model)).embedded
+    return out
+
+
+def _job_export(params, report):
+    from .export import export_results, prune_exports, runs_path
+    from .store import ResultStore
+
+    fmt = params.get("fmt") or "parquet"
+    path = os.path.join(EXPORT_DIR, f"results_{time.strftime('%Y%m%d_%H%M%S')}.{fmt}")
+    with report.step("导出", 0.02):
+        n = export_results(ResultStore(params.get("db") or RESULTS_DB), path, start=params.get("start"),
+                           end=params.get("end"), indicator=params.get("indicator"))
+    out = {"artifact": path, "rows": n}
+    if fmt == "parquet":
+        out["runs"] = runs_path(path)
+    with report.step("清理旧导出", 0.95):
+        out["pruned"] = prune_exports()
+    return out
+
+
+RUNNERS = {"import": _job_import, "graph_html": _job_graph_html,
+           "question_bank": _job_question_bank, "search_index": _job_search_index, "export": _job_export}
+
+
+# ---------- 页面进程一侧 ----------
+class JobRunner:
+    def __init__(self, db_path=JOBS_DB, workers=1):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with _connect(db_path) as c:
+            c.executescript(SCHEMA)
+            c.execute("UPDATE jobs SET status = 'failed', message = '进程重启，任务中断', finished = ? "
+                      "WHERE status IN ('queued', 'running')", (time.time(),))
+        self.workers = workers
+        self.pool = self._new_pool()
+
+    def _new_pool(self):
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, kind, **params):
+        """提交任务 → 任务号；同类型同参数的任务排队或运行中时返回其任务号"""
+        if kind not in RUNNERS:
+            raise ValueError(f"未知任务类型：{kind}")
+        key = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        with _connect(self.db_path) as c:
+            row = c.execute("SELECT id FROM jobs WHERE kind = ? AND params = ? AND status IN ('queued', 'running')",
+                            (kind, key)).fetchone()
+            if row:
+                return row[0]
+            job_id = c.execute("INSERT INTO jobs (kind, params, status, created) VALUES (?, ?, 'queued', ?)",
+                               (kind, key, time.time())).lastrowid
+        try:
+            fut = self.pool.submit(_run_job, self.db_path, job_id, kind, params)
+        except BrokenProcessPool:  # 之前有子进程异常退出：换一个新进程池
+            self.pool = self._new_pool()
+            fut = self.pool.submit(_run_job, self.db_path, job_id, kind, params)
+        fut.add_done_callback(lambda f, job_id=job_id: self._crashed(job_id, f))
+        return job_id
+
+    def _crashed(self, job_id, fut):
+        """子进程异常退出（任务函数自身的异常已在子进程里记录）"""
+        exc = fut.exception()
+        if exc is None:
+            return
+        with _connect(self.db_path) as c:
+            c.execute("UPDATE jobs SET status = 'failed', finished = ?, message = ? "
+                      "WHERE id = ? AND status IN ('queued', 'running')", (time.time(), f"进程异常：{exc!r}"[:500], job_id))
+
+    def jobs(self, limit=20):
+        """最近的任务（新→旧）：[dict, ...]，result 已解析"""
+        c = _connect(self.db_path)
+        c.row_factory = sqlite3.Row
+        try:
+            rows = [dict(r) for r in c.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,))]
+        finally:
+            c.close()
+        for r in rows:
+            r["result"] = json.loads(r["result"]) if r["result"] else {}
+            r["params"] = json.loads(r["params"]) if r["params"] else {}
+        return rows
+
+    def job(self, job_id):
+        """单个任务（dict，result / params 已解析）；不存在返回 None"""
+        c = _connect(self.db_path)
+        c.row_factory = sqlite3.Row
+        try:
+            row = c.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            c.close()
+        if row is None:
+            return None
+        r = dict(row)
+        r["result"] = json.loads(r["result"]) if r["result"] else {}
+        r["params"] = json.loads(r["params"]) if r["params"] else {}
+        return r
+
+    def active(self):
+        with _connect(self.db_path) as c:
+            return c.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+本地 LLM（Ollama）流式润色：逐段产出文本，首字超时 / 总超时即放弃，由调用方回退到 synthesize_answer
+
+- _Job：一次生成（后台线程读取 ollama.chat(stream=True) 的分段，累积到 pieces，用 Condition 通知读者）
+- LLMScheduler：进程内共享的有界调度器，固定 concurrency 个工作线程按 FIFO 取任务；
+  相同 (模型, 提示词) 的在途请求合并为同一任务；读者全部放弃后，排队中的任务出队、运行中的任务停止；
+  warm_up 启动时预载模型，keep_alive 让模型常驻显存
+- ChatStream：读者一侧；不给 scheduler 时独占一个线程直接生成（旧行为）。
+  首字 / 总超时从任务开始运行时计时，排队时间另由 queue_timeout 限制，排队期间回调 on_queue(位次)
+结束后 stats 给出 status / queued（排队耗时）/ ttft（首字耗时）/ total / tokens / tokens_per_sec，随问答日志记录。
+"""
+import threading
+import time
+from collections import deque
+
+DEFAULT_MODEL = "qwen3:1.7b"
+KEEP_ALIVE = "30m"
+
+
+def build_prompt(question, hits):
+    ctx = "\n\n".join([
+        f"案例：{getattr(h,'案例','')}\n问题：{getattr(h,'问题','')}\n解决方法：{getattr(h,'解决方法','')}\n整改结果：{getattr(h,'整改结果','')}\n反思：{getattr(h,'反思','')}"
+        for h in hits
+    ])
+    return f"基于下列CRC案例材料，请用一个段落给出规范、清晰、可执行的操作建议（不超过120字）：\n\n{ctx}\n\n用户问题：{question}"
+
+
+class _Job:
+    def __init__(self, client, prompt, model, keep_alive=None):
+        self.client = client
+        self.prompt = prompt
+        self.model = model
+        self.keep_alive = keep_alive
+        self.pieces = []
+        self.error = None
+        self.eval = None  # Ollama 末段给出的 (eval_count, eval_duration 纳秒)
+        self.started = None  # 开始运行的 perf_counter 时间；None 表示仍在排队
+        self.done = False
+        self.readers = 0
+        self.stop = threading.Event()
+        self.cond = threading.Condition()
+
+    def run(self):
+        with self.cond:
+            self.started = time.perf_counter()
+            self.cond.notify_all()
+        stream = None
+        try:
+            kw = {"keep_alive": self.keep_alive} if self.keep_alive else {}
+            stream = self.client.chat(model=self.model, messages=[{"role": "user", "content": self.prompt}],
+                                      stream=True, **kw)
+            for chunk in stream:
+                if self.stop.is_set():  # 被叫停：已产出的只是半截，不能当作完整答案
+                    self.error = RuntimeError("stopped")
+                    break
+                piece = (chunk.get("message") or {}).get("content") or ""
+                if chunk.get("done") and chunk.get("eval_count"):
+                    self.eval = (chunk["eval_count"], chunk.get("eval_duration") or 0)
+                if piece:
+                    with self.cond:
+                        self.pieces.append(piece)
+                        self.cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self.cond:
+                self.done = True
+                self.cond.notify_all()
+            close = getattr(stream, "close", None)
+            if self.stop.is_set() and close:
+                try:
+                    close()
+                except Exception:
+                    pass
+
+
+class LLMScheduler:
+    """用法：sched = LLMScheduler(concurrency=2)；ChatStream(prompt, scheduler=sched)"""
+
+    def __init__(self, concurrency=2, client=None, keep_alive=KEEP_ALIVE):
+        if client is None:
+            import ollama  # 可选依赖
+            client = ollama
+        self.client = client
+        self.keep_alive = keep_alive
+        self.concurrency = concurrency
+        self._pending = deque()
+        self._inflight = {}  # (模型, 提示词) → _Job（排队或运行中）
+        self._running = 0
+        self._lock = threading.Condition()
+        self.stats = {"submitted": 0, "deduped": 0, "abandoned": 0}
+        for i in range(concurrency):
+            threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True).start()
+
+    def warm_up(self, model=DEFAULT_MODEL):
+        """后台预载模型（空消息的 chat 只加载模型不生成），不占调度名额"""
+        def _load():
+            try:
+                self.client.chat(model=model, messages=[], keep_alive=self.keep_alive)
+            except Exception:
+                pass
+        threading.Thread(target=_load, daemon=True).start()
+
+    def submit(self, prompt, model=DEFAULT_MODEL):
+        key = (model, prompt)
+        with self._lock:
+            self.stats["submitted"] += 1
+            job = self._inflight.get(key)
+            if job is not None:
+                self.stats["deduped"] += 1
+            else:
+                job = _Job(self.client, prompt, model, self.keep_alive)
+                self._inflight[key] = job
+                self._pending.append(job)
+                self._lock.notify()
+            job.readers += 1
+            return job
+
+    def release(self, job):
+        """读者读完或放弃（超时/出错）；任务未结束且已无其他读者时，撤下排队任务或停止运行中的任务"""
+        with self._lock:
+            job.readers -= 1
+            if job.readers > 0 or job.done:
+                return
+            self.stats["abandoned"] += 1
+            if job.started is None:
+                try:
+                    self._pending.remove(job)
+                except ValueError:
+                    pass
+                self._inflight.pop((job.model, job.prompt), None)
+            else:
+                job.stop.set()
+                # 马上撤下：同一提示词的新请求另起任务，不再合并到这个半截就停的任务上
+                if self._inflight.get((job.model, job.prompt)) is job:
+                    del self._inflight[(job.model, job.prompt)]
+
+    def position(self, job):
+        """排队位次：0 表示已在运行（或已结束），n 表示前面还有 n-1 个任务"""
+        with self._lock:
+            try:
+                return self._pending.index(job) + 1
+            except ValueError:
+                return 0
+
+    def load(self):
+        with self._lock:
+            return {"running": self._running, "queued": len(self._pending), "concurrency": self.concurrency}
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._lock.wait()
+                job = self._pending.popleft()
+                self._running += 1
+            try:
+                job.run()
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    if self._inflight.get((job.model, job.prompt)) is job:  # 可能已被 release 撤下并由新任务顶替
+                        del self._inflight[(job.model, job.prompt)]
+
+
+class ChatStream:
+    """用法：for piece in ChatStream(prompt): ...；迭代结束后看 .ok / .text / .stats"""
+
+    def __init__(self, prompt, model=DEFAULT_MODEL, first_token_timeout=8.0, total_timeout=30.0, client=None,
+                 scheduler=None, queue_timeout=60.0, on_queue=None):
+        self.model = model
+        self.first_token_timeout = first_token_timeout
+        self.total_timeout = total_timeout
+        self.queue_timeout = queue_timeout
+        self.on_queue = on_queue
+        self.scheduler = scheduler
+        self.text = ""
+        self._released = False
+        self.stats = {"model": model, "status": "running", "queued": None, "ttft": None, "total": None,
+                      "tokens": 0, "tokens_per_sec": None}
+        self._t0 = time.perf_counter()
+        if scheduler is not None:
+            self._job = scheduler.submit(prompt, model)
+        else:
+            if client is None:
+                import ollama  # 可选依赖
+                client = ollama
+            self._job = _Job(client, prompt, model)
+            self._job.readers = 1
+            threading.Thread(target=self._job.run, daemon=True).start()
+
+    @property
+    def ok(self):
+        return self.stats["status"] == "ok" and bool(self.text.strip())
+
+    def _wait_turn(self):
+        """排队等待运行；超时返回 False"""
+        job = self._job
+        last = None
+        while True:
+            with job.cond:
+                if job.started is not None or job.done:
+                    return True
+            waited = time.perf_counter() - self._t0
+            if waited >= self.queue_timeout:
+                return False
+            if self.on_queue is not None and self.scheduler is not None:
+                pos = self.scheduler.position(job)
+                if pos and pos != last:
+                    self.on_queue(pos)
+                    last = pos
+            with job.cond:
+                if job.started is None and not job.done:
+                    job.cond.wait(timeout=min(0.5, self.queue_timeout - waited))
+
+    def __iter__(self):
+        try:
+            yield from self._pieces()
+        finally:  # 读者中途离开（st.stop / st.rerun 抛出的异常、生成器被 close）也要归还名额
+            self._release()
+
+    def _pieces(self):
+        job = self._job
+        if not self._wait_turn():
+            return self._finish("queue_timeout")
+        t_run = job.started if job.started is not None else time.perf_counter()
+        self.stats["queued"] = round(max(t_run - self._t0, 0.0), 3)  # 合并到已在运行的任务时为 0
+        i = 0
+        while True:
+            with job.cond:
+                elapsed = time.perf_counter() - t_run
+                if self.stats["ttft"] is None:
+                    budget = min(self.first_token_timeout, self.total_timeout) - elapsed
+                    timeout_status = "first_token_timeout"
+                else:
+                    budget = self.total_timeout - elapsed
+                    timeout_status = "total_timeout"
+                if i >= len(job.pieces) and not job.done:
+                    if budget <= 0:
+                        return self._finish(timeout_status)
+                    job.cond.wait(timeout=budget)
+                new = job.pieces[i:]
+                finished = job.done
+            i += len(new)
+            for piece in new:
+                if self.stats["ttft"] is None:
+                    self.stats["ttft"] = round(time.perf_counter() - t_run, 3)
+                self.stats["tokens"] += 1
+                self.text += piece
+                yield piece
+            if finished and i >= len(job.pieces):
+                if job.error is not None:
+                    self.stats["error"] = repr(job.error)
+                    return self._finish("error")
+                return self._finish("ok")
+
+    def _release(self):
+        """归还调度器名额 / 停止独占的生成线程；只做一次（_finish 与 __iter__ 的 finally 都会调用）"""
+        if self._released:
+            return
+        self._released = True
+        if self.scheduler is not None:
+            self.scheduler.release(self._job)
+        elif not self._job.done:  # 没读完就离开（超时 / 中途退出）：不再让线程继续生成
+            self._job.stop.set()
+
+    def _finish(self, status):
+        job = self._job
+        self._release()
+        total = time.perf_counter() - self._t0
+        st = self.stats
+        st["status"] = status
+        st["total"] = round(total, 3)
+        t_run = st["queued"] or 0
+        if job.eval and job.eval[1] and status == "ok":
+            st["tokens"] = job.eval[0]
+            st["tokens_per_sec"] = round(job.eval[0] / (job.eval[1] / 1e9), 1)
+        elif st["tokens"] and st["ttft"] is not None and total - t_run > st["ttft"]:
+            st["tokens_per_sec"] = round(st["tokens"] / (total - t_run - st["ttft"]), 1)
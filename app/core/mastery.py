@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+个人指标掌握度：每人一张按指标树（'5' / '5.2' / '5.2.3'）展开的小表，随每次交卷在同一事务内增量更新
+
+- attempts / correct：累计作答 / 答对
+- score：指数衰减的答对率，每作答一题 s ← (1-α)·s + α·对错（近期表现权重更高）；首次作答取本次答对率
+每次交卷只更新本次涉及的指标及其上级，O(题量 × 层级)；讲评、专项再练、管理后台直接读取，不再回扫历史测评。
+"""
+from collections import defaultdict
+
+import pandas as pd
+
+ALPHA = 0.2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mastery (
+    user_id        TEXT    NOT NULL,
+    indicator_id   TEXT    NOT NULL,
+    level          INTEGER NOT NULL,
+    indicator_name TEXT,
+    attempts       INTEGER NOT NULL,
+    correct        INTEGER NOT NULL,
+    score          REAL    NOT NULL,
+    updated        TEXT,
+    PRIMARY KEY (user_id, indicator_id)
+) WITHOUT ROWID;
+"""
+
+
+def indicator_path(iid):
+    """'5.2.3' → ['5', '5.2', '5.2.3']；未标注指标记作 ''"""
+    parts = [p for p in str(iid or "").split(".") if p]
+    return [".".join(parts[:i]) for i in range(1, len(parts) + 1)] or [""]
+
+
+def _tally(answers):
+    """一次测评 → {指标节点: [作答, 答对, 名称]}（逐级计入上级指标）"""
+    tally = defaultdict(lambda: [0, 0, ""])
+    for iid, iname, ok in answers:
+        path = indicator_path(iid)
+        for node in path:
+            t = tally[node]
+            t[0] += 1
+            t[1] += int(bool(ok))
+        tally[path[-1]][2] = iname or ""
+    return tally
+
+def _blend(old, n, k):
+    """旧掌握度（None 表示首次）计入本次 n 题答对 k 题"""
+    if old is None:
+        return k / n
+    keep = (1 - ALPHA) ** n
+    return keep * old + (1 - keep) * (k / n)
+
+def project_mastery(current, answers):
+    """{指标: {"attempts","correct","score"}}（Mastery.as_dict）计入一次尚未落盘的测评 → 新的同格式字典；
+    交卷后立即出讲评用，不必等写线程提交"""
+    out = {i: dict(m) for i, m in current.items()}
+    for node, (n, k, _) in _tally(answers).items():
+        m = out.get(node)
+        out[node] = {"attempts": (m["attempts"] if m else 0) + n, "correct": (m["correct"] if m else 0) + k,
+                     "score": _blend(m["score"] if m else None, n, k)}
+    return out
+
+def update_mastery(c, user_id, time, answers):
+    """answers: [(indicator_id, indicator_name, is_correct), ...]（一次测评）"""
+    tally = _tally(answers)
+    if not tally:
+        return
+    nodes = list(tally)
+    old = {r[0]: r[1] for r in c.execute(
+        f"SELECT indicator_id, score FROM mastery WHERE user_id = ? AND indicator_id IN ({','.join('?' * len(nodes))})",
+        [user_id, *nodes])}
+    rows = []
+    for node, (n, k, name) in tally.items():
+        rows.append((user_id, node, node.count(".") + 1 if node else 0, name, n, k, _blend(old.get(node), n, k), time))
+    c.executemany(
+        "INSERT INTO mastery VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (user_id, indicator_id) DO UPDATE SET "
+        "attempts = attempts + excluded.attempts, correct = correct + excluded.correct, score = excluded.score, "
+        "updated = excluded.updated, indicator_name = coalesce(nullif(excluded.indicator_name, ''), indicator_name)",
+        rows)
+
+
+def rebuild_mastery(c):
+    """按时间顺序由 runs/answers 全量重建（首次启用时执行一次）"""
+    c.execute("DELETE FROM mastery")
+    runs = c.execute("SELECT id, user_id, time FROM runs ORDER BY time, id").fetchall()
+    for pk, user_id, time in runs:
+        update_mastery(c, user_id, time, c.execute(
+            "SELECT indicator_id, indicator_name, is_correct FROM answers WHERE run = ?", (pk,)).fetchall())
+    return len(runs)
+
+
+class Mastery:
+    """读取个人掌握度（只读 mastery 表）"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def vector(self, user_id, level=None):
+        """indicator_id / level / indicator_name / attempts / correct / accuracy / score，按编号排序"""
+        q = "SELECT indicator_id, level, indicator_name, attempts, correct, score FROM mastery WHERE user_id = ?"
+        args = [user_id]
+        if level is not None:
+            q += " AND level = ?"
+            args.append(level)
+        rows = self.store.conn().execute(q, args).fetchall()
+        df = pd.DataFrame([tuple(r) for r in rows],
+                          columns=["indicator_id", "level", "indicator_name", "attempts", "correct", "score"])
+        df["accuracy"] = df["correct"] / df["attempts"].where(df["attempts"] > 0)
+        return df.sort_values("indicator_id").reset_index(drop=True)
+
+    def as_dict(self, user_id):
+        """{indicator_id: {"attempts", "correct", "score"}}（讲评用）"""
+        return {r.indicator_id: {"attempts": r.attempts, "correct": r.correct, "score": r.score}
+                for r in self.vector(user_id).itertuples()}
+
+    def weakest(self, user_id, k=3, min_attempts=2):
+        """掌握度最低的末级指标 [(indicator_id, indicator_name, score), ...]"""
+        df = self.vector(user_id)
+        df = df[(df["indicator_id"] != "") & (df["attempts"] >= min_attempts)]
+        df = df[~df["indicator_id"].apply(lambda i: (df["indicator_id"].str.startswith(i + ".")).any())]
+        df = df.sort_values(["score", "attempts"], ascending=[True, False]).head(k)
+        return [(r.indicator_id, r.indicator_name, r.score) for r in df.itertuples()]
+
+    def exam_weights(self, user_id, floor=0.2):
+        """出题权重 {指标编号: 权重}：掌握度越低权重越高；未作答过的指标按默认权重 1.0（约等于掌握度 0.55）"""
+        df = self.vector(user_id)
+        df = df[df["indicator_id"] != ""]
+        return {r.indicator_id: floor + 1.8 * (1 - r.score) for r in df.itertuples()}
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+# 数据目录约定（与 streamlit_app.BASE_DIR 一致：均以 app/ 为根）
+import os
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_DATA_DIR = os.path.join(APP_DIR, "user_data")   # 每个用户：user_data/<uid>/results_runs/run_*.json
+STATS_DIR = os.path.join(APP_DIR, "stats")           # 跨用户的派生统计（可随时删除后重建）
+DATA_XLSX = os.path.normpath(os.path.join(APP_DIR, "..", "data", "cases.xlsx"))
+PAPERS_DIR = os.path.join(APP_DIR, "papers")         # 批量阅卷用的固定试卷：papers/<paper_id>.json
+RESULTS_DB = os.path.join(USER_DATA_DIR, "results.db")     # 成绩库（SQLite，WAL）
+EXPORT_DIR = os.path.join(APP_DIR, "exports")              # 管理员批量导出的文件（可随时删除）
+STATIC_DIR = os.path.join(STATS_DIR, "static")           # 旁路静态服务发布目录（内容哈希命名，可随时删除）
+GRAPH_HTML = os.path.join(APP_DIR, "knowledge_graph.html")     # 知识图谱页面（visualize.py 生成）
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+按需深度剖析：管理员布置"某页面接下来 N 次重跑"，命中的重跑整段剖析并存档到 stats/profiles/<捕获号>/
+
+- 采样（默认）：旁路线程每 interval 秒抓一次该会话线程的调用栈，累计为 collapsed stacks
+  （stacks.collapsed，每行 "帧;帧;帧 次数"，可直接喂 flamegraph.pl / speedscope）；开销低，可在生产上用
+- cProfile：在采样之外再开 cProfile，另存 profile.prof（pstats / snakeviz 可读）与按累计耗时排序的 profile.txt
+- tracemalloc（可选）：剖析期间追踪内存分配，存按代码行汇总的分配量前 30（tracemalloc.txt）；
+  tracemalloc 是进程级的，期间其他会话的分配也会计入
+- 同一时刻只做一个捕获；会话线程上一次的捕获没结束（重跑因异常中断）时丢弃并退回名额
+- meta.json 记录 页面 / 角色 / 数据集版本 / 模式 / 耗时；只保留最近 keep 个捕获
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from .paths import STATS_DIR
+
+PROFILES_DIR = os.path.join(STATS_DIR, "profiles")
+PROFILE_MODES = {"sampling": "采样", "cprofile": "cProfile + 采样"}
+_SKIP_MEM = (__file__, tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>")  # 剖析自身不计
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id, interval=0.005, max_seconds=120):
+        super().__init__(name="crc-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self.done = threading.Event()
+
+    def run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self.done.wait(self.interval) and time.monotonic() < deadline:
+            f = sys._current_frames().get(self.thread_id)
+            frames = []
+            while f is not None:
+                co = f.f_code
+                frames.append(f"{co.co_name} ({os.path.basename(co.co_filename)}:{co.co_firstlineno})")
+                f = f.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+                self.samples += 1
+
+
+class Capture:
+    """一次重跑的剖析：start() 在会话线程调用，stop() 写出文件并返回捕获目录"""
+
+    def __init__(self, mode="sampling", memory=False, interval=0.005, out_dir=PROFILES_DIR, **meta):
+        self.mode = mode
+        self.memory = memory
+        self.interval = interval
+        self.out_dir = out_dir
+        self.meta = meta
+        self.id = time.strftime("%Y%m%d_%H%M%S") + "_" + uuid.uuid4().hex[:6]
+        self.thread_id = threading.get_ident()
+        self.started = None
+        self.plan = None  # 领取时的布置（ProfileTrigger 退回名额用）
+        self._profile = self._sampler = None
+        self._own_tracemalloc = False
+
+    def start(self):
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+            self._own_tracemalloc = True
+        self._sampler = _Sampler(self.thread_id, self.interval)
+        self._sampler.start()
+        if self.mode == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def _halt(self):
+        if self._profile is not None:
+            self._profile.disable()
+        self._sampler.done.set()
+        self._sampler.join(timeout=1)
+        snap = None
+        if self.memory and tracemalloc.is_tracing():
+            snap = tracemalloc.take_snapshot()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+        return snap
+
+    def discard(self):
+        self._halt()
+
+    def stop(self):
+        ms = (time.perf_counter() - self._t0) * 1000
+        snap = self._halt()
+        path = os.path.join(self.out_dir, self.id)
+        tmp = path + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+        files = ["stacks.collapsed"]
+        with open(os.path.join(tmp, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            f.writelines(f"{stack} {n}\n" for stack, n in self._sampler.stacks.most_common())
+        if self._profile is not None:
+            self._profile.dump_stats(os.path.join(tmp, "profile.prof"))
+            buf = io.StringIO()
+            pstats.Stats(self._profile, stream=buf).sort_stats("cumulative").print_stats(60)
+            with open(os.path.join(tmp, "profile.txt"), "w", encoding="utf-8") as f:
+                f.write(buf.getvalue())
+            files += ["profile.prof", "profile.txt"]
+        if snap is not None:
+            snap = snap.filter_traces([tracemalloc.Filter(False, p) for p in _SKIP_MEM])
+            lines = [f"{'分配量':>12}{'块数':>9}  位置"]
+            for stat in snap.statistics("lineno")[:30]:
+                fr = stat.traceback[0]
+                lines.append(f"{stat.size / 1024:>10.1f}KB{stat.count:>9}  {fr.filename}:{fr.lineno}")
+            with open(os.path.join(tmp, "tracemalloc.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            files.append("tracemalloc.txt")
+        meta = dict(self.meta, id=self.id, mode=self.mode, memory=self.memory, started=self.started,
+                    ms=round(ms, 1), samples=self._sampler.samples, files=files)
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)  # 目录整体改名：列表里只会看到写完的捕获
+        return path
+
+
+class ProfileTrigger:
+    """进程内共享（应用经 st.cache_resource 持有一个）：布置 / 领取 / 列出捕获"""
+
+    def __init__(self, out_dir=PROFILES_DIR, keep=50, stale_seconds=300):
+        self.out_dir = out_dir
+        self.keep = keep
+        self.stale_seconds = stale_seconds
+        self.plan = None  # {"page", "remaining", "mode", "memory"}
+        self.active = None
+        self._lock = threading.Lock()
+
+    def arm(self, page, n=1, mode="sampling", memory=False):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未知剖析模式：{mode}")
+        with self._lock:
+            self._forget()
+            self.plan = {"page": page, "remaining": int(n), "mode": mode, "memory": bool(memory)}
+
+    def disarm(self):
+        with self._lock:
+            self._forget()
+            self.plan = None
+
+    def _forget(self):
+        if self.active is not None:  # 重新布置 / 取消后，进行中的捕获不再退回旧名额
+            self.active.plan = None
+
+    def status(self):
+        with self._lock:
+            return dict(self.plan) if self.plan else None
+
+    def take(self, page, **meta):
+        """本次重跑是否剖析：是则返回已 start() 的 Capture（用完交给 finish）"""
+        with self._lock:
+            old = self.active
+            if old is not None and (old.thread_id == threading.get_ident()
+                                    or time.time() - old.started > self.stale_seconds):
+                old.discard()  # 上一次没走到 finish（异常中断）：丢弃并退回名额（期间未重新布置时）
+                self.active = None
+                if old.plan is not None and (self.plan is None or self.plan is old.plan):
+                    old.plan["remaining"] += 1
+                    self.plan = old.plan
+            plan = self.plan
+            if self.active is not None or not plan or plan["page"] != page or plan["remaining"] <= 0:
+                return None
+            plan["remaining"] -= 1
+            if plan["remaining"] <= 0:
+                self.plan = None
+            self.active = Capture(plan["mode"], plan["memory"], out_dir=self.out_dir, page=page, **meta)
+            self.active.plan = plan
+            return self.active.start()
+
+    def finish(self, capture):
+        with self._lock:
+            if self.active is capture:
+                self.active = None
+        path = capture.stop()
+        self._prune()
+        return path
+
+    def _prune(self):
+        for old in self.captures()[self.keep:]:
+            shutil.rmtree(os.path.join(self.out_dir, old["id"]), ignore_errors=True)
+
+    def captures(self):
+        """已存档的捕获（新→旧）：[meta dict, ...]"""
+        out = []
+        try:
+            names = sorted((n for n in os.listdir(self.out_dir) if not n.endswith(".tmp")), reverse=True)
+        except FileNotFoundError:
+            return out
+        for name in names:
+            try:
+                with open(os.path.join(self.out_dir, name, "meta.json"), "r", encoding="utf-8") as f:
+                    out.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def file_path(self, capture_id, name):
+        return os.path.join(self.out_dir, capture_id, name)
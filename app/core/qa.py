@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# 智能问答：案例检索 + 本地要点合成
+import re
+
+def shorten(s, n=80):
+    s = str(s or "").strip()
+    return s if len(s) <= n else s[:n-1] + "…"
+
+def simple_retrieve(q, df_src, k=5):
+    """逐行子串计数（旧实现，保留作对照）；问答页已改用 core.retrieval.BM25Index"""
+    if not q.strip():
+        return []
+    qs = q.strip().lower()
+    scored = []
+    for r in df_src.itertuples():
+        bag = " ".join([str(getattr(r,"案例","")), str(getattr(r,"问题","")), str(getattr(r,"解决方法","")),
+                        str(getattr(r,"整改结果","")), str(getattr(r,"反思",""))]).lower()
+        score = sum(1 for token in re.split(r"[\s,，。；;]+", qs) if token and token in bag)
+        if score > 0:
+            scored.append((score, r))
+    scored.sort(key=lambda x: -x[0])
+    return [x[1] for x in scored[:k]]
+
+def synthesize_answer(q, hits):
+    key_points = []
+    for r in hits:
+        for col in ["解决方法","整改结果","反思"]:
+            t = str(getattr(r, col) or "").strip()
+            if t:
+                key_points.append(shorten(t, 120))
+                break
+    key_points = key_points[:6]
+    if not key_points:
+        return "建议：对照方案与SOP核对原始依据，按缺失/错误类型完成修订，并保留可追溯留痕。"
+    para = "针对你的问题，可落实：" + "；".join(key_points) + "。同时确保纸质与系统一致、研究者复核签名、时间与原因可追溯。"
+    return para
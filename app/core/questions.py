@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+# 题库：由案例行生成单选题（题面隐指标 / 均衡选项 / 稳定种子）
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import zlib
+
+from .indicators import parse_indicator, parse_first_level
+
+def question_id(case, issue, result) -> str:
+    """题目稳定编号：与出题稳定种子同源（案例 + 问题 + 整改结果），案例文本不变则编号不变"""
+    s = "||".join(str(p) for p in (case, issue, result))
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:12]
+
+ERROR_CATS = ["延后处理", "口头代替", "越权修改", "不留痕或不同步"]
+
+def pick_error_distractors(rng: random.Random):
+    return rng.sample(ERROR_CATS, 3)
+
+def _normalize_end_punct(s: str) -> str:
+    return re.sub(r'[。；;.\s]+$', '', s)
+
+def _stable_seed(*parts) -> int:
+    """稳定随机种子：重启/不同机器一致"""
+    s = "||".join(str(p) for p in parts)
+    return int(hashlib.sha256(s.encode("utf-8")).hexdigest()[:12], 16)
+
+def craft_correct_sentence(soln_text, result_text, issue_text):
+    """把解决方法+整改结果动作化（不提指标），并限制为两要素并行句式"""
+    base = (soln_text or "") + "；" + (result_text or "")
+    base = _normalize_end_punct(base)
+    want = []
+    cand = ["由研究者复核签名", "纸质与系统同步修订", "注明修改原因与日期", "依据原始证据核对", "按访视窗口处理"]
+    for c in cand:
+        if c in base:
+            want.append(c)
+    want += ["由研究者复核签名", "纸质与系统同步修订"]  # 命中不足两项时用默认动作补齐
+    want = list(dict.fromkeys(want))[:2]  # 最多两项
+    return f"应{want[0]}，并{want[1]}；同时依据原始记录完善留痕"
+
+def craft_distractor_sentence(kind):
+    if kind == "延后处理":
+        return "应暂缓修订并待下次集中处理，并保持现有记录不变；同时通过口头沟通提醒窗口"
+    if kind == "口头代替":
+        return "应先口头告知研究者留意并记录讨论要点，并在必要时再考虑修订；同时不做纸质与系统同步"
+    if kind == "越权修改":
+        return "应由CRC直接在系统更正并定稿，并在备注说明原因；同时纸质记录日后再补"
+    if kind == "不留痕或不同步":
+        return "应在EDC备注一次并上传截图，并保持纸质记录原状；同时无需另行说明原因与日期"
+    return "应简要记录情况并持续观察，并避免影响当前流程；同时不做额外处理"
+
+def balance_option_lengths(opts, rng: random.Random):
+    """拉齐四个选项长度与结构：目标 40±10 字；差异 ≤12；统一双分句"""
+    tail_bank = ["；同时记录讨论要点", "；同时保留沟通时间", "；同时更新工作清单"]
+    def ensure_two_clause(s):
+        s = _normalize_end_punct(s)
+        return s if "；" in s else s + "；同时完善记录"
+    opts = [ensure_two_clause(o) for o in opts]
+    L = [len(o) for o in opts]
+    target = max(min(int(sum(L)/len(L)), 48), 36)
+    out = []
+    for s in opts:
+        if len(s) > target + 12:
+            s = re.sub(r'立即|尽快|务必|严格|重点', '', s)
+            s = s.replace("并且", "并").replace("以及", "并").replace("随后", "同时")
+            s = re.sub(r'；.*$', '；同时完善记录', s)
+        elif len(s) < target - 12:
+            s += tail_bank[_stable_seed(s) % len(tail_bank)]  # 由文本决定，不消耗 rng（保持选项顺序不变）
+        out.append(s)
+    return out
+
+def make_stem(project=None, phase=None, issue=None):
+    """题干：试验项目 + 试验阶段 + 问题 + 提问句"""
+    pj = f"在“{str(project).strip()}”" if project else "在研究现场"
+    ph = f"的{str(phase).strip()}中" if phase else "中"
+    detail = (str(issue or "记录与要求不一致")).strip()
+    detail = re.sub(r"。+$", "", detail)
+    stem = f"{pj}{ph}，{detail}。下一步最合适的处置是？"
+    stem = re.sub(r"阶段阶段", "阶段", stem)
+    stem = re.sub(r"。。+", "。", stem)
+    return stem
+
+def build_question_from_row(row, idx):
+    """核心出题：题面隐指标 + 均衡选项 + 追踪正确项（稳定种子）"""
+    indicator_id, indicator_name = parse_indicator(getattr(row, "能力指标", ""))
+    stem = make_stem(getattr(row, "试验项目", ""), getattr(row, "试验阶段", ""), getattr(row, "问题", ""))
+
+    # 稳定随机种子，避免 rerun 抖动
+    qseed = _stable_seed(getattr(row, "案例", ""), getattr(row, "问题", ""), getattr(row, "整改结果", ""))
+    rng_local = random.Random(qseed)
+
+    raw = [(craft_correct_sentence(getattr(row,"解决方法",""), getattr(row,"整改结果",""), getattr(row,"问题","")), True)]
+    kinds = pick_error_distractors(rng_local)
+    raw += [(craft_distractor_sentence(k), False) for k in kinds]
+
+    balanced_texts = balance_option_lengths([t for t,_ in raw], rng_local)
+    balanced = list(zip(balanced_texts, [ok for _, ok in raw]))
+
+    order = list(range(4))
+    rng_local.shuffle(order)
+    shuffled = [balanced[i] for i in order]
+    options_text = [t for t,_ in shuffled]
+    correct_idx = [i for i,(_,ok) in enumerate(shuffled) if ok][0]
+    answer_letter = "ABCD"[correct_idx]
+
+    label_order = ["A","B","C","D"]
+    why_wrong_map = {}
+    for i, lab in enumerate(label_order):
+        _, is_right = shuffled[i]
+        why_wrong_map[lab] = "正确项。" if is_right else "常见误区：仅备注或口头说明、延后处理、CRC越权或单端修补。"
+
+    explanation = {
+        "why_right": "补齐原始依据并由研究者复核签名，纸质与系统同步修订并注明原因/日期，确保可追溯。",
+        "how_to": ["核对原始证据","补填纸质并研究者签名日期","EDC同步修订并填写修改原因","卷宗归档与版本控制"],
+        "why_wrong": why_wrong_map,
+        "edge": "如涉主要终点/安全事件，应按方案触发上报流程。"
+    }
+
+    return {
+        "idx": idx,
+        "qid": question_id(getattr(row, "案例", ""), getattr(row, "问题", ""), getattr(row, "整改结果", "")),
+        "stem": stem,
+        "options": {"A": options_text[0], "B": options_text[1], "C": options_text[2], "D": options_text[3]},
+        "answer": answer_letter,
+        "meta": {
+            "indicator_id": indicator_id, "indicator_name": indicator_name,
+            "phase": getattr(row, "试验阶段", "") or "", "project": getattr(row, "试验项目", "") or "",
+            "error_cats": kinds,
+            "first_level": parse_first_level(indicator_id)
+        },
+        "explain": explanation
+    }
+
+def content_hash(q) -> str:
+    """题目内容哈希（题干/选项/答案/讲评）：题库版本变化导致题面变了，哈希随之改变"""
+    body = json.dumps([q["stem"], q["options"], q["answer"], q["explain"]], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()[:12]
+
+def stem_to_qid(df_src):
+    """题干 → 题目编号（旧明细未记录 qid 时用题干反查）"""
+    return {
+        make_stem(getattr(r, "试验项目", ""), getattr(r, "试验阶段", ""), getattr(r, "问题", "")):
+            question_id(getattr(r, "案例", ""), getattr(r, "问题", ""), getattr(r, "整改结果", ""))
+        for r in df_src.itertuples()
+    }
+
+def compile_bank(df_src, path, progress=None, chunk=2000):
+    """预编译全部题目 → SQLite 文件（qid → zlib(JSON)，不含题号）；先写临时文件再原子替换；返回题数"""
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    c = sqlite3.connect(tmp)
+    c.execute("CREATE TABLE questions (qid TEXT PRIMARY KEY, body BLOB NOT NULL) WITHOUT ROWID")
+    n = len(df_src)
+    for a in range(0, n, chunk):
+        rows = []
+        for r in df_src.iloc[a:a + chunk].itertuples():
+            q = build_question_from_row(r, 0)
+            del q["idx"]
+            rows.append((q["qid"], zlib.compress(json.dumps(q, ensure_ascii=False).encode("utf-8"))))
+        c.executemany("INSERT OR REPLACE INTO questions VALUES (?, ?)", rows)
+        c.commit()
+        if progress:
+            progress(min(a + chunk, n) / max(n, 1), f"已编译 {min(a + chunk, n)}/{n} 题")
+    c.close()
+    os.replace(tmp, path)
+    return n
+
+class QuestionBank:
+    """qid → 案例行号；按需生成题目（题库版本不变时，同一 qid 的题面/选项/答案恒定）
+    compiled：compile_bank 产出的预编译文件（同一数据集版本）；有则直接取，缺的题再现场生成"""
+
+    def __init__(self, df_src, qids=None, compiled=None):
+        self.df = df_src
+        if qids is None:
+            qids = [question_id(getattr(r, "案例", ""), getattr(r, "问题", ""), getattr(r, "整改结果", ""))
+                    for r in df_src.itertuples()]
+        self.qids = list(qids)
+        self.pos = {q: i for i, q in enumerate(self.qids)}
+        self.compiled = compiled if compiled and os.path.exists(compiled) else None
+        self._local = threading.local()
+
+    def __contains__(self, qid):
+        return qid in self.pos
+
+    def _lookup(self, qids):
+        if self.compiled is None or not qids:
+            return {}
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(f"file:{self.compiled}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = c
+        found = {}
+        for a in range(0, len(qids), 500):
+            part = list(qids[a:a + 500])
+            for qid, body in c.execute(f"SELECT qid, body FROM questions WHERE qid IN ({','.join('?' * len(part))})", part):
+                found[qid] = json.loads(zlib.decompress(body))
+        return found
+
+    def question(self, qid, idx=1):
+        """单题（题号 idx）；题库中不存在返回 None"""
+        i = self.pos.get(qid)
+        if i is None:
+            return None
+        q = self._lookup([qid]).get(qid)
+        if q is not None:
+            return {"idx": idx, **q}
+        return build_question_from_row(next(self.df.iloc[[i]].itertuples()), idx)
+
+    def paper(self, qids):
+        """按给定顺序出题（题号 1..n）；题库中不存在的 qid 抛 KeyError"""
+        pos = [self.pos[q] for q in qids]
+        found = self._lookup(qids)
+        if len(found) == len(set(qids)):
+            return [{"idx": i, **found[q]} for i, q in enumerate(qids, 1)]
+        rows = self.df.iloc[pos]
+        return [build_question_from_row(r, i) for i, r in enumerate(rows.itertuples(), 1)]
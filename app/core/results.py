@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# 成绩：明细行格式 + 旧版文件（results.csv / run_<run_id>.json）读取；新成绩写入 core.store
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from .questions import content_hash
+from .spans import traced
+
+RESULT_FIELDS = ["time", "score", "total", "mode", "run_id"]
+
+def detail_row(q, your_answer):
+    """题目 + 作答 → 明细行（成绩反馈/讲评/题目统计都读这一格式）"""
+    return {
+        "index": q["idx"], "qid": q.get("qid", ""), "your_answer": your_answer, "correct": q["answer"],
+        "stem": q["stem"], "A": q["options"]["A"], "B": q["options"]["B"],
+        "C": q["options"]["C"], "D": q["options"]["D"],
+        "indicator_id": q["meta"]["indicator_id"], "indicator_name": q["meta"]["indicator_name"],
+        "phase": q["meta"]["phase"], "error_cats": q["meta"]["error_cats"], "explain": q["explain"],
+        "qhash": content_hash(q),
+    }
+
+# ---------- 旧版文件读取（鲁棒+可重建；迁移用） ----------
+def load_results_csv(path):
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=["time","score","total","mode","run_id"])
+    try:
+        df = pd.read_csv(path, encoding="utf-8", engine="python", on_bad_lines="skip")
+    except Exception:
+        df = pd.read_csv(path, encoding="gbk", engine="python", on_bad_lines="skip")
+    df = df.rename(columns={"时间":"time","得分":"score","题量":"total","模式":"mode","批次":"run_id"})
+    keep = ["time","score","total","mode","run_id"]
+    return df[[c for c in keep if c in df.columns]].copy()
+
+@traced()
+def rebuild_results_from_runs(runs_dir: str):
+    rows = []
+    if os.path.isdir(runs_dir):
+        for fn in os.listdir(runs_dir):
+            if fn.endswith(".json") and fn.startswith("run_"):
+                rid = fn.replace("run_", "").replace(".json", "")
+                try:
+                    t = datetime.strptime(rid, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+                except Exception:
+                    t = ""
+                try:
+                    with open(os.path.join(runs_dir, fn), "r", encoding="utf-8") as f:
+                        detail = json.load(f)
+                    total = len(detail)
+                    wrong = sum(1 for d in detail if d["your_answer"] != d["correct"])
+                    rows.append({"time": t, "score": total-wrong, "total": total, "mode": "FAST", "run_id": rid})
+                except Exception:
+                    pass
+    return pd.DataFrame(rows, columns=["time","score","total","mode","run_id"])
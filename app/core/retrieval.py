@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+问答检索：BM25 + 字符 n-gram（中文无空格，按字切分后取相邻二字组；英文/数字按整词）
+
+- 建索引：每条案例（案例/问题/解决方法/整改结果/反思）→ 词项频次 → 按词项排序的倒排数组
+  offsets[t]..offsets[t+1] 为词项 t 的文档号 docs 与预先算好的 BM25 词频权重 w（float32）
+- 查询：每个查询词项一次向量加法 scores[docs] += idf[t]·w，再 argpartition 取 top-k
+索引随数据集版本（cases.dataset_version）构建一次，查询为毫秒级；save / load 落盘复用（后台任务预建）。
+"""
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from .spans import traced
+
+RETRIEVE_COLUMNS = ["案例", "问题", "解决方法", "整改结果", "反思"]
+_RE_SEG = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*|[㐀-鿿]+")
+
+
+def tokenize(text, n=2):
+    """小写后切段：英文/数字/指标编号整词；汉字段取 n 字组（单字段保留单字）"""
+    out = []
+    for seg in _RE_SEG.findall(str(text or "").lower()):
+        if not ("㐀" <= seg[0] <= "鿿"):
+            out.append(seg)
+        elif len(seg) <= n:
+            out.append(seg)
+        else:
+            out.extend(seg[i:i + n] for i in range(len(seg) - n + 1))
+    return out
+
+
+class BM25Index:
+    def __init__(self, df_src, columns=RETRIEVE_COLUMNS, k1=1.5, b=0.75, version=""):
+        self.version = version
+        self.size = len(df_src)
+        texts = df_src[columns[0]].astype(str)
+        for c in columns[1:]:
+            texts = texts + " " + df_src[c].astype(str)
+
+        vocab = {}
+        term_ids, doc_ids, tfs = [], [], []
+        dl = np.zeros(self.size, dtype=np.float32)
+        for d, text in enumerate(texts.tolist()):
+            counts = Counter(tokenize(text))
+            dl[d] = sum(counts.values())
+            for tok, tf in counts.items():
+                term_ids.append(vocab.setdefault(tok, len(vocab)))
+                doc_ids.append(d)
+                tfs.append(tf)
+        self.vocab = vocab
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self.docs = np.asarray(doc_ids, dtype=np.int32)[order]
+        tf = np.asarray(tfs, dtype=np.float32)[order]
+        df_t = np.bincount(term_ids, minlength=len(vocab))
+        self.offsets = np.concatenate([[0], np.cumsum(df_t)]).astype(np.int64)
+
+        avgdl = float(dl.mean()) if self.size else 1.0
+        norm = k1 * (1 - b + b * dl[self.docs] / max(avgdl, 1e-9))
+        self.w = (tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        self.idf = np.log(1 + (self.size - df_t + 0.5) / (df_t + 0.5)).astype(np.float32)
+
+    def save(self, path):
+        """数组 + 词表 → npz（临时文件 + 原子替换）"""
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, docs=self.docs, w=self.w, offsets=self.offsets, idf=self.idf,
+                 vocab=np.asarray(list(self.vocab), dtype=str), meta=np.asarray([self.version, str(self.size)]))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        ix = cls.__new__(cls)
+        with np.load(path) as z:
+            ix.docs, ix.w, ix.offsets, ix.idf = z["docs"], z["w"], z["offsets"], z["idf"]
+            ix.vocab = {t: i for i, t in enumerate(z["vocab"].tolist())}
+            ix.version, size = z["meta"].tolist()
+        ix.size = int(size)
+        return ix
+
+    @traced("bm25_search")
+    def search(self, q, k=5):
+        """→ [(行号, 分数), ...]，按分数降序；无命中返回 []"""
+        terms = {self.vocab[t] for t in tokenize(q) if t in self.vocab}
+        if not terms or not self.size:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        for t in terms:
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            scores[self.docs[lo:hi]] += self.idf[t] * self.w[lo:hi]
+        k = min(k, int((scores > 0).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def retrieve(self, q, df_src, k=5):
+        """与 simple_retrieve 同形：返回命中案例行（itertuples 的行对象）"""
+        hits = self.search(q, k)
+        if not hits:
+            return []
+        return list(df_src.iloc[[i for i, _ in hits]].itertuples())
+
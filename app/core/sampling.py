@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# 出题分层索引：按 一级指标 / 完整指标编号 / 试验阶段 预先分组行号，出题时直接在数组上抽样
+import random
+
+import numpy as np
+
+from .indicators import parse_indicator, parse_first_level
+from .questions import question_id
+
+VALID_HEADS = set("1234567")
+
+
+def _group(keys):
+    """keys[i] 为第 i 行的分组键 → {键: 行号数组}（保持首次出现顺序）"""
+    out = {}
+    for i, k in enumerate(keys):
+        out.setdefault(k, []).append(i)
+    return {k: np.asarray(v, dtype=np.int32) for k, v in out.items()}
+
+
+class StratIndex:
+    """
+    案例库的分层索引（只在数据加载时构建一次）：
+    - by_level：一级指标 '1'~'7'，无编号/非法归为 'X'
+    - by_code ：完整指标编号，如 '5.2.3'（无编号的行不入此表）
+    - by_phase：试验阶段原文
+    - by_text ：'能力指标'原文（专项练习的片段过滤只扫描去重后的文本，不扫整表）
+    另存 qids（行号 → 题目编号），供按难度档出题时对齐题目统计。
+    """
+
+    def __init__(self, df):
+        n = len(df)
+        texts = df["能力指标"].fillna("").astype(str).tolist() if n else []
+        phases = df["试验阶段"].fillna("").astype(str).tolist() if n else []
+
+        codes, levels = [], []
+        parsed = {}
+        for t in texts:
+            if t not in parsed:
+                iid, _ = parse_indicator(t)
+                lvl = parse_first_level(iid) or "X"
+                parsed[t] = (iid, lvl if lvl in VALID_HEADS else "X")
+            iid, lvl = parsed[t]
+            codes.append(iid)
+            levels.append(lvl)
+
+        cols = [df[c].fillna("").astype(str).tolist() if c in df.columns else [""] * n
+                for c in ("案例", "问题", "整改结果")]
+
+        self.size = n
+        self.qids = np.asarray([question_id(*parts) for parts in zip(*cols)], dtype=object)
+        self.all_ids = np.arange(n, dtype=np.int32)
+        self.codes = np.asarray(codes, dtype=object)
+        self.levels = np.asarray(levels, dtype=object)
+        self.by_level = _group(levels)
+        self.by_code = {k: v for k, v in _group(codes).items() if k}
+        self.by_phase = _group(phases)
+        self.by_text = _group(texts)
+
+    # ---------- 候选集 ----------
+    def ids_for_indicator(self, code: str):
+        """指定编号及其下级（'5.2' → 5.2 / 5.2.x）的行号"""
+        code = str(code or "").strip()
+        parts = [v for k, v in self.by_code.items() if k == code or k.startswith(code + ".")]
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        return np.sort(np.concatenate(parts))
+
+    def candidates(self, filter_indicator=None, filter_phase=None, exact_code=False):
+        """
+        过滤后的候选行号（升序）；过滤结果为空时回退到全库。
+        filter_indicator 默认沿用'能力指标'片段包含匹配；exact_code=True 时按编号及下级精确取。
+        """
+        ids = self.all_ids
+        if filter_indicator:
+            if exact_code:
+                ids = self.ids_for_indicator(filter_indicator)
+            else:
+                parts = [v for t, v in self.by_text.items() if filter_indicator in t]
+                ids = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+        if filter_phase:
+            ids = np.intersect1d(ids, self.by_phase.get(filter_phase, np.empty(0, dtype=np.int32)),
+                                 assume_unique=True)
+        if len(ids) == 0:
+            ids = self.all_ids
+        return ids
+
+    # ---------- 抽样 ----------
+    def sample(self, ids, n, rng: random.Random):
+        """无放回均匀抽样"""
+        k = min(n, len(ids))
+        return [int(ids[i]) for i in rng.sample(range(len(ids)), k)]
+
+    def sample_cover(self, ids, n, rng: random.Random):
+        """按一级指标分桶后轮询抓题，尽量覆盖不同一级；无编号桶放最后（每桶只抽需要的题数，不整桶洗牌）"""
+        full = len(ids) == self.size
+        buckets = {}
+        for k, v in self.by_level.items():
+            v = v if full else np.intersect1d(v, ids, assume_unique=True)
+            if len(v):
+                buckets[k] = v
+
+        order = sorted(buckets.keys(), key=lambda x: ("X" in x, x))
+        want = min(n, len(ids))
+        cnt, got = {k: 0 for k in order}, 0
+        while got < want:
+            for k in order:
+                if got >= want: break
+                if cnt[k] < len(buckets[k]):
+                    cnt[k] += 1
+                    got += 1
+
+        drawn = {k: [int(buckets[k][i]) for i in rng.sample(range(len(buckets[k])), cnt[k])] for k in order}
+        picked = []
+        for r in range(max(cnt.values(), default=0)):
+            for k in order:
+                if r < cnt[k]:
+                    picked.append(drawn[k][r])
+        return picked
+
+    def sample_weighted(self, ids, n, rng: random.Random, weights: dict, default=1.0):
+        """
+        按指标加权无放回抽样。weights 的键可为完整编号（'5.2.3'）、上级编号（'5.2'）或一级（'5'），
+        取最长匹配的权重；未命中的行用 default。权重为 0 的行不会被抽中（除非候选不足）。
+        """
+        if len(ids) == 0:
+            return []
+        w = np.empty(len(ids), dtype=np.float64)
+        memo = {}
+        for j, i in enumerate(ids):
+            code = self.codes[i]
+            if code not in memo:
+                val, parts = default, code.split(".") if code else []
+                for depth in range(len(parts), 0, -1):
+                    key = ".".join(parts[:depth])
+                    if key in weights:
+                        val = weights[key]
+                        break
+                memo[code] = max(float(val), 0.0)
+            w[j] = memo[code]
+
+        k = min(n, len(ids))
+        nz = int(np.count_nonzero(w))
+        if nz == 0:
+            return self.sample(ids, k, rng)
+        gen = np.random.default_rng(rng.randint(0, 2**32 - 1))
+        take = min(k, nz)
+        pos = gen.choice(len(ids), size=take, replace=False, p=w / w.sum())
+        picked = [int(ids[p]) for p in pos]
+        if take < k:  # 有效权重不足时用零权重行补齐
+            rest = [int(ids[j]) for j in np.flatnonzero(w == 0)]
+            picked += rng.sample(rest, k - take)
+        return picked
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+耗时埋点：span API + 按重跑落盘（stats/spans.db）+ 分位数汇总（管理后台"性能"面板）
+
+- with span("名称"): ... / @traced() 装饰函数：记录一段代码的耗时（毫秒）与嵌套深度
+- 一次重跑 = start_rerun() … finish_rerun()：期间（同一线程 / 上下文）所有 span 归到这次重跑，
+  结束时连同整次耗时（span 名 "rerun"）与 页面 / 角色 / 数据集版本 一次事务写入；
+  被异常或 st.rerun 中断、没走到 finish_rerun 的重跑不记录（下次 start_rerun 时丢弃）
+- 不在重跑内（CLI、后台任务、基准测试）时 span 只做一次 ContextVar 读取，开销可忽略
+- 存储：SQLite 环形保留最近 max_rows 行（按自增 id 删除最旧的）；每线程一条连接
+"""
+import functools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+from .paths import STATS_DIR
+
+SPANS_DB = os.path.join(STATS_DIR, "spans.db")
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spans (
+    id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts      REAL    NOT NULL,
+    rerun   TEXT    NOT NULL,
+    page    TEXT,
+    role    TEXT,
+    version TEXT,
+    name    TEXT    NOT NULL,
+    ms      REAL    NOT NULL,
+    depth   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_spans_ts ON spans (ts);
+"""
+
+_current = ContextVar("crc_rerun", default=None)
+
+
+class _Rerun:
+    __slots__ = ("id", "ts", "t0", "page", "role", "version", "spans", "depth")
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.ts = time.time()
+        self.t0 = time.perf_counter()
+        self.page = self.role = self.version = ""
+        self.spans = []  # [(名称, 毫秒, 深度), ...]，按结束先后
+        self.depth = 0
+
+
+@contextmanager
+def span(name):
+    rec = _current.get()
+    if rec is None:
+        yield
+        return
+    rec.depth += 1
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        rec.depth -= 1
+        rec.spans.append((name, (time.perf_counter() - t) * 1000, rec.depth + 1))
+
+
+def traced(name=None):
+    """装饰器：@traced() 以函数名记 span，@traced("名称") 自定名称"""
+    def deco(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def start_rerun(page="", role="", version=""):
+    """开始一次重跑（覆盖本上下文里未结束的上一次）；返回记录，页面等信息可稍后再填"""
+    rec = _Rerun()
+    rec.page, rec.role, rec.version = page, role, version
+    _current.set(rec)
+    return rec
+
+def finish_rerun(sink):
+    """结束本次重跑并写入 sink；没有进行中的重跑时什么也不做"""
+    rec = _current.get()
+    if rec is None:
+        return None
+    _current.set(None)
+    sink.record(rec, (time.perf_counter() - rec.t0) * 1000)
+    return rec
+
+
+class SpanSink:
+    def __init__(self, path=SPANS_DB, max_rows=200_000):
+        self.path = path
+        self.max_rows = max_rows
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.conn() as c:
+            c.executescript(SCHEMA)
+
+    def conn(self):
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=5)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = c
+        return c
+
+    def record(self, rec, total_ms):
+        rows = [(rec.ts, rec.id, rec.page, rec.role, rec.version, name, ms, depth) for name, ms, depth in rec.spans]
+        rows.append((rec.ts, rec.id, rec.page, rec.role, rec.version, "rerun", total_ms, 0))
+        try:
+            with self.conn() as c:
+                c.executemany("INSERT INTO spans (ts, rerun, page, role, version, name, ms, depth) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._writes += 1
+                if self._writes % 100 == 1:  # 环形保留：偶尔删一次最旧的
+                    c.execute("DELETE FROM spans WHERE id <= (SELECT max(id) FROM spans) - ?", (self.max_rows,))
+        except sqlite3.Error:
+            pass  # 埋点失败不影响页面
+
+    def frame(self, since=None):
+        q = "SELECT ts, rerun, page, role, version, name, ms, depth FROM spans"
+        args = ()
+        if since is not None:
+            q += " WHERE ts >= ?"
+            args = (since,)
+        return pd.read_sql_query(q, self.conn(), params=args)
+
+    def percentiles(self, since=None, by=("page", "name")):
+        """→ DataFrame：by 各列 + 次数 / p50 / p95 / 最大（毫秒），按 p95 降序"""
+        df = self.frame(since)
+        cols = list(by) + ["次数", "p50(ms)", "p95(ms)", "最大(ms)"]
+        if df.empty:
+            return pd.DataFrame(columns=cols)
+        g = df.groupby(list(by))["ms"]
+        out = pd.DataFrame({"次数": g.size(), "p50(ms)": g.quantile(0.5), "p95(ms)": g.quantile(0.95),
+                            "最大(ms)": g.max()}).reset_index()
+        return out.round(1).sort_values("p95(ms)", ascending=False, ignore_index=True)[cols]
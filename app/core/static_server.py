@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+静态资源旁路服务：知识图谱 HTML 这类大文件不再经 Streamlit websocket 每次重跑重发，
+页面只输出一个 iframe 引用，由浏览器直接向本服务取文件并长期缓存
+
+- publish_asset：把源文件按内容哈希发布为 stats/static/<名>.<哈希>.<扩展名>，同时预压缩 .gz
+  （装了 brotli 时再出 .br）；内容不变则不重写，旧版本自动清理
+- StaticServer：ThreadingHTTPServer，只读发布目录；按 Accept-Encoding 直接发送预压缩文件；
+  文件名带内容哈希，响应 Cache-Control: public, max-age=一年, immutable，ETag / 304 支持
+- 无鉴权、不发 CORS 头（iframe 引用不需要），默认只绑定 127.0.0.1；需对外时经带鉴权 / https 的反向代理转发，
+  或显式 --host 0.0.0.0
+
+用法（在 app/ 目录下单独运行，亦可由应用进程内启动）：
+    python -m core.static_server --port 8502 [--host 127.0.0.1]
+"""
+import argparse
+import glob
+import gzip
+import hashlib
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from .paths import STATIC_DIR
+
+MAX_AGE = 365 * 24 * 3600
+_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]  # 优先级从高到低
+
+
+def _atomic_write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def publish_asset(src, static_dir=STATIC_DIR):
+    """发布 src → 带内容哈希的文件名（不含目录）；同名资源的旧版本一并删除"""
+    with open(src, "rb") as f:
+        data = f.read()
+    stem, ext = os.path.splitext(os.path.basename(src))
+    name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+    os.makedirs(static_dir, exist_ok=True)
+    path = os.path.join(static_dir, name)
+    if not os.path.exists(path + ".gz"):
+        _atomic_write(path, data)
+        try:
+            import brotli  # 可选依赖
+            _atomic_write(path + ".br", brotli.compress(data, quality=11))
+        except ImportError:
+            pass
+        _atomic_write(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))  # .gz 最后写：作完成标记
+    for old in glob.glob(os.path.join(static_dir, f"{glob.escape(stem)}.*{ext}*")):
+        if not os.path.basename(old).startswith(name):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return name
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    def end_headers(self):
+        self.send_header("X-Content-Type-Options", "nosniff")
+        super().end_headers()
+
+    def list_directory(self, path):
+        self.send_error(404)
+        return None
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return None
+        etag = '"' + os.path.basename(path) + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, immutable")
+            self.end_headers()
+            return None
+        accept = self.headers.get("Accept-Encoding", "")
+        body, encoding = path, None
+        for enc, suffix in _ENCODINGS:
+            if enc in accept and os.path.isfile(path + suffix):
+                body, encoding = path + suffix, enc
+                break
+        f = open(body, "rb")
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+        self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, immutable")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        return f
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StaticServer:
+    """后台线程里的只读静态服务；端口被占用时抛 OSError"""
+
+    def __init__(self, root=STATIC_DIR, host="127.0.0.1", port=8502):
+        os.makedirs(root, exist_ok=True)
+        handler = lambda *a, **kw: _Handler(*a, directory=root, **kw)
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.host = host
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name="static-server", daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="静态资源旁路服务（知识图谱 HTML 等）")
+    ap.add_argument("--publish", nargs="*", default=[], help="先发布这些文件")
+    ap.add_argument("--host", default="127.0.0.1", help="绑定地址（对外开放请放在反向代理之后）")
+    ap.add_argument("--port", type=int, default=8502)
+    args = ap.parse_args()
+    for src in args.publish:
+        print(f"已发布 {src} → {publish_asset(src)}")
+    srv = StaticServer(host=args.host, port=args.port)
+    print(f"静态服务 http://{args.host}:{srv.port}/ → {STATIC_DIR}")
+    threading.Event().wait()
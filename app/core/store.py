@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+成绩库（SQLite，WAL）：替代 user_data/<uid>/results.csv + results_runs/run_*.json
+
+- runs   ：一次测评一行（用户、run_id、时间、得分、题量、模式），按 (user_id, time) 建索引
+- answers：逐题作答（题目编号、选项、对错、指标、阶段、误区类型、题目内容哈希 qhash），
+           按 (user_id, indicator_id, is_correct) / qid 建索引
+- texts  ：题面/选项/讲评按 qhash 去重、zlib 压缩存一份（同一道题多次作答只存一次）；
+           texts 缺失时由题库按 qid 重建（哈希一致才用）。旧明细（无 qid/qhash）的展示字段仍整体放 payload（JSON）
+- agg_*  ：全体学员统计的物化聚合表（见 core.cohort），与测评同一事务增量更新
+- mastery：个人指标掌握度（见 core.mastery），同上
+成绩反馈 / 管理后台都走索引查询，不再列目录、逐个解析 JSON。
+
+迁移旧文件（幂等，可重复执行）：cd app && python -m core.store migrate
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+
+import pandas as pd
+
+from .cohort import SCHEMA as COHORT_SCHEMA, rebuild_cohort, update_cohort
+from .mastery import SCHEMA as MASTERY_SCHEMA, rebuild_mastery, update_mastery
+from .paths import RESULTS_DB, USER_DATA_DIR
+from .results import RESULT_FIELDS, detail_row, load_results_csv
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id       INTEGER PRIMARY KEY,
+    user_id  TEXT    NOT NULL,
+    run_id   TEXT    NOT NULL,
+    time     TEXT    NOT NULL,
+    score    INTEGER NOT NULL,
+    total    INTEGER NOT NULL,
+    mode     TEXT    NOT NULL DEFAULT 'FAST',
+    UNIQUE (user_id, run_id)
+);
+CREATE INDEX IF NOT EXISTS ix_runs_user_time ON runs (user_id, time);
+CREATE INDEX IF NOT EXISTS ix_runs_time      ON runs (time);
+
+CREATE TABLE IF NOT EXISTS answers (
+    run            INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    idx            INTEGER NOT NULL,
+    user_id        TEXT    NOT NULL,
+    qid            TEXT,
+    your_answer    TEXT,
+    correct        TEXT,
+    is_correct     INTEGER NOT NULL,
+    indicator_id   TEXT,
+    indicator_name TEXT,
+    phase          TEXT,
+    error_cats     TEXT,
+    payload        TEXT,
+    qhash          TEXT,
+    PRIMARY KEY (run, idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_answers_user_ind ON answers (user_id, indicator_id, is_correct);
+CREATE INDEX IF NOT EXISTS ix_answers_ind      ON answers (indicator_id, is_correct);
+CREATE INDEX IF NOT EXISTS ix_answers_qid      ON answers (qid);
+
+CREATE TABLE IF NOT EXISTS texts (
+    qhash TEXT PRIMARY KEY,
+    body  BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+# 明细行中单独成列的字段；其余（题干/选项/讲评）进 texts（或旧明细的 payload）
+_COLS = ("index", "qid", "your_answer", "correct", "indicator_id", "indicator_name", "phase", "error_cats", "qhash")
+# 早期 run_*.json / 导出表用的中文键
+_LEGACY_KEYS = {"题号": "index", "你的答案": "your_answer", "作答": "your_answer", "正确答案": "correct"}
+
+
+def _is_correct(r):
+    """作答与正确答案都有才可能判对（未作答、缺正确答案都不算对）"""
+    ua, ok = r.get("your_answer"), r.get("correct")
+    return int(ua is not None and ok is not None and ua == ok)
+
+
+class ResultStore:
+    """每个线程一条连接（Streamlit 会话跑在不同线程）；写入走单事务"""
+
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self.conn() as c:
+            c.executescript(SCHEMA)
+            if "qhash" not in {r["name"] for r in c.execute("PRAGMA table_info(answers)")}:
+                c.execute("ALTER TABLE answers ADD COLUMN qhash TEXT")
+            c.executescript(COHORT_SCHEMA + MASTERY_SCHEMA)
+            # 聚合表晚于成绩库加入：库里已有测评而聚合表为空时补算一次
+            if not self.is_empty():
+                if c.execute("SELECT 1 FROM agg_user LIMIT 1").fetchone() is None:
+                    rebuild_cohort(c)
+                if c.execute("SELECT 1 FROM mastery LIMIT 1").fetchone() is None:
+                    rebuild_mastery(c)
+
+    def conn(self):
+        c = getattr(self._local, "conn", None)
+        if c is None:
+            c = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("PRAGMA foreign_keys=ON")
+            c.row_factory = sqlite3.Row
+            self._local.conn = c
+        return c
+
+    # ---------- 写 ----------
+    def add_run(self, user_id, run_id, detail, score, mode="FAST", when=None, conn=None):
+        """写入一次测评（同一用户同一 run_id 重复写入时忽略）；返回 runs.id，已存在返回 None。
+        conn 由调用方传入时不单独提交（批量写入共用一个事务）"""
+        if conn is None:
+            with self.conn() as c:
+                return self._insert_run(c, user_id, run_id, detail, score, mode, when)
+        return self._insert_run(conn, user_id, run_id, detail, score, mode, when)
+
+    def _insert_run(self, c, user_id, run_id, detail, score, mode, when):
+        when = when or datetime.now()
+        t = when if isinstance(when, str) else when.strftime("%Y-%m-%d %H:%M:%S")
+        cur = c.execute(
+            "INSERT OR IGNORE INTO runs (user_id, run_id, time, score, total, mode) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, run_id, t, int(score), len(detail), mode))
+        if not cur.rowcount:
+            return None
+        pk = cur.lastrowid
+        rows, texts = [], {}
+        for i, r in enumerate(detail, 1):
+            extra = {k: v for k, v in r.items() if k not in _COLS}
+            compact = bool(r.get("qid") and r.get("qhash"))
+            if compact:
+                texts[r["qhash"]] = extra
+            rows.append((pk, int(r.get("index", i)), user_id, r.get("qid") or "", r.get("your_answer"), r.get("correct"),
+                         _is_correct(r), r.get("indicator_id") or "",
+                         r.get("indicator_name") or "", r.get("phase") or "",
+                         json.dumps(r.get("error_cats") or [], ensure_ascii=False),
+                         None if compact else json.dumps(extra, ensure_ascii=False),
+                         r.get("qhash") if compact else None))
+        c.executemany(
+            "INSERT INTO answers (run, idx, user_id, qid, your_answer, correct, is_correct, indicator_id, "
+            "indicator_name, phase, error_cats, payload, qhash) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        c.executemany(
+            "INSERT OR IGNORE INTO texts (qhash, body) VALUES (?, ?)",
+            [(h, zlib.compress(json.dumps(x, ensure_ascii=False).encode("utf-8"))) for h, x in texts.items()])
+        update_cohort(c, user_id, t, int(score), len(detail), [(r[3], r[7], r[8], r[9], r[6]) for r in rows])
+        update_mastery(c, user_id, t, [(r[7], r[8], r[6]) for r in rows])
+        return pk
+
+    # ---------- 读 ----------
+    def is_empty(self):
+        return self.conn().execute("SELECT 1 FROM runs LIMIT 1").fetchone() is None
+
+    def list_runs(self, user_id):
+        """该用户全部测评（按时间升序）：time / score / total / mode / run_id"""
+        rows = self.conn().execute(
+            "SELECT time, score, total, mode, run_id FROM runs WHERE user_id = ? ORDER BY time, id",
+            (user_id,)).fetchall()
+        df = pd.DataFrame([tuple(r) for r in rows], columns=RESULT_FIELDS)
+        df["time"] = pd.to_datetime(df["time"], errors="coerce")
+        return df
+
+    def manifest_version(self, user_id):
+        """该用户测评清单的版本号 (测评数, 最大 runs.id)：只在写入新测评时变化，可作缓存键"""
+        n, last = self.conn().execute(
+            "SELECT count(*), coalesce(max(id), 0) FROM runs WHERE user_id = ?", (user_id,)).fetchone()
+        return n, last
+
+    def run_manifest(self, user_id):
+        """list_runs + 每次测评的各指标错题数 errors=[(indicator_id, indicator_name, 错题数), ...]（错多在前）"""
+        df = self.list_runs(user_id)
+        errors = {}
+        for r in self.conn().execute(
+                "SELECT r.run_id, a.indicator_id, a.indicator_name, count(*) AS n FROM answers a "
+                "JOIN runs r ON r.id = a.run WHERE a.user_id = ? AND a.is_correct = 0 "
+                "GROUP BY a.run, a.indicator_id, a.indicator_name", (user_id,)):
+            errors.setdefault(r["run_id"], []).append((r["indicator_id"], r["indicator_name"], r["n"]))
+        df["errors"] = [sorted(errors.get(rid, []), key=lambda e: -e[2]) for rid in df["run_id"]]
+        return df
+
+    def run_detail(self, user_id, run_id, bank=None):
+        """某次测评的逐题明细（与旧 run_*.json 同格式，含题面/讲评）；不存在返回 None。
+        题面按 qhash 从 texts 取；texts 缺失时用 bank（QuestionBank）按 qid 重建，内容哈希一致才采用"""
+        c = self.conn()
+        run = c.execute("SELECT id FROM runs WHERE user_id = ? AND run_id = ?", (user_id, run_id)).fetchone()
+        if run is None:
+            return None
+        rows = c.execute("SELECT * FROM answers WHERE run = ? ORDER BY idx", (run["id"],)).fetchall()
+        detail = [_answer_to_detail(r) for r in rows]
+        missing = {}
+        for d in detail:
+            if "qhash" in d:
+                missing.setdefault(d["qhash"], []).append(d)
+        if missing:
+            hs = list(missing)
+            for t in c.execute(f"SELECT qhash, body FROM texts WHERE qhash IN ({','.join('?' * len(hs))})", hs):
+                extra = json.loads(zlib.decompress(t["body"]).decode("utf-8"))
+                for d in missing.pop(t["qhash"]):
+                    d.update(extra)
+        if missing and bank is not None:
+            for d in (d for ds in missing.values() for d in ds):
+                q = bank.question(d["qid"], d["index"])
+                full = detail_row(q, d["your_answer"]) if q is not None else None
+                if full is not None and full["qhash"] == d["qhash"]:
+                    d.update({k: v for k, v in full.items() if k not in _COLS})
+        return detail
+
+    def runs_since(self, last_pk=0, batch=500):
+        """按 runs.id 增量遍历：yield (pk, user_id, detail)；只含作答/对错/指标等列，不解题面"""
+        c = self.conn()
+        while True:
+            runs = c.execute("SELECT id, user_id FROM runs WHERE id > ? ORDER BY id LIMIT ?",
+                             (last_pk, batch)).fetchall()
+            if not runs:
+                return
+            ids = [r["id"] for r in runs]
+            q = f"SELECT * FROM answers WHERE run IN ({','.join('?' * len(ids))}) ORDER BY run, idx"
+            by_run = {}
+            for a in c.execute(q, ids):
+                by_run.setdefault(a["run"], []).append(_answer_to_detail(a))
+            for r in runs:
+                yield r["id"], r["user_id"], by_run.get(r["id"], [])
+            last_pk = ids[-1]
+
+
+def _answer_to_detail(a):
+    d = {"index": a["idx"], "qid": a["qid"], "your_answer": a["your_answer"], "correct": a["correct"],
+         "indicator_id": a["indicator_id"], "indicator_name": a["indicator_name"], "phase": a["phase"],
+         "error_cats": json.loads(a["error_cats"] or "[]")}
+    if a["qhash"]:
+        d["qhash"] = a["qhash"]
+    else:
+        d.update(json.loads(a["payload"] or "{}"))
+    return d
+
+
+# ---------- 旧文件迁移 ----------
+def _normalize_legacy(d):
+    """旧明细行 → 现行键名；缺正确答案（无法判分）返回 None"""
+    if not isinstance(d, dict):
+        return None
+    d = {_LEGACY_KEYS.get(k, k): v for k, v in d.items()}
+    for k in ("your_answer", "correct"):
+        v = d.get(k)
+        v = None if v is None or (isinstance(v, float) and v != v) else str(v).strip().upper()
+        d[k] = v or None
+    return d if d["correct"] else None
+
+
+def migrate_files(store, user_data_dir=USER_DATA_DIR, skipped=None):
+    """把 user_data/<uid>/results_runs/run_*.json（及 results.csv 中的模式/时间）导入成绩库；返回新增测评数。
+    无法判分的明细行（缺正确答案）不导入；传入列表 skipped 时逐条记下「uid/文件: 原因」"""
+    added = 0
+    if not os.path.isdir(user_data_dir):
+        return added
+    c = store.conn()
+    for uid in sorted(os.listdir(user_data_dir)):
+        runs_dir = os.path.join(user_data_dir, uid, "results_runs")
+        if not os.path.isdir(runs_dir):
+            continue
+        meta = {}
+        df_csv = load_results_csv(os.path.join(user_data_dir, uid, "results.csv"))
+        if "run_id" in df_csv.columns:
+            for r in df_csv.dropna(subset=["run_id"]).itertuples():
+                meta[str(r.run_id)] = (str(getattr(r, "time", "") or ""), str(getattr(r, "mode", "") or "FAST"))
+        with c:
+            for fn in sorted(os.listdir(runs_dir)):
+                if not (fn.startswith("run_") and fn.endswith(".json")):
+                    continue
+                rid = fn[4:-5]
+                try:
+                    with open(os.path.join(runs_dir, fn), "r", encoding="utf-8") as f:
+                        detail = json.load(f)
+                except Exception:
+                    continue
+                if not isinstance(detail, list):
+                    continue
+                rows = [_normalize_legacy(d) for d in detail]
+                bad = [i for i, d in enumerate(rows, 1) if d is None]
+                detail = [d for d in rows if d is not None]
+                if skipped is not None and bad:
+                    skipped.append(f"{uid}/{fn}: 第 {'、'.join(map(str, bad))} 行缺少正确答案，未导入"
+                                   + ("（整次测评跳过）" if not detail else ""))
+                if not detail:
+                    continue
+                t, mode = meta.get(rid, ("", "FAST"))
+                if not t:
+                    try:
+                        t = datetime.strptime(rid, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
+                    except Exception:
+                        t = ""
+                score = sum(_is_correct(d) for d in detail)
+                if store.add_run(uid, rid, detail, score, mode=mode, when=t, conn=c):
+                    added += 1
+    return added
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="成绩库维护")
+    ap.add_argument("cmd", choices=["migrate"])
+    ap.add_argument("--db", default=RESULTS_DB)
+    ap.add_argument("--user-data", default=USER_DATA_DIR)
+    args = ap.parse_args()
+    skipped = []
+    n = migrate_files(ResultStore(args.db), args.user_data, skipped=skipped)
+    print(f"已导入 {n} 次测评 → {args.db}")
+    for msg in skipped:
+        print(f"  跳过 {msg}")
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+后台写入服务：交卷成绩 / 问答日志交给单个写线程落盘，会话线程只负责入队
+
+- 有界队列：写线程跟不上时 put 最多等 block_timeout 秒，仍满则在调用线程同步写（背压，不丢数据）
+- 批量落盘：一次取出队列中积压的全部任务；成绩共用一个 SQLite 事务（每次测评一个 SAVEPOINT，
+  一条失败只回滚它自己），同一 JSONL 文件的多行合并为一次 write + 一次 fsync
+- 写失败的任务连同异常追加到死信文件（dead_letter），管理页可查看并 retry() 重新入队
+- 同一文件的追加由按路径的锁串行化（同步降级写入与写线程之间也互斥），不会出现行交错
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from .paths import USER_DATA_DIR
+
+_STOP = object()
+DEAD_LETTER = os.path.join(USER_DATA_DIR, "writer_dead_letter.jsonl")
+
+
+class BackgroundWriter:
+    def __init__(self, maxsize=1024, batch=256, block_timeout=2.0, dead_letter=DEAD_LETTER):
+        self.q = queue.Queue(maxsize=maxsize)
+        self.batch = batch
+        self.block_timeout = block_timeout
+        self.dead_letter = dead_letter
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+        self.errors = []  # 最近的写入异常（只保留最后 20 条，供管理页排查）
+        self._thread = threading.Thread(target=self._loop, name="crc-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------- 入队 ----------
+    def add_run(self, store, user_id, run_id, detail, score, mode="FAST", when=None):
+        when = when or datetime.now().strftime("%Y-%m-%d %H:%M:%S")  # 入队时定时间：死信重放后不变
+        self._put(("run", store, (user_id, run_id, detail, score, mode, when)))
+
+    def append_jsonl(self, path, record):
+        self._put(("jsonl", path, json.dumps(record, ensure_ascii=False) + "\n"))
+
+    def _put(self, job):
+        try:
+            self.q.put(job, timeout=self.block_timeout)
+        except queue.Full:
+            self._write([job])
+
+    def flush(self, timeout=None):
+        """等待已入队的任务全部落盘（CLI/测试/退出时用）"""
+        done = threading.Event()
+        self._put(("barrier", done, None))
+        return done.wait(timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self.q.put(_STOP)
+            self._thread.join(timeout=10)
+
+    # ---------- 写线程 ----------
+    def _loop(self):
+        while True:
+            jobs = [self.q.get()]
+            while len(jobs) < self.batch:
+                try:
+                    jobs.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(j is _STOP for j in jobs)
+            self._write([j for j in jobs if j is not _STOP])
+            if stop:
+                return
+
+    def _lock(self, path):
+        with self._locks_guard:
+            return self._locks[path]
+
+    def _write(self, jobs):
+        runs = defaultdict(list)
+        lines = defaultdict(list)
+        barriers = []
+        for kind, target, payload in jobs:
+            if kind == "run":
+                runs[target].append(payload)
+            elif kind == "jsonl":
+                lines[target].append(payload)
+            else:
+                barriers.append(target)
+        for store, items in runs.items():
+            failed = []
+            try:
+                with store.conn() as c:
+                    if not c.in_transaction:
+                        c.execute("BEGIN")
+                    for item in items:
+                        user_id, run_id, detail, score, mode, when = item
+                        c.execute("SAVEPOINT crc_run")
+                        try:
+                            store.add_run(user_id, run_id, detail, score, mode=mode, when=when, conn=c)
+                        except Exception as e:
+                            c.execute("ROLLBACK TO crc_run")
+                            failed.append((item, e))
+                        c.execute("RELEASE crc_run")
+            except Exception as e:  # 提交本身失败：整批都没落盘
+                failed = [(item, e) for item in items]
+            for (user_id, run_id, detail, score, mode, when), e in failed:
+                self._dead({"kind": "run", "user_id": user_id, "run_id": run_id, "detail": detail,
+                            "score": score, "mode": mode, "when": when}, e)
+        for path, chunk in lines.items():
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                with self._lock(path), open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(chunk))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                self._dead({"kind": "jsonl", "path": path, "lines": chunk}, e)
+        for done in barriers:
+            done.set()
+
+    def _error(self, e):
+        self.errors = (self.errors + [f"{datetime.now():%Y-%m-%d %H:%M:%S} {e!r}"])[-20:]
+
+    # ---------- 死信 ----------
+    def _dead(self, record, e):
+        self._error(e)
+        record = dict(record, error=repr(e), ts=time.time())
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter) or ".", exist_ok=True)
+            with self._lock(self.dead_letter), open(self.dead_letter, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception as e2:
+            self._error(e2)
+
+    def dead_letters(self):
+        """死信文件中待重试的记录数"""
+        try:
+            with self._lock(self.dead_letter), open(self.dead_letter, "r", encoding="utf-8") as f:
+                return sum(1 for line in f if line.strip())
+        except FileNotFoundError:
+            return 0
+
+    def retry(self, store, timeout=10):
+        """死信重新入队（成绩写入 store）并等待落盘；仍失败的会再次进入死信。返回重试条数"""
+        with self._lock(self.dead_letter):
+            try:
+                with open(self.dead_letter, "r", encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                return 0
+            os.remove(self.dead_letter)
+        for r in records:
+            if r["kind"] == "run":
+                self.add_run(store, r["user_id"], r["run_id"], r["detail"], r["score"], mode=r["mode"], when=r["when"])
+            else:
+                self._put(("jsonl", r["path"], "".join(r["lines"])))
+        self.flush(timeout)
+        return len(records)
+
+
+def atomic_write_json(path, obj):
+    """整文件写入：临时文件 + fsync + os.replace，读者只会看到旧版或新版"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -1,26 +1,23 @@
 # -*- coding: utf-8 -*-
 # CRC实践核心能力智能评估系统 · 指标驱动讲评与复训（题面隐指标 / 紧凑讲评 / 选项均衡 / 交卷锁卷 / 覆盖7大一级）
 
+import functools
+import importlib.util
 import os
 import re
 import sys
 import json
-import csv
-import random
-import hashlib
+import time
 from datetime import datetime
+from urllib.parse import urlparse
 
 import pandas as pd
 import streamlit as st
-import streamlit.components.v1 as components
-import plotly.express as px
 
 # ==== 可选：如你安装并运行了 Ollama，本地 LLM 问答会更强 ====
-try:
-    import ollama  # type: ignore
-    HAVE_OLLAMA = True
-except Exception:
-    HAVE_OLLAMA = False
+# 只探测是否安装；装了则启动时由 get_llm_scheduler 导入并预载模型，语义检索时才导入 core.embeddings
+HAVE_OLLAMA = importlib.util.find_spec("ollama") is not None
+# plotly 只在 成绩反馈 / 管理后台 的绘图处导入，streamlit.components 只在知识图谱页导入（其余页面冷启动不付这份代价）
 
 # ---------------- 页面基本设置（必须在任何 st.* 之前） ----------------
 st.set_page_config(
@@ -69,39 +66,52 @@ section[data-testid="stSidebarContent"] { padding-top: 0.5rem; }
 </style>
 ''', unsafe_allow_html=True)
 
-# ---- Streamlit 兼容 rerun（新旧版本都能用）----
+# ---- Streamlit 兼容 rerun（新旧版本都能用）；重跑前先结束本次的耗时埋点 / 剖析（_end_rerun 见下文）----
 def _st_rerun():
     try:
         if hasattr(st, "rerun"):
+            _end_rerun()
             st.rerun()
     except Exception:
         pass
 
-# 让同目录模块可导入（auth_code.py）
-sys.path.insert(0, os.path.dirname(__file__))
+# ---- Streamlit 兼容 fragment（局部重跑；旧版本退化为普通函数，行为同整页重跑）----
+_st_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda f: f)
+
+# 让同目录模块可导入（auth_code.py）；每次重跑都会执行到这里，已在 sys.path 中则不再插入
+if os.path.dirname(__file__) not in sys.path:
+    sys.path.insert(0, os.path.dirname(__file__))
 from auth_code import require_login, login_status_bar, is_logged_in
+from core import (
+    read_cases, search_cases, dataset_version, BM25Index, SemanticIndex, OllamaEmbedder, fuse_rankings, GraphNeighbors, graph_from_cases, export_neighbors, latest_neighbors, GraphDB, FulltextSearch, StaticServer, publish_asset, JobRunner, JOB_KINDS, bm25_path, bank_path, span, start_rerun, finish_rerun, SpanSink, ProfileTrigger, PROFILE_MODES, StratIndex, QuestionBank, stem_to_qid, generate_exam, generate_exam_cover7,
+    build_paragraph_advice, detail_row, ResultStore, migrate_files, BackgroundWriter, CohortStats, Mastery, project_mastery,
+    shorten, synthesize_answer, ChatStream, LLMScheduler, build_prompt, DEFAULT_MODEL, AnswerCache, answer_key, case_key,
+    DIFFICULTY_BANDS, AdaptiveTest, update_item_stats,
+)
+
+# —— 耗时埋点（core.spans）：本次重跑内的 span 归到一起，脚本末尾连同页面 / 角色 / 数据集版本落 stats/spans.db ——
+_perf = start_rerun()
+_prof = None  # 本次重跑命中了管理员布置的深度剖析时为 core.profiling.Capture
 
 # ---------------- 基础路径 ----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))          # 自动定位当前文件所在路径
 DATA_XLSX = os.path.join(BASE_DIR, "..", "data", "cases.xlsx") # 向上一级找到 data 文件夹
 GRAPH_HTML = os.path.join(BASE_DIR, "knowledge_graph.html")    # 当前目录下的 HTML 文件
-RESULTS_CSV = os.path.join(BASE_DIR, "results.csv")            # 兼容旧版（已由 user_paths 替代）
-RESULTS_DIR = os.path.join(BASE_DIR, "results_runs")           # 兼容旧版（已由 user_paths 替代）
+USERS_JSON = os.path.join(BASE_DIR, "..", "users.json")        # 用户列表（项目根）
+RESULTS_DB = os.path.join(BASE_DIR, "user_data", "results.db")  # 成绩库（SQLite，替代各用户 results.csv / results_runs）
 
 # ====【新增】每个用户的独立存储路径 ====
 def _current_user():
     return st.session_state.get("auth_user", {})  # {"user_id","name","role"}
 
 def user_paths():
-    """返回当前登录用户的数据根目录/成绩CSV/明细目录/问答日志"""
+    """返回当前登录用户的数据根目录/问答日志（成绩在成绩库，按 uid 查询）"""
     u = _current_user()
     uid = (u.get("user_id") or "anon").strip()
     root = os.path.join(BASE_DIR, "user_data", uid)  # 形如 app/user_data/001/
     return {
         "uid": uid,
         "root": root,
-        "results_csv": os.path.join(root, "results.csv"),
-        "results_dir": os.path.join(root, "results_runs"),
         "qa_log": os.path.join(root, "qa_log.jsonl"),
     }
 
@@ -137,319 +147,265 @@ def inject_theme_css():
 inject_theme_css()
 
 # ---------------- 读取数据（优化：预建搜索列 _search_blob） ----------------
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_cases(path, mtime):
+    """mtime 只作缓存键：案例库文件被替换 / 编辑后重新读取"""
+    return read_cases(path)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_case_index(version, _df):
+    """分层出题索引：与 load_cases 同源，仅在数据变化时重建"""
+    return StratIndex(_df)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_question_bank(version, compiled, _df, _index):
+    """qid → 题目：成绩明细只存 qid/选项/内容哈希，展示讲评时由题库重建题面；有预编译题库（后台任务）时直接取"""
+    return QuestionBank(_df, _index.qids, compiled=compiled)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_dataset_version(path, mtime):
+    return dataset_version(load_cases(path, mtime))
+
+@st.cache_resource(show_spinner=False)
+def load_retrieval_index(version, _df):
+    """问答检索的 BM25 倒排索引：每个数据集版本构建一次；后台任务已预建的直接加载"""
+    path = bm25_path(version)
+    if os.path.exists(path):
+        try:
+            return BM25Index.load(path)
+        except Exception:
+            pass
+    return BM25Index(_df, version=version)
+
+EMBED_MODEL = "nomic-embed-text"  # 语义检索用的 Ollama 向量模型（需先 ollama pull）
+
+@st.cache_resource(show_spinner="正在为案例库计算向量（仅新增/改动的案例）…")
+def load_semantic_index(version, model, _df):
+    """语义检索：向量落盘缓存（stats/embeddings），每个数据集版本只补算变化的行"""
+    return SemanticIndex(_df, OllamaEmbedder(model))
+
+@st.cache_resource(show_spinner=False)
+def load_graph_neighbors(version, graph_version, _df):
+    """图谱邻居集合（core.graph）：已从 Neo4j 导出则用之；否则按当前案例表推出（随数据集版本更新）"""
+    path, source = latest_neighbors()
+    if source != "neo4j":
+        _, path = export_neighbors(graph_from_cases(_df))
+    return GraphNeighbors(path, _df)
+
+def graph_version():
+    path, source = latest_neighbors()
+    return f"{source}:{os.path.basename(path)}" if path else ""
+
+# —— Neo4j（可选）：设置了 NEO4J_URI 且连得上时启用；每进程一个连接池 + 查询结果缓存（core.graphdb） ——
+GRAPHDB_RETRY = 30  # 连接失败后隔多少秒再试
+
+@st.cache_resource(show_spinner=False)
+def _graphdb_connection():
+    return GraphDB.connect()  # 连不上抛错：异常不进缓存，下次调用重新连接
+
+@st.cache_resource(show_spinner=False)
+def _graphdb_failure():
+    return {"t": 0.0, "error": ""}
+
+def get_graphdb():
+    """未配置或连不上时为 None；失败不缓存，GRAPHDB_RETRY 秒后的调用会重连（期间直接返回 None，不拖慢页面）"""
+    if not os.getenv("NEO4J_URI"):
+        return None
+    fail = _graphdb_failure()
+    if time.time() - fail["t"] < GRAPHDB_RETRY:
+        return None
+    try:
+        return _graphdb_connection()
+    except Exception as e:
+        fail.update(t=time.time(), error=f"{type(e).__name__}: {e}")
+        return None
+
+def get_fulltext():
+    """案例搜索与问答检索下推到图数据库全文索引；未启用 Neo4j 时为 None"""
+    db = get_graphdb()
+    return FulltextSearch(db) if db is not None else None
+
+# —— 知识图谱 HTML：发布到旁路静态服务（core.static_server），页面只引用 URL ——
+STATIC_PORT = 8502                                        # 旁路静态服务端口
+STATIC_HOST = os.getenv("GRAPH_STATIC_HOST", "127.0.0.1")  # 绑定地址：默认只对本机浏览器可达（服务无鉴权）
+STATIC_BASE = os.getenv("GRAPH_STATIC_BASE", "")         # 经反向代理对外（https / 远程访问）时设为其地址，如 https://host/kg-static
+_LOOPBACK = {"127.0.0.1", "localhost", "::1"}
+
+@st.cache_resource(show_spinner=False)
+def get_static_server():
+    try:
+        return StaticServer(host=STATIC_HOST, port=STATIC_PORT)
+    except OSError:  # 端口被占用：回退为内联
+        return None
+
 @st.cache_data(show_spinner=False)
-def load_cases(path):
-    need = ["案例", "能力指标", "试验项目", "试验阶段", "岗位职责", "问题", "解决方法", "整改结果", "反思"]
-    if not os.path.exists(path):
-        df = pd.DataFrame({c: [] for c in need})
-        df["_search_blob"] = ""
-        return df[need + ["_search_blob"]].copy()
-
-    df = pd.read_excel(path)
-    for c in need:
-        if c not in df.columns:
-            df[c] = ""
-        df[c] = df[c].fillna("").astype(str)
-    df["_search_blob"] = (df["案例"] + " " + df["能力指标"] + " " + df["试验项目"] + " " + df["试验阶段"] + " " + df["问题"]).str.lower()
-    return df[need + ["_search_blob"]].copy()
-
-df = load_cases(DATA_XLSX)
+def publish_graph_html(path, mtime):
+    return publish_asset(path)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def read_graph_html(path, mtime):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def graph_asset_url(path):
+    """图谱页在旁路服务上的地址；浏览器够不着（https 页面、只绑本机而从别的机器访问）时返回空串，回退为内联"""
+    base = STATIC_BASE.rstrip("/")
+    if not base:
+        server = get_static_server()
+        if server is None:
+            return ""
+        url = urlparse(st.context.url or "")
+        if url.scheme == "https":  # 旁路服务只有 http，https 页面里会被当作混合内容拦下：需配置 GRAPH_STATIC_BASE
+            return ""
+        host = url.hostname or (st.context.headers.get("Host") or "localhost").rsplit(":", 1)[0]
+        if server.host in _LOOPBACK and host not in _LOOPBACK:
+            return ""
+        base = f"http://{host}:{server.port}"
+    return f"{base}/{publish_graph_html(path, os.path.getmtime(path))}"
+
+with span("load_data"):
+    _data_mtime = os.path.getmtime(DATA_XLSX) if os.path.exists(DATA_XLSX) else 0
+    df = load_cases(DATA_XLSX, _data_mtime)
+    _version = load_dataset_version(DATA_XLSX, _data_mtime)  # 内容哈希：各索引按它缓存，改了案例（行数不变也算）即重建
+    case_index = load_case_index(_version, df)
+    _bank_file = bank_path(_version)
+    question_bank = load_question_bank(_version, _bank_file if os.path.exists(_bank_file) else None, df, case_index)
 if len(df) == 0:
     st.warning(f"未找到案例库文件：{DATA_XLSX}。请先上传/放置该文件。")
 
-# ---------------- 工具函数 ----------------
-def shorten(s, n=80):
-    s = str(s or "").strip()
-    return s if len(s) <= n else s[:n-1] + "…"
-
-def parse_indicator(text):
-    """从'能力指标'解析编号和名称，支持多种写法：'5.2.3 XXX' / 'XXX(5.2.3)' / 'XXX'"""
-    t = str(text).strip()
-    if not t: return "", ""
-    m = re.search(r'(\d+(?:\.\d+){0,3})', t)
-    id_ = m.group(1) if m else ""
-    name = re.sub(r'^\s*\d+(?:\.\d+){0,3}\s*[-．。\s]*', '', t)
-    name = re.sub(r'[\(（]\s*\d+(?:\.\d+){0,3}\s*[\)）]', '', name).strip()
-    return id_, name or t
-
-def parse_first_level(id_str: str) -> str:
-    """从 '5.2.3' 取一级 '5'；不合法则返空"""
-    m = re.match(r'^\s*(\d+)', str(id_str).strip())
-    return m.group(1) if m else ""
-
-ERROR_CATS = ["延后处理", "口头代替", "越权修改", "不留痕或不同步"]
-
-def pick_error_distractors(rng: random.Random):
-    return rng.sample(ERROR_CATS, 3)
-
-def _normalize_end_punct(s: str) -> str:
-    return re.sub(r'[。；;.\s]+$', '', s)
-
-def _stable_seed(*parts) -> int:
-    """稳定随机种子：重启/不同机器一致"""
-    s = "||".join(str(p) for p in parts)
-    return int(hashlib.sha256(s.encode("utf-8")).hexdigest()[:12], 16)
-
-def craft_correct_sentence(soln_text, result_text, issue_text):
-    """把解决方法+整改结果动作化（不提指标），并限制为两要素并行句式"""
-    base = (soln_text or "") + "；" + (result_text or "")
-    base = _normalize_end_punct(base)
-    want = []
-    cand = ["由研究者复核签名", "纸质与系统同步修订", "注明修改原因与日期", "依据原始证据核对", "按访视窗口处理"]
-    for c in cand:
-        if c in base:
-            want.append(c)
-    if not want:
-        want = ["由研究者复核签名", "纸质与系统同步修订"]
-    want = list(dict.fromkeys(want))[:2]  # 最多两项
-    return f"应{want[0]}，并{want[1]}；同时依据原始记录完善留痕"
-
-def craft_distractor_sentence(kind):
-    if kind == "延后处理":
-        return "应暂缓修订并待下次集中处理，并保持现有记录不变；同时通过口头沟通提醒窗口"
-    if kind == "口头代替":
-        return "应先口头告知研究者留意并记录讨论要点，并在必要时再考虑修订；同时不做纸质与系统同步"
-    if kind == "越权修改":
-        return "应由CRC直接在系统更正并定稿，并在备注说明原因；同时纸质记录日后再补"
-    if kind == "不留痕或不同步":
-        return "应在EDC备注一次并上传截图，并保持纸质记录原状；同时无需另行说明原因与日期"
-    return "应简要记录情况并持续观察，并避免影响当前流程；同时不做额外处理"
-
-def balance_option_lengths(opts, rng: random.Random):
-    """拉齐四个选项长度与结构：目标 40±10 字；差异 ≤12；统一双分句"""
-    tail_bank = ["；同时记录讨论要点", "；同时保留沟通时间", "；同时更新工作清单"]
-    def ensure_two_clause(s):
-        s = _normalize_end_punct(s)
-        return s if "；" in s else s + "；同时完善记录"
-    opts = [ensure_two_clause(o) for o in opts]
-    L = [len(o) for o in opts]
-    target = max(min(int(sum(L)/len(L)), 48), 36)
-    out = []
-    for s in opts:
-        if len(s) > target + 12:
-            s = re.sub(r'立即|尽快|务必|严格|重点', '', s)
-            s = s.replace("并且", "并").replace("以及", "并").replace("随后", "同时")
-            s = re.sub(r'；.*$', '；同时完善记录', s)
-        elif len(s) < target - 12:
-            s += random.choice(tail_bank)
-        out.append(s)
-    return out
-
-def make_stem(project=None, phase=None, issue=None):
-    """题干：试验项目 + 试验阶段 + 问题 + 提问句"""
-    pj = f"在“{str(project).strip()}”" if project else "在研究现场"
-    ph = f"的{str(phase).strip()}中" if phase else "中"
-    detail = (str(issue or "记录与要求不一致")).strip()
-    detail = re.sub(r"。+$", "", detail)
-    stem = f"{pj}{ph}，{detail}。下一步最合适的处置是？"
-    stem = re.sub(r"阶段阶段", "阶段", stem)
-    stem = re.sub(r"。。+", "。", stem)
-    return stem
-
-def build_question_from_row(row, idx):
-    """核心出题：题面隐指标 + 均衡选项 + 追踪正确项（稳定种子）"""
-    indicator_id, indicator_name = parse_indicator(getattr(row, "能力指标", ""))
-    stem = make_stem(getattr(row, "试验项目", ""), getattr(row, "试验阶段", ""), getattr(row, "问题", ""))
-
-    # 稳定随机种子，避免 rerun 抖动
-    qseed = _stable_seed(getattr(row, "案例", ""), getattr(row, "问题", ""), getattr(row, "整改结果", ""))
-    rng_local = random.Random(qseed)
-
-    raw = [(craft_correct_sentence(getattr(row,"解决方法",""), getattr(row,"整改结果",""), getattr(row,"问题","")), True)]
-    kinds = pick_error_distractors(rng_local)
-    raw += [(craft_distractor_sentence(k), False) for k in kinds]
-
-    balanced_texts = balance_option_lengths([t for t,_ in raw], rng_local)
-    balanced = list(zip(balanced_texts, [ok for _, ok in raw]))
-
-    order = list(range(4))
-    rng_local.shuffle(order)
-    shuffled = [balanced[i] for i in order]
-    options_text = [t for t,_ in shuffled]
-    correct_idx = [i for i,(_,ok) in enumerate(shuffled) if ok][0]
-    answer_letter = "ABCD"[correct_idx]
-
-    label_order = ["A","B","C","D"]
-    why_wrong_map = {}
-    for i, lab in enumerate(label_order):
-        _, is_right = shuffled[i]
-        why_wrong_map[lab] = "正确项。" if is_right else "常见误区：仅备注或口头说明、延后处理、CRC越权或单端修补。"
-
-    explanation = {
-        "why_right": "补齐原始依据并由研究者复核签名，纸质与系统同步修订并注明原因/日期，确保可追溯。",
-        "how_to": ["核对原始证据","补填纸质并研究者签名日期","EDC同步修订并填写修改原因","卷宗归档与版本控制"],
-        "why_wrong": why_wrong_map,
-        "edge": "如涉主要终点/安全事件，应按方案触发上报流程。"
-    }
-
-    return {
-        "idx": idx,
-        "stem": stem,
-        "options": {"A": options_text[0], "B": options_text[1], "C": options_text[2], "D": options_text[3]},
-        "answer": answer_letter,
-        "meta": {
-            "indicator_id": indicator_id, "indicator_name": indicator_name,
-            "phase": getattr(row, "试验阶段", "") or "", "project": getattr(row, "试验项目", "") or "",
-            "error_cats": kinds,
-            "first_level": parse_first_level(indicator_id)
-        },
-        "explain": explanation
-    }
-
-def generate_exam(df_src, n=20, seed=None, filter_indicator=None, filter_phase=None):
-    """随机卷（保留）：可按指标文本/阶段过滤"""
-    rng = random.Random(seed if seed is not None else 2025)
-    view = df_src.copy()
-    if filter_indicator:
-        view = view[view["能力指标"].str.contains(filter_indicator, regex=False)]
-    if filter_phase:
-        view = view[view["试验阶段"] == filter_phase]
-    if len(view) == 0:
-        view = df_src.copy()
-    rows = view.sample(n=min(n, len(view)), random_state=rng.randint(0, 10**9))
-    return [build_question_from_row(row, i) for i, row in enumerate(rows.itertuples(), 1)]
-
-def generate_exam_cover7(df_src, n=20, seed=None, filter_indicator=None, filter_phase=None):
-    """
-    “尽量覆盖七大一级指标”的出题器：
-    - 先按能力编号的一级（1/2/3/…）分桶
-    - 均匀轮询各桶抓题，保证题目尽量覆盖到不同一级
-    - 如题量 > 桶数，继续轮询补齐
-    """
-    rng = random.Random(seed if seed is not None else 2026)
-    view = df_src.copy()
-    if filter_indicator:
-        view = view[view["能力指标"].str.contains(filter_indicator, regex=False)]
-    if filter_phase:
-        view = view[view["试验阶段"] == filter_phase]
-    if len(view) == 0:
-        view = df_src.copy()
-
-    valid_head = set(list("1234567"))
-    buckets = {}
-    for row in view.itertuples():
-        iid, _ = parse_indicator(getattr(row, "能力指标", ""))
-        lvl = parse_first_level(iid) or "X"
-        if lvl not in valid_head:
-            lvl = "X"
-        buckets.setdefault(lvl, []).append(row)
-
-    for k in list(buckets.keys()):
-        rng.shuffle(buckets[k])
-
-    order = sorted(buckets.keys(), key=lambda x: ("X" in x, x))  # 把无编号桶放最后
-    if not order:
-        rows = view.sample(n=min(n, len(view)), random_state=rng.randint(0, 10**9))
-        return [build_question_from_row(r, i) for i, r in enumerate(rows.itertuples(), 1)]
-
-    picked = []
-    ptr = {k:0 for k in order}
-    while len(picked) < min(n, len(view)):
-        for k in order:
-            if len(picked) >= min(n, len(view)): break
-            p = ptr[k]
-            if p < len(buckets[k]):
-                picked.append(buckets[k][p])
-                ptr[k] += 1
-    return [build_question_from_row(r, i) for i, r in enumerate(picked[:n], 1)]
-
-# —— 段落化个性化建议（总评 + 指标段落）——
-def build_paragraph_advice(detail_rows, top_k=3):
-    ERROR_CATS = ["延后处理","口头代替","越权修改","不留痕或不同步"]
-    total = len(detail_rows)
-    correct = sum(1 for r in detail_rows if r["your_answer"] == r["correct"])
-    score100 = correct * 5
-    wrong_rows = [r for r in detail_rows if r["your_answer"] != r["correct"]]
-
-    cat_count = {c:0 for c in ERROR_CATS}
-    for r in wrong_rows:
-        for c in r.get("error_cats", []):
-            cat_count[c] += 1
-    cat_desc = []
-    if any(cat_count.values()):
-        if cat_count["延后处理"]:
-            cat_desc.append("【延后处理】纠偏不及时，易扩大时间窗/依从性风险。落地做法：为关键窗口与里程碑设置提醒，尽量实现当日闭环。")
-        if cat_count["口头代替"]:
-            cat_desc.append("【口头代替】记录不可追溯。落地做法：所有沟通转化为书面/系统留痕，统一标注日期与责任人。")
-        if cat_count["越权修改"]:
-            cat_desc.append("【越权修改】CRC 代替研究者批注/修改不合规。落地做法：严格执行“研究者复核+签名”，并记录修改原因与日期。")
-        if cat_count["不留痕或不同步"]:
-            cat_desc.append("【不留痕/不同步】纸质与系统不同步。落地做法：双端同步修订并完成版本控制。")
-    cat_text = " ".join(cat_desc) if cat_desc else "本次未见明显共性误区。"
-
-    agg = {}
-    for r in wrong_rows:
-        key = (r.get("indicator_id",""), r.get("indicator_name","未标注指标"))
-        ph = r.get("phase") or "未标注阶段"
-        agg.setdefault(key, {"cnt":0, "phase":{}})
-        agg[key]["cnt"] += 1
-        agg[key]["phase"][ph] = agg[key]["phase"].get(ph,0) + 1
-    top_inds = sorted(agg.items(), key=lambda kv: -kv[1]["cnt"])[:top_k]
-
-    weak_list = "、".join([f"{iid or ''} {iname}".strip() for (iid, iname), _ in top_inds]) or "—"
-    summary_html = (
-        f"<div class='review-card'>"
-        f"总评：本次答对 <b>{correct}/{total}</b> 题（<b>{score100} 分/100 分</b>）。"
-        f"薄弱能力集中在：<b>{weak_list}</b>。{cat_text}"
-        f"</div>"
-    )
-
-    def tips_by_indicator(name: str):
-        if not name:
-            return ["研究者复核签名","纸质与系统同步修订","注明原因与日期","卷宗归档与版本控制"]
-        if ("知情" in name) or ("ICF" in name.upper()):
-            return ["版本一致与签署先后","谈话要点与撤回/再签记录","签字日期与身份核验","纸质/系统一致"]
-        if "样本" in name:
-            return ["采集-处理-保存-运输时间链完整","标签与记录双核对","温控/离心参数留痕","交接与异常说明"]
-        if ("AE" in name.upper()) or ("不良" in name):
-            return ["定义与分级判定","关联性与严重性评估","时限内上报流程","原始依据与记录一致性"]
-        return ["研究者复核签名","纸质与系统同步修订","注明原因与日期","按方案与窗口处理"]
-
-    indicator_html_list = []
-    for (iid, iname), v in top_inds:
-        ph = sorted(v["phase"].items(), key=lambda x: -x[1])[0][0] if v["phase"] else "未标注阶段"
-        tips = "；".join(tips_by_indicator(iname)) + "。"
-        indicator_html_list.append(
-            f"<div class='review-card'>"
-            f"<b>{iid or ''} {iname or '未标注指标'}</b>：本次主要在 <b>{ph}</b> 暴露薄弱。"
-            f"建议复习路径：到 <b>『案例题库』</b> 中用关键字 “{iname or '相关指标'}” 过滤该阶段的相关案例，先通读再对照 SOP/方案逐项核查；"
-            f"操作训练按以下要点完成：{tips} 完成后再做 10 题专项小测巩固。"
-            f"</div>"
-        )
+# —— 成绩库：进程内共享一个实例；库为空时先导入旧版文件（只发生一次） ——
+@st.cache_resource(show_spinner=False)
+def get_result_store():
+    store = ResultStore(RESULTS_DB)
+    if store.is_empty():
+        migrate_files(store, os.path.join(BASE_DIR, "user_data"))
+    return store
+
+result_store = get_result_store()
+
+# —— 后台写线程：交卷/问答日志只入队，落盘不占会话线程 ——
+@st.cache_resource(show_spinner=False)
+def get_writer():
+    return BackgroundWriter()
+
+writer = get_writer()
+
+# —— LLM 调度器：全进程共享，最多 LLM_CONCURRENCY 路并发生成，其余按先来后到排队；启动时即创建并预载模型 ——
+LLM_CONCURRENCY = 2
+
+@st.cache_resource(show_spinner=False)
+def get_llm_scheduler():
+    sched = LLMScheduler(concurrency=LLM_CONCURRENCY)
+    sched.warm_up(DEFAULT_MODEL)
+    return sched
+
+if HAVE_OLLAMA:
+    get_llm_scheduler()  # 进程内首次重跑即创建并预载模型，不等到第一次问答
+
+# —— AI 润色答案缓存（LRU + SQLite）：启动时（及案例库换版本时）清掉其他数据集版本的条目，按各用户问答日志的高频问题预热 ——
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_answer_cache(version):
+    cache = AnswerCache()
+    cache.purge(keep_version=version)
+    cache.warm(os.path.join(BASE_DIR, "user_data"), version=version)
+    return cache
+
+if HAVE_OLLAMA:
+    get_answer_cache(_version)  # 首次重跑即建好并预热，不等到第一次问答
+
+# —— 后台任务（core.jobs）：进程池执行导入 / 图谱页面 / 题库 / 索引构建，状态落 stats/jobs.db ——
+@st.cache_resource(show_spinner=False)
+def get_job_runner():
+    return JobRunner()
+
+@st.cache_resource(show_spinner=False)
+def get_span_sink():
+    return SpanSink()
+
+# —— 深度剖析（core.profiling）：管理员布置"某页面接下来 N 次重跑"，进程内共享一个布置 ——
+@st.cache_resource(show_spinner=False)
+def get_profile_trigger():
+    return ProfileTrigger()
+
+def _end_rerun():
+    """结束本次重跑：存档剖析（若有）并写入耗时埋点；可重复调用"""
+    global _prof
+    if _prof is not None:
+        capture, _prof = _prof, None
+        try:
+            get_profile_trigger().finish(capture)
+        except OSError:
+            pass
+    finish_rerun(get_span_sink())
+
+def _st_stop():
+    """页面分支里提前结束：先结束本次的耗时埋点 / 剖析再 st.stop()"""
+    _end_rerun()
+    st.stop()
 
-    return summary_html, indicator_html_list
+mastery = Mastery(result_store)  # 个人指标掌握度（随交卷增量更新，见 core.mastery）
 
-# ---------------- 成绩CSV读取（鲁棒+可重建） ----------------
-def load_results_csv(path):
-    if not os.path.exists(path):
-        return pd.DataFrame(columns=["time","score","total","mode","run_id"])
+# —— 成绩清单与趋势图：按 (用户, 清单版本) 缓存，只有写入新测评后才重算 ——
+@st.cache_data(show_spinner=False, max_entries=256)
+def load_run_manifest(uid, version):
+    dft = result_store.run_manifest(uid)
+    dft["时间"] = dft["time"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    dft["得分题数"] = pd.to_numeric(dft["score"], errors="coerce").fillna(0).astype(int)
+    dft["分数"] = dft["得分题数"] * 5
+    dft["题量"] = pd.to_numeric(dft["total"], errors="coerce").fillna(0).astype(int)
+    dft["答对/题量"] = dft["得分题数"].astype(str) + "/" + dft["题量"].astype(str)
+    return dft
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def score_trend_figure(uid, version):
+    import plotly.express as px  # 按需导入：只有成绩反馈页画趋势图时才加载
+    dft = load_run_manifest(uid, version)
+    fig = px.line(dft, x="time", y="分数", markers=True, title="成绩趋势",
+                  labels={"time":"时间", "分数":"分数"})
+    fig.update_layout(height=420, margin=dict(l=20, r=20, t=50, b=10))
+    return fig
+
+# —— 用户列表：按文件修改时间缓存，管理后台不再每次重跑都读盘 ——
+@st.cache_data(show_spinner=False)
+def load_users(path, mtime):
     try:
-        df = pd.read_csv(path, encoding="utf-8", engine="python", on_bad_lines="skip")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
     except Exception:
-        df = pd.read_csv(path, encoding="gbk", engine="python", on_bad_lines="skip")
-    df = df.rename(columns={"时间":"time","得分":"score","题量":"total","模式":"mode","批次":"run_id"})
-    keep = ["time","score","total","mode","run_id"]
-    return df[[c for c in keep if c in df.columns]].copy()
-
-def rebuild_results_from_runs(runs_dir: str):
-    rows = []
-    if os.path.isdir(runs_dir):
-        for fn in os.listdir(runs_dir):
-            if fn.endswith(".json") and fn.startswith("run_"):
-                rid = fn.replace("run_", "").replace(".json", "")
-                try:
-                    t = datetime.strptime(rid, "%Y%m%d_%H%M%S").strftime("%Y-%m-%d %H:%M:%S")
-                except Exception:
-                    t = ""
-                try:
-                    with open(os.path.join(runs_dir, fn), "r", encoding="utf-8") as f:
-                        detail = json.load(f)
-                    total = len(detail)
-                    wrong = sum(1 for d in detail if d["your_answer"] != d["correct"])
-                    rows.append({"time": t, "score": total-wrong, "total": total, "mode": "FAST", "run_id": rid})
-                except Exception:
-                    pass
-    return pd.DataFrame(rows, columns=["time","score","total","mode","run_id"])
+        return []
+
+# —— 题目统计（难度/区分度/干扰项）：增量汇总全部用户的明细，10 分钟内复用 ——
+@st.cache_resource(show_spinner=False, ttl=600)
+def load_item_stats():
+    # 旧明细没有 qid：用当前题库的题干反查
+    return update_item_stats(result_store, resolve=stem_to_qid(df))
+
+# ---------------- 题目卡片（fragment：作答只重跑本题，不触发整页重跑） ----------------
+def _read_bytes(path):
+    """下载按钮的延迟数据：点击下载时才读文件，重跑时不读"""
+    with open(path, "rb") as f:
+        return f.read()
+
+def _picked_letter(picked_label):
+    if not picked_label:
+        return None
+    m = re.match(r"^([ABCD])\.", picked_label.strip())
+    return m.group(1) if m else None
+
+@_st_fragment
+def render_question_card(q, locked):
+    st.markdown("<div class='question-card'>", unsafe_allow_html=True)
+    st.markdown(f"<div class='question-title'>题目 {q['idx']}</div>", unsafe_allow_html=True)
+    st.write(q["stem"])
+
+    label_list = [f"{k}. {q['options'][k]}" for k in "ABCD"]
+    picked_label = st.radio(
+        "请选择答案", label_list, index=None, key=f"Q_{q['idx']}", horizontal=False,
+        disabled=locked
+    )
+    st.session_state["user_answers"][q['idx']] = _picked_letter(picked_label)
+
+    st.markdown("</div>", unsafe_allow_html=True)
 
 # 只调用一次，避免重复按钮ID
 login_status_bar()
@@ -488,6 +444,8 @@ with st.sidebar:
 
 # 后续页面分支都用这个变量
 menu = st.session_state["menu"]
+_perf.page, _perf.role, _perf.version = menu, uinfo.get("role", ""), _version
+_prof = get_profile_trigger().take(menu, role=_perf.role, version=_perf.version, rerun=_perf.id)
 
 # ---------------- 页面：案例题库 ----------------
 if menu == "📚 案例题库":
@@ -505,15 +463,16 @@ if menu == "📚 案例题库":
         fullwidth = st.toggle("全宽表格模式（无横向滚动，一页看全）", value=True)
 
     # —— 过滤 ----
-    df_view = df.copy()
-    if stage != "全部":
-        df_view = df_view[df_view["试验阶段"] == stage]
-    if q.strip():
-        qs = q.strip().lower()
+    fulltext = get_fulltext() if q.strip() else None
+    df_view = None
+    if fulltext is not None:
         try:
-            df_view = df_view[df_view["_search_blob"].str.contains(re.escape(qs), regex=True)]
-        except Exception:
-            df_view = df_view[df_view["_search_blob"].str.contains(qs, regex=False)]
+            df_view = fulltext.search_frame(q, None if stage == "全部" else stage)
+            st.caption(f"图数据库全文检索：按相关度排序，最多显示前 500 条（{len(df_view)} 条）")
+        except Exception as e:
+            st.info(f"图数据库检索不可用，已改用本地筛选。原因：{e}")
+    if df_view is None:
+        df_view = search_cases(df, q, None if stage == "全部" else stage)
 
     # —— 页码：用 session_state 保存，并在过滤条件变化时重置到第 1 页 ----
     _filters_key = f"{q.strip()}|{stage}|{per_page}"
@@ -578,12 +537,40 @@ if menu == "📚 案例题库":
 elif menu == "🌐 知识图谱":
     st.markdown("<div class='section-title'>🌐 知识图谱</div>", unsafe_allow_html=True)
     if os.path.exists(GRAPH_HTML):
-        with open(GRAPH_HTML, "r", encoding="utf-8") as f:
-            raw_html = f.read()
-        components.html(raw_html, height=760, scrolling=False)  # 高度≥680，避免留白/滚动条
+        import streamlit.components.v1 as components
+        # 旁路静态服务可用时只输出 iframe 引用（浏览器长期缓存、gzip 预压缩）；否则回退为内联（内容按修改时间缓存）
+        asset_url = graph_asset_url(GRAPH_HTML)
+        if asset_url:
+            components.iframe(asset_url, height=760, scrolling=False)  # 高度≥680，避免留白/滚动条
+        else:
+            components.html(read_graph_html(GRAPH_HTML, os.path.getmtime(GRAPH_HTML)), height=760, scrolling=False)
     else:
         st.warning(f"尚未找到 {GRAPH_HTML}，请先生成。")
 
+    graphdb = get_graphdb()
+    if graphdb is None and os.getenv("NEO4J_URI"):
+        st.caption(f"图数据库暂不可用（{_graphdb_failure()['error']}），{GRAPHDB_RETRY} 秒后自动重连。")
+    if graphdb is not None:
+        with st.expander("🔎 指标下钻与相关案例（实时查询图数据库）", expanded=False):
+            try:
+                level = st.radio("指标层级", ["一级", "二级", "三级"], index=2, horizontal=True, key="kg_level")
+                inds = graphdb.indicators(level)
+                if not inds:
+                    st.info("图数据库中没有该层级的指标。")
+                else:
+                    pick = st.selectbox("能力指标", inds, key="kg_indicator",
+                                        format_func=lambda r: f"{r['name']}（直接挂载 {r['cases']} 个案例）")
+                    rows = graphdb.indicator_cases(pick["code"])
+                    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+                    if rows:
+                        case_pick = st.selectbox("查看相关案例（共享指标 / 岗位 / 阶段）", [r["案例"] for r in rows],
+                                                 key="kg_case")
+                        related = graphdb.related_cases(case_pick)
+                        st.dataframe(pd.DataFrame(related).rename(columns={"n": "共享关系数"}),
+                                     use_container_width=True, hide_index=True)
+            except Exception as e:
+                st.info(f"图数据库查询失败：{e}")
+
 # ---------------- 页面：能力评估 ----------------
 elif menu == "📝 能力评估":
     st.markdown("<div class='section-title'>📝 能力评估</div>", unsafe_allow_html=True)
@@ -594,21 +581,56 @@ elif menu == "📝 能力评估":
     if "submitted" not in st.session_state: st.session_state["submitted"] = False
     if "last_detail" not in st.session_state: st.session_state["last_detail"] = []
     if "last_score" not in st.session_state: st.session_state["last_score"] = 0
+    if "adaptive" not in st.session_state: st.session_state["adaptive"] = None  # (AdaptiveTest, {qid: 题目}, 当前题)
+
+    def _submit_paper(paper, answers, mode="FAST"):
+        """评分 + 入队落盘（写线程），并切到交卷后的展示"""
+        store_rows, score = [], 0
+        for q in paper:
+            ua = answers.get(q["idx"])
+            if ua == q["answer"]: score += 1
+            store_rows.append(detail_row(q, ua))
+        paths = user_paths()
+        run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        writer.add_run(result_store, paths["uid"], run_id, store_rows, score, mode=mode)
+        # 讲评用的掌握度：库里已有的 + 本次（内存中计入，不等写线程落盘）
+        st.session_state["last_mastery"] = project_mastery(
+            mastery.as_dict(paths["uid"]),
+            [(r["indicator_id"], r["indicator_name"], r["your_answer"] == r["correct"]) for r in store_rows])
+        st.session_state["paper"] = paper
+        st.session_state["submitted"] = True
+        st.session_state["last_detail"] = store_rows
+        st.session_state["last_score"] = score
 
     with st.expander("🔧 高级筛选（可选）", expanded=False):
-        colf1, colf2, colf3 = st.columns([2,1,1])
+        colf1, colf2, colf3, colf4 = st.columns([2,1,1,1])
         with colf1: indicator_filter = st.text_input("专项练习：输入能力指标编号或名称片段","")
-        with colf2: phase_filter = st.selectbox("限定试验阶段（可空）", [""] + sorted(df["试验阶段"].unique().tolist()))
+        with colf2: phase_filter = st.selectbox("限定试验阶段（可空）", [""] + sorted(case_index.by_phase))
         with colf3: n_items = st.selectbox("题量", [10, 15, 20, 25, 30], index=2)
+        with colf4: band_pick = st.selectbox("难度档（按历史答对率）", ["全部"] + list(DIFFICULTY_BANDS))
+        adaptive_on = st.checkbox("自适应测评：逐题作答，按作答结果选下一题，能力估计足够稳定即提前结束（题量为上限）",
+                                  key="adaptive_on")
 
     colA, colB = st.columns([1, 3])
     with colA:
         if st.button("🧾 生成试卷", use_container_width=True, disabled=st.session_state["submitted"] is True):
-            st.session_state["paper"] = generate_exam_cover7(
-                df, n=n_items,
+            paper = generate_exam_cover7(
+                df, n=max(3 * n_items, 30) if adaptive_on else n_items,  # 自适应：先抽一个覆盖七大一级的候选池
                 filter_indicator=indicator_filter.strip() or None,
-                filter_phase=phase_filter.strip() or None
+                filter_phase=phase_filter.strip() or None,
+                index=case_index,
+                band=DIFFICULTY_BANDS.get(band_pick),
+                item_stats=load_item_stats() if band_pick in DIFFICULTY_BANDS or adaptive_on else None,
             )
+            st.session_state["adaptive"] = None
+            if adaptive_on and paper:
+                # 1PL 难度 b 来自历史答对率（未校准的题按中等）；题量达上限或标准误足够小即停止
+                qids = [q["qid"] for q in paper]
+                test = AdaptiveTest(qids, load_item_stats().rasch_b(qids), max_items=n_items, min_items=5)
+                pool = {q["qid"]: q for q in paper}
+                st.session_state["adaptive"] = (test, pool, dict(pool[test.next_qid()], idx=1))
+                paper = []
+            st.session_state["paper"] = paper
             st.session_state["user_answers"] = {}
             st.session_state["submitted"] = False
             st.session_state["last_detail"] = []
@@ -616,69 +638,47 @@ elif menu == "📝 能力评估":
     with colB:
         st.info("题型：单选；选项长度均衡；交卷后提供基于能力指标的个性化讲评与复训。")
 
+    # 自适应测评：已答的题锁定显示（保留选项状态），只有当前题可作答
+    if st.session_state["adaptive"] is not None and not st.session_state["submitted"]:
+        test, pool, cur = st.session_state["adaptive"]
+        asked = [dict(pool[test.qids[j]], idx=i) for i, j in enumerate(test.asked, 1)]
+        for q in asked:
+            render_question_card(q, True)
+        st.caption(f"自适应测评：第 {cur['idx']} 题（最多 {test.max_items} 题）｜"
+                   f"当前能力估计 θ = {test.theta:+.2f}，标准误 {test.se:.2f}")
+        render_question_card(cur, False)
+        if st.button("➡️ 确认本题", type="primary", use_container_width=True, key="adaptive_next"):
+            ua = _picked_letter(st.session_state.get(f"Q_{cur['idx']}"))
+            if not ua:
+                st.error("请先作答本题。")
+                _st_stop()
+            test.record(cur["qid"], ua == cur["answer"])
+            asked.append(cur)
+            st.session_state["user_answers"][cur["idx"]] = ua
+            nxt = test.next_qid()
+            if nxt is None:
+                _submit_paper(asked, st.session_state["user_answers"], mode="ADAPTIVE")
+            else:
+                st.session_state["adaptive"] = (test, pool, dict(pool[nxt], idx=cur["idx"] + 1))
+            _st_rerun()
+
     # 渲染题目（提交后锁定选项）
     if st.session_state["paper"]:
+        locked = st.session_state["submitted"]
         for q in st.session_state["paper"]:
-            st.markdown("<div class='question-card'>", unsafe_allow_html=True)
-            st.markdown(f"<div class='question-title'>题目 {q['idx']}</div>", unsafe_allow_html=True)
-            st.write(q["stem"])
-            key = f"Q_{q['idx']}"
-
-            opts = {"A": q["options"]["A"], "B": q["options"]["B"], "C": q["options"]["C"], "D": q["options"]["D"]}
-            label_list = [f"{k}. {v}" for k, v in opts.items()]
-            picked_label = st.radio(
-                "请选择答案", label_list, index=None, key=key, horizontal=False,
-                disabled=st.session_state["submitted"]
-            )
-            picked_letter = None
-            if picked_label:
-                m = re.match(r"^([ABCD])\.", picked_label.strip())
-                picked_letter = m.group(1) if m else None
-            st.session_state["user_answers"][q['idx']] = picked_letter
+            render_question_card(q, locked)
 
-            st.markdown("</div>", unsafe_allow_html=True)
-
-        # 交卷（必须全答），交卷后立刻 rerun 以锁定选项
+        # 交卷（必须全答），一次性从各题控件状态收集答案；交卷后立刻 rerun 以锁定选项
         if (not st.session_state["submitted"]) and st.button("✅ 提交整套试卷并评分", type="primary", use_container_width=True):
+            st.session_state["user_answers"] = {
+                q["idx"]: _picked_letter(st.session_state.get(f"Q_{q['idx']}")) for q in st.session_state["paper"]
+            }
             unanswered = [q["idx"] for q in st.session_state["paper"] if not st.session_state["user_answers"].get(q["idx"])]
             if unanswered:
                 st.error(f"仍有题目未作答（题号：{', '.join(map(str, unanswered))}），请作答后再交卷。")
-                st.stop()
-
-            store_rows, score = [], 0
-            for q in st.session_state["paper"]:
-                ua = st.session_state["user_answers"].get(q["idx"])
-                if ua == q["answer"]: score += 1
-                store_rows.append({
-                    "index": q["idx"], "your_answer": ua, "correct": q["answer"],
-                    "stem": q["stem"], "A": q["options"]["A"], "B": q["options"]["B"],
-                    "C": q["options"]["C"], "D": q["options"]["D"],
-                    "indicator_id": q["meta"]["indicator_id"], "indicator_name": q["meta"]["indicator_name"],
-                    "phase": q["meta"]["phase"], "error_cats": q["meta"]["error_cats"], "explain": q["explain"],
-                })
-
-            paths = user_paths()
-            os.makedirs(paths["results_dir"], exist_ok=True)
-            os.makedirs(paths["root"], exist_ok=True)
-
-            run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-            one = pd.DataFrame([{
-                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "score": score, "total": len(store_rows), "mode": "FAST", "run_id": run_id
-            }])
-
-            csv_path = paths["results_csv"]
-            if os.path.exists(csv_path):
-                one.to_csv(csv_path, mode="a", header=False, index=False, encoding="utf-8-sig", quoting=csv.QUOTE_MINIMAL)
-            else:
-                one.to_csv(csv_path, index=False, encoding="utf-8-sig", quoting=csv.QUOTE_MINIMAL)
-
-            with open(os.path.join(paths["results_dir"], f"run_{run_id}.json"), "w", encoding="utf-8") as f:
-                json.dump(store_rows, f, ensure_ascii=False, indent=2)
+                _st_stop()
 
-            st.session_state["submitted"] = True
-            st.session_state["last_detail"] = store_rows
-            st.session_state["last_score"] = score
+            _submit_paper(st.session_state["paper"], st.session_state["user_answers"])
             _st_rerun()
 
     # —— 交卷后的展示（勾/叉、段落化个性化建议）——
@@ -706,7 +706,9 @@ elif menu == "📝 能力评估":
             )
             st.markdown(line, unsafe_allow_html=True)
 
-        summary_html, indicator_html_list = build_paragraph_advice(st.session_state["last_detail"])
+        uid = user_paths()["uid"]
+        summary_html, indicator_html_list = build_paragraph_advice(st.session_state["last_detail"],
+                                                                   mastery=st.session_state.get("last_mastery"))
         st.markdown("#### 🎯 个性化建议", unsafe_allow_html=True)
         st.markdown(summary_html, unsafe_allow_html=True)
         for html in indicator_html_list:
@@ -724,11 +726,19 @@ elif menu == "📝 能力评估":
             for i, ((iid, iname), _) in enumerate(top_inds):
                 with cols[i]:
                     if st.button(f"专项再练10题：{iid or ''} {iname}".strip(), key=f"retrain_{iid}_{iname}"):
-                        st.session_state["paper"] = generate_exam(df, n=10, filter_indicator=(iid or iname))
+                        st.session_state["paper"] = generate_exam(df, n=10, filter_indicator=(iid or iname), index=case_index, exact_code=bool(iid))
                         st.session_state["user_answers"] = {}
                         st.session_state["submitted"] = False
+                        st.session_state["adaptive"] = None
                         st.session_state["last_detail"] = []
                         _st_rerun()
+        if st.button("按掌握度综合再练10题（薄弱指标多出题）", key="retrain_mastery"):
+            st.session_state["paper"] = generate_exam(df, n=10, index=case_index, weights=mastery.exam_weights(uid))
+            st.session_state["user_answers"] = {}
+            st.session_state["submitted"] = False
+            st.session_state["adaptive"] = None
+            st.session_state["last_detail"] = []
+            _st_rerun()
 
 # ---------------- 页面：成绩反馈 ----------------
 elif menu == "📊 成绩反馈":
@@ -736,72 +746,42 @@ elif menu == "📊 成绩反馈":
 
     paths = user_paths()
 
-    df_runs = rebuild_results_from_runs(paths["results_dir"])
-    if df_runs.empty:
-        df_csv = load_results_csv(paths["results_csv"])
-        if not df_csv.empty:
-            if "run_id" not in df_csv.columns:
-                df_csv["run_id"] = ""
-            df_csv["time"] = pd.to_datetime(df_csv["time"], errors="coerce")
-            df_base = df_csv.copy()
-        else:
-            df_base = pd.DataFrame(columns=["time","score","total","mode","run_id"])
-    else:
-        df_runs["time"] = pd.to_datetime(df_runs["time"], errors="coerce")
-        df_base = df_runs.copy()
+    manifest_ver = result_store.manifest_version(paths["uid"])
+    with span("load_run_manifest"):
+        dft = load_run_manifest(paths["uid"], manifest_ver)
 
-    if df_base.empty:
+    if dft.empty:
         st.info("还没有成绩记录，先去做一次测评吧～")
     else:
-        def has_runfile(rid: str) -> bool:
-            return bool(rid) and os.path.exists(os.path.join(paths["results_dir"], f"run_{rid}.json"))
-
-        if "run_id" in df_base.columns:
-            df_base = df_base[df_base["run_id"].astype(str).apply(has_runfile)]
-
-        if df_base.empty:
-            st.info("找到了成绩汇总，但缺少对应的明细文件（runs）。做一次新的测评即可恢复联动展示。")
-            st.stop()
-
-        dft = df_base.sort_values("time", ascending=True).copy()
-        dft["时间"] = dft["time"].dt.strftime("%Y-%m-%d %H:%M:%S")
-        dft["得分题数"] = pd.to_numeric(dft["score"], errors="coerce").fillna(0).astype(int)
-        dft["分数"] = dft["得分题数"] * 5
-        dft["题量"] = pd.to_numeric(dft["total"], errors="coerce").fillna(0).astype(int)
-        dft["答对/题量"] = dft["得分题数"].astype(str) + "/" + dft["题量"].astype(str)
-
         df_show = dft[["时间","答对/题量","分数"]].reset_index(drop=True)
         df_show.index = range(1, len(df_show)+1)
         st.table(df_show)
 
-        fig = px.line(dft, x="time", y="分数", markers=True, title="成绩趋势",
-                      labels={"time":"时间", "分数":"分数"})
-        fig.update_layout(height=420, margin=dict(l=20, r=20, t=50, b=10))
-        st.plotly_chart(
-            fig, use_container_width=True,
-            config={
-                "locale": "zh-CN",
-                "displaylogo": False,
-                "modeBarButtonsToRemove": [
-                    "lasso2d","select2d","autoScale2d","resetScale2d",
-                    "hoverClosestCartesian","hoverCompareCartesian",
-                    "toggleSpikelines"
-                ],
-            },
-        )
+        with span("plotly_trend"):
+            fig = score_trend_figure(paths["uid"], manifest_ver)
+            st.plotly_chart(
+                fig, use_container_width=True,
+                config={
+                    "locale": "zh-CN",
+                    "displaylogo": False,
+                    "modeBarButtonsToRemove": [
+                        "lasso2d","select2d","autoScale2d","resetScale2d",
+                        "hoverClosestCartesian","hoverCompareCartesian",
+                        "toggleSpikelines"
+                    ],
+                },
+            )
 
-        options = [(f"测试 {row['时间']}", row["run_id"]) for _, row in dft.iterrows()]
-        labels = [x[0] for x in options]
-        rids   = [x[1] for x in options]
+        labels = [f"测试 {t}" for t in dft["时间"]]
+        rids   = dft["run_id"].tolist()
         pick_label = st.selectbox("选择一次测试查看讲评与建议", labels, index=len(labels)-1)
         rid = rids[labels.index(pick_label)]
 
-        try:
-            with open(os.path.join(paths["results_dir"], f"run_{rid}.json"), "r", encoding="utf-8") as f:
-                detail = json.load(f)
-        except FileNotFoundError:
-            st.warning("该记录的明细文件缺失，无法展示讲评。做一次新的测评即可生成新的明细。")
-            st.stop()
+        with span("run_detail"):
+            detail = result_store.run_detail(paths["uid"], rid, question_bank)
+        if detail is None:
+            st.warning("该记录的明细缺失，无法展示讲评。做一次新的测评即可生成新的明细。")
+            _st_stop()
 
         st.markdown("#### 🧩 逐题精讲", unsafe_allow_html=True)
         for r in detail:
@@ -816,24 +796,26 @@ elif menu == "📊 成绩反馈":
             )
 
         st.markdown("#### 🎯 个性化建议", unsafe_allow_html=True)
-        summary_html, indicator_html_list = build_paragraph_advice(detail)
+        summary_html, indicator_html_list = build_paragraph_advice(detail, mastery=mastery.as_dict(paths["uid"]))
         st.markdown(summary_html, unsafe_allow_html=True)
         for html in indicator_html_list:
             st.markdown(html, unsafe_allow_html=True)
 
-        wrong_rows = [r for r in detail if r["your_answer"] != r["correct"]]
-        agg_ind = {}
-        for r in wrong_rows:
-            key = (r["indicator_id"], r["indicator_name"])
-            agg_ind[key] = agg_ind.get(key, 0) + 1
-        top_inds = sorted(agg_ind.items(), key=lambda x:-x[1])[:3]
+        top_inds = dft["errors"].iloc[labels.index(pick_label)][:3]  # 清单里已按错题数排好
         if top_inds:
-            for (iid, iname), _ in top_inds:
+            for iid, iname, _ in top_inds:
                 if st.button(f"专项再练10题：{iid or ''} {iname}".strip(), key=f"re_view_{rid}_{iid}_{iname}"):
-                    st.session_state["paper"] = generate_exam(df, n=10, filter_indicator=(iid or iname))
+                    st.session_state["paper"] = generate_exam(df, n=10, filter_indicator=(iid or iname), index=case_index, exact_code=bool(iid))
                     st.session_state["user_answers"] = {}
                     st.session_state["submitted"] = False
+                    st.session_state["adaptive"] = None
                     _st_rerun()
+        if st.button("按掌握度综合再练10题（薄弱指标多出题）", key=f"re_view_mastery_{rid}"):
+            st.session_state["paper"] = generate_exam(df, n=10, index=case_index, weights=mastery.exam_weights(paths["uid"]))
+            st.session_state["user_answers"] = {}
+            st.session_state["submitted"] = False
+            st.session_state["adaptive"] = None
+            _st_rerun()
 
 # ---------------- 页面：智能问答（对话式） ----------------
 elif menu == "🧠 智能问答":
@@ -845,69 +827,79 @@ elif menu == "🧠 智能问答":
 
     question = st.text_input("请输入你的问题（例如：V2访视心电图缺签名如何补救？）", "", placeholder="输入你的问题")
     use_llm = st.toggle("使用 AI 润色回答", value=False)
-
-    def simple_retrieve(q, df_src, k=5):
-        if not q.strip():
-            return []
-        qs = q.strip().lower()
-        scored = []
-        for r in df_src.itertuples():
-            bag = " ".join([str(getattr(r,"案例","")), str(getattr(r,"问题","")), str(getattr(r,"解决方法","")),
-                            str(getattr(r,"整改结果","")), str(getattr(r,"反思",""))]).lower()
-            score = sum(1 for token in re.split(r"[\s,，。；;]+", qs) if token and token in bag)
-            if score > 0:
-                scored.append((score, r))
-        scored.sort(key=lambda x: -x[0])
-        return [x[1] for x in scored[:k]]
-
-    def synthesize_answer(q, hits):
-        key_points = []
-        for r in hits:
-            for col in ["解决方法","整改结果","反思"]:
-                t = str(getattr(r, col) or "").strip()
-                if t:
-                    key_points.append(shorten(t, 120))
-                    break
-        key_points = key_points[:6]
-        if not key_points:
-            return "建议：对照方案与SOP核对原始依据，按缺失/错误类型完成修订，并保留可追溯留痕。"
-        para = "针对你的问题，可落实：" + "；".join(key_points) + "。同时确保纸质与系统一致、研究者复核签名、时间与原因可追溯。"
-        return para
+    qa_modes = ["关键词"] + (["语义", "混合"] if HAVE_OLLAMA else []) + (["图数据库全文"] if get_fulltext() else [])
+    mode = st.radio("检索方式", qa_modes, horizontal=True, key="qa_mode") if len(qa_modes) > 1 else "关键词"
+    use_graph = st.toggle("结合知识图谱扩展相关案例（同指标 / 岗位 / 阶段）", value=True, key="qa_graph")
 
     if st.button("回答", type="primary"):
         if not question.strip():
             st.warning("请先输入问题。")
         else:
-            hits = simple_retrieve(question, df, k=5)
-            answer = synthesize_answer(question, hits)
-            if use_llm and HAVE_OLLAMA and hits:
-                ctx = "\n\n".join([
-                    f"案例：{getattr(h,'案例','')}\n问题：{getattr(h,'问题','')}\n解决方法：{getattr(h,'解决方法','')}\n整改结果：{getattr(h,'整改结果','')}\n反思：{getattr(h,'反思','')}"
-                    for h in hits
-                ])
-                prompt = f"基于下列CRC案例材料，请用一个段落给出规范、清晰、可执行的操作建议（不超过120字）：\n\n{ctx}\n\n用户问题：{question}"
+            version = _version
+            via, hits = {}, None
+            if mode == "图数据库全文":
+                # 下推到 Neo4j 全文索引：直接取回案例字段，不依赖本进程的案例表
                 try:
-                    resp = ollama.chat(model="qwen3:1.7b", messages=[{"role":"user","content":prompt}])
-                    answer = resp["message"]["content"].strip() or answer
+                    found = get_fulltext().search(question, k=5)
+                    hits, scored = [r for r, _ in found], [(None, sc) for _, sc in found]
                 except Exception as e:
-                    st.info(f"AI 润色未成功，已使用本地生成答案。原因：{e}")
+                    st.info(f"图数据库检索不可用，已改用关键词检索。原因：{e}")
+            if hits is None:
+                pool = 20 if use_graph else 5  # 图谱扩展在更宽的候选上重排
+                scored = load_retrieval_index(version, df).search(question, k=20 if mode in ("语义", "混合") else pool)
+                if mode in ("语义", "混合"):
+                    try:
+                        sem = load_semantic_index(version, EMBED_MODEL, df).search(question, k=20)
+                        scored = sem[:pool] if mode == "语义" else fuse_rankings(scored, sem, k=pool)
+                    except Exception as e:
+                        st.info(f"语义检索不可用，已改用关键词检索。原因：{e}")
+                if use_graph and scored:
+                    scored, via = load_graph_neighbors(version, graph_version(), df).expand(scored, k=5)
+                scored = scored[:5]
+                hits = list(df.iloc[[i for i, _ in scored]].itertuples()) if scored else []
+            answer = synthesize_answer(question, hits)
+            llm_stats, cache_key = None, None
+            if use_llm and HAVE_OLLAMA and hits:
+                # 同一问题 + 同一批（内容未变的）案例 + 同一模型：直接复用缓存答案
+                answer_cache = get_answer_cache(version)
+                cache_key = answer_key(question, [case_key(h) for h in hits], DEFAULT_MODEL)
+                cached = answer_cache.get(cache_key)
+                if cached is not None:
+                    answer, llm_stats = cached, {"model": DEFAULT_MODEL, "status": "cache"}
+            if use_llm and HAVE_OLLAMA and hits and llm_stats is None:
+                # 经调度器排队（显示位次，最多等 60 秒）；开始生成后首字 8 秒 / 总计 30 秒未完成则回退本地答案
+                bubble = st.empty()
+                cs = ChatStream(build_prompt(question, hits), model=DEFAULT_MODEL, first_token_timeout=8, total_timeout=30,
+                                scheduler=get_llm_scheduler(), queue_timeout=60,
+                                on_queue=lambda pos: bubble.markdown(
+                                    f"<div class='bubble bubble-bot'>⏳ AI 润色排队中：第 {pos} 位…</div>",
+                                    unsafe_allow_html=True))
+                with span("llm_generate"):
+                    for _ in cs:
+                        bubble.markdown(f"<div class='bubble bubble-bot'>🤖 {cs.text}▌</div>", unsafe_allow_html=True)
+                bubble.empty()
+                llm_stats = cs.stats
+                if cs.ok:
+                    answer = cs.text.strip()
+                    answer_cache.put(cache_key, question, answer, DEFAULT_MODEL, version)
+                else:
+                    reason = {"first_token_timeout": "模型响应超时", "total_timeout": "生成超时",
+                              "queue_timeout": "当前使用人数较多，排队超时"}.get(
+                        cs.stats["status"], cs.stats.get("error", ""))
+                    st.info(f"AI 润色未成功，已使用本地生成答案。原因：{reason}")
 
             st.session_state["qa_chat"].append(("user", question))
             st.session_state["qa_chat"].append(("bot", answer))
-            refs = [f"{i}. {getattr(r,'案例','')}｜问题：{shorten(getattr(r,'问题',''), 80)}｜解决：{shorten(getattr(r,'解决方法',''), 80)}" for i, r in enumerate(hits, 1)]
+            refs = [f"{i}. {getattr(r,'案例','')}｜问题：{shorten(getattr(r,'问题',''), 80)}｜解决：{shorten(getattr(r,'解决方法',''), 80)}｜相关度 {sc:.2f}"
+                    + (f"（图谱关联：{'、'.join(via[j])}）" if j in via else "")
+                    for i, (r, (j, sc)) in enumerate(zip(hits, scored), 1)]
             if refs:
                 st.session_state["qa_chat"].append(("bot_refs", "\n".join(refs)))
 
-            try:
-                p = user_paths()
-                os.makedirs(p["root"], exist_ok=True)
-                with open(p["qa_log"], "a", encoding="utf-8") as fp:
-                    fp.write(json.dumps({
-                        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "q": question, "a": answer
-                    }, ensure_ascii=False) + "\n")
-            except Exception:
-                pass
+            writer.append_jsonl(user_paths()["qa_log"], {
+                "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "q": question, "a": answer, "llm": llm_stats, "key": cache_key, "version": version,
+            })
 
     st.markdown("<div class='chat-wrap'>", unsafe_allow_html=True)
     for role, content in st.session_state["qa_chat"]:
@@ -925,67 +917,252 @@ elif menu == "🧠 智能问答":
 elif menu == "👩‍💼 管理后台":
     if not is_admin:
         st.error("仅管理员可见")
-        st.stop()
+        _st_stop()
 
     st.markdown("<div class='section-title'>👩‍💼 管理后台</div>", unsafe_allow_html=True)
 
-    # 读取 users.json（项目根）
-    try:
-        with open(os.path.join(BASE_DIR, "..", "users.json"), "r", encoding="utf-8") as f:
-            all_users = json.load(f)
-    except Exception:
-        all_users = []
+    # —— 全体学员概览：只读物化聚合表（随交卷增量更新），与学员人数无关 ——
+    cohort = CohortStats(result_store)
+    ov = cohort.overview()
+    st.markdown("#### 📈 全体学员概览")
+    m1, m2, m3 = st.columns(3)
+    m1.metric("学员数", ov["users"])
+    m2.metric("测评次数", ov["runs"])
+    m3.metric("平均得分率", f"{ov['mean_pct']:.1f}%")
+
+    if ov["runs"]:
+        import plotly.express as px
+        colh, cold = st.columns([3, 2])
+        with colh, span("plotly_heatmap"):
+            df_cell = cohort.indicator_phase_errors()
+            df_cell["phase"] = df_cell["phase"].replace("", "未标注")
+            heat = df_cell.pivot_table(index="indicator_id", columns="phase", values="error_rate", aggfunc="mean")
+            fig = px.imshow(heat, color_continuous_scale="Reds", aspect="auto", zmin=0, zmax=1,
+                            labels={"x": "试验阶段", "y": "指标", "color": "错误率"}, title="指标 × 阶段 错误率")
+            fig.update_layout(height=420, margin=dict(l=20, r=20, t=50, b=10))
+            st.plotly_chart(fig, use_container_width=True, config={"displaylogo": False})
+        with cold, span("plotly_histogram"):
+            df_hist = cohort.score_distribution()
+            fig = px.bar(df_hist, x="pct", y="runs", title="得分率分布（全部测评）",
+                         labels={"pct": "得分率 %", "runs": "次数"})
+            fig.update_layout(height=420, margin=dict(l=20, r=20, t=50, b=10))
+            st.plotly_chart(fig, use_container_width=True, config={"displaylogo": False})
+
+        df_miss = cohort.most_missed(k=10)
+        if not df_miss.empty:
+            st.markdown("##### 最常错的题")
+            stems = []
+            for qid in df_miss["qid"]:
+                q = question_bank.question(qid)
+                stems.append(shorten(q["stem"], 60) if q else "（题库中已无此题）")
+            df_miss_show = pd.DataFrame({
+                "题干": stems, "指标": df_miss["indicator_id"], "作答次数": df_miss["attempts"],
+                "错误率": (df_miss["error_rate"] * 100).round(1).astype(str) + "%",
+            })
+            df_miss_show.index = range(1, len(df_miss_show)+1)
+            st.table(df_miss_show)
+
+    # —— 批量导出：后台任务按用户分块流式写文件；下载按钮点击时才读文件，旧导出由任务自动清理 ——
+    with st.expander("📦 批量导出全部成绩（Parquet / XLSX）"):
+        ce1, ce2, ce3 = st.columns([2, 1, 1])
+        with ce1:
+            exp_range = st.date_input("日期范围（留空为全部）", value=(), key="export_range")
+        with ce2:
+            exp_ind = st.text_input("指标编号（含下级，如 5.2）", key="export_indicator").strip()
+        with ce3:
+            exp_fmt = st.radio("格式", ["parquet", "xlsx"], horizontal=True, key="export_fmt")
+        job_runner = get_job_runner()
+        if st.button("生成导出文件", key="export_go"):
+            start = exp_range[0] if len(exp_range) > 0 else None
+            end = exp_range[1] if len(exp_range) > 1 else start
+            st.session_state["export_job"] = job_runner.submit(
+                "export", fmt=exp_fmt, start=start and str(start), end=end and str(end), indicator=exp_ind or None)
+        ej = job_runner.job(st.session_state["export_job"]) if st.session_state.get("export_job") else None
+        if ej is not None and ej["status"] in ("queued", "running"):
+            st.caption(f"导出任务 #{ej['id']} 进行中：{ej['progress']:.0%} {ej['message'] or ''}")
+            st.button("刷新状态", key="export_refresh")
+        elif ej is not None and ej["status"] == "failed":
+            st.error(f"导出失败：{ej['message']}")
+        elif ej is not None:
+            n = ej["result"].get("rows", 0)
+            for label, path in (("作答", ej["result"].get("artifact")), ("测评表", ej["result"].get("runs"))):
+                if path and os.path.exists(path):
+                    st.download_button(f"下载{label} {os.path.basename(path)}" + (f"（{n} 条作答）" if label == "作答" else ""),
+                                       functools.partial(_read_bytes, path), file_name=os.path.basename(path),
+                                       on_click="ignore", key=f"export_download_{label}")
+
+    # —— 写入服务：写线程的最近异常与死信（写失败的成绩 / 日志），可重新入队 ——
+    with st.expander("💾 写入服务"):
+        pending = writer.dead_letters()
+        st.caption(f"队列积压 {writer.q.qsize()} 条；死信 {pending} 条（{writer.dead_letter}）")
+        if writer.errors:
+            st.code("\n".join(reversed(writer.errors)), language=None)
+        else:
+            st.caption("最近没有写入异常。")
+        if st.button("🔁 重试死信", disabled=not pending, key="writer_retry"):
+            n = writer.retry(result_store)
+            left = writer.dead_letters()
+            (st.warning if left else st.success)(f"已重试 {n} 条，仍失败 {left} 条。")
+
+    # —— 后台任务：不阻塞页面；子进程写进度，这里只读状态 ——
+    with st.expander("⚙️ 后台任务（图谱导入 / 页面生成 / 题库 / 索引）"):
+        job_runner = get_job_runner()
+        cj1, cj2 = st.columns([2, 1])
+        with cj1:
+            job_kind = st.selectbox("任务", [k for k in JOB_KINDS if k != "export"],  # 导出在上方单独提交
+                                    format_func=JOB_KINDS.get, key="job_kind")
+        job_params = {}
+        with cj2:
+            if job_kind == "import":
+                job_params["indicators"] = st.text_input("指标体系表路径（xlsx）", os.getenv("INDICATOR_XLSX", ""),
+                                                         key="job_indicators").strip()
+            elif job_kind == "search_index" and HAVE_OLLAMA:
+                if st.checkbox(f"同时计算语义向量（{EMBED_MODEL}）", key="job_semantic"):
+                    job_params["semantic_model"] = EMBED_MODEL
+        cb1, cb2 = st.columns([1, 1])
+        with cb1:
+            if st.button("提交任务", key="job_submit", type="primary"):
+                st.session_state["job_last"] = job_runner.submit(job_kind, **job_params)
+        with cb2:
+            st.button("刷新状态", key="job_refresh")
+        if st.session_state.get("job_last"):
+            st.caption(f"已提交任务 #{st.session_state['job_last']}（同类型、同参数的任务未结束时不会重复提交）")
+        job_rows = job_runner.jobs(limit=20)
+        if job_rows:
+            status_cn = {"queued": "排队", "running": "运行中", "done": "完成", "failed": "失败"}
+            fmt_t = lambda t: datetime.fromtimestamp(t).strftime("%m-%d %H:%M:%S") if t else ""
+            st.dataframe(pd.DataFrame([{
+                "任务号": j["id"], "任务": JOB_KINDS.get(j["kind"], j["kind"]), "状态": status_cn.get(j["status"], j["status"]),
+                "进度": f"{j['progress']:.0%}", "信息": j["message"] or "", "提交": fmt_t(j["created"]),
+                "耗时(秒)": round((j["finished"] or time.time()) - j["started"], 1) if j["started"] else None,
+                "步骤耗时": "；".join(f"{n} {sec}s" for n, sec in j["result"].get("steps", [])),
+            } for j in job_rows]), use_container_width=True, hide_index=True)
+            failed = [j for j in job_rows if j["status"] == "failed" and j["error"]]
+            if failed:
+                with st.popover(f"最近失败任务 #{failed[0]['id']} 的错误详情"):
+                    st.code(failed[0]["error"])
+        if job_runner.active():
+            st.caption("有任务在执行，点“刷新状态”查看最新进度。")
+
+    # —— 性能：每次重跑的整体耗时（rerun）与各埋点 span 的分位数 ——
+    with st.expander("⏱️ 性能（按页面 / 埋点的重跑耗时）"):
+        perf_window = st.selectbox("时间范围", [1, 24, 24 * 7], index=1, key="perf_window",
+                                   format_func=lambda h: f"最近 {h} 小时" if h < 48 else f"最近 {h // 24} 天")
+        sink = get_span_sink()
+        since = time.time() - perf_window * 3600
+        df_perf = sink.percentiles(since)
+        if df_perf.empty:
+            st.caption("该时间范围内还没有记录。")
+        else:
+            st.markdown("##### 各页面整次重跑")
+            st.dataframe(df_perf[df_perf["name"] == "rerun"].drop(columns="name").rename(columns={"page": "页面"}),
+                         use_container_width=True, hide_index=True)
+            st.markdown("##### 各埋点（按 p95 降序）")
+            st.dataframe(df_perf[df_perf["name"] != "rerun"].rename(columns={"page": "页面", "name": "埋点"}),
+                         use_container_width=True, hide_index=True)
+
+    # —— 深度剖析：布置某页面接下来 N 次重跑（任何用户打开该页面都会命中），存档可下载 ——
+    with st.expander("🔬 深度剖析（cProfile / 采样 / 内存分配）"):
+        trigger = get_profile_trigger()
+        cp1, cp2, cp3 = st.columns([2, 1, 2])
+        with cp1:
+            prof_page = st.selectbox("页面", DEFAULT_ITEMS, key="prof_page")
+        with cp2:
+            prof_n = st.number_input("接下来几次重跑", min_value=1, max_value=20, value=3, step=1, key="prof_n")
+        with cp3:
+            prof_mode = st.radio("方式", list(PROFILE_MODES), format_func=PROFILE_MODES.get, horizontal=True,
+                                 key="prof_mode")
+        prof_mem = st.checkbox("同时记录内存分配（tracemalloc，进程级，开销较大）", key="prof_mem")
+        cq1, cq2 = st.columns([1, 1])
+        with cq1:
+            if st.button("开始剖析", key="prof_arm", type="primary"):
+                trigger.arm(prof_page, prof_n, prof_mode, prof_mem)
+        with cq2:
+            if st.button("取消", key="prof_disarm"):
+                trigger.disarm()
+        plan = trigger.status()
+        if plan:
+            st.caption(f"已布置：{plan['page']} 接下来 {plan['remaining']} 次重跑（{PROFILE_MODES[plan['mode']]}"
+                       f"{' + 内存分配' if plan['memory'] else ''}）")
+        captures = trigger.captures()
+        if captures:
+            st.dataframe(pd.DataFrame([{
+                "捕获": c["id"], "页面": c.get("page", ""), "角色": c.get("role", ""), "方式": PROFILE_MODES.get(c["mode"], c["mode"]),
+                "耗时(ms)": c["ms"], "采样数": c.get("samples", 0), "数据集版本": c.get("version", ""),
+                "时间": datetime.fromtimestamp(c["started"]).strftime("%m-%d %H:%M:%S"),
+            } for c in captures]), use_container_width=True, hide_index=True)
+            pick_cap = st.selectbox("下载捕获文件", [c["id"] for c in captures], key="prof_pick")
+            cap = next(c for c in captures if c["id"] == pick_cap)
+            cols = st.columns(len(cap["files"]))
+            for col, name in zip(cols, cap["files"]):
+                path = trigger.file_path(cap["id"], name)
+                if os.path.exists(path):
+                    with col:  # 点击下载时才读文件
+                        st.download_button(name, functools.partial(_read_bytes, path), file_name=f"{cap['id']}_{name}",
+                                           on_click="ignore", key=f"prof_dl_{name}")
+            st.caption("stacks.collapsed 可用 flamegraph.pl 或 speedscope.app 画火焰图；profile.prof 可用 snakeviz 查看。")
+        else:
+            st.caption("还没有剖析记录。")
+
+    st.markdown("#### 👤 个人成绩与明细")
+    all_users = load_users(USERS_JSON, os.path.getmtime(USERS_JSON) if os.path.exists(USERS_JSON) else 0)
 
     if not all_users:
         st.info("未找到用户列表（users.json）。")
-        st.stop()
+        _st_stop()
 
     choices = [f"{u.get('name','')}（{u.get('user_id','')}）" for u in all_users]
     pick = st.selectbox("选择用户查看成绩与明细", choices)
     pick_uid = all_users[choices.index(pick)].get("user_id")
 
-    pick_root = os.path.join(BASE_DIR, "user_data", pick_uid)
-    pick_csv  = os.path.join(pick_root, "results.csv")
-    pick_runs = os.path.join(pick_root, "results_runs")
-
-    df_runs = rebuild_results_from_runs(pick_runs)
-    if df_runs.empty:
-        df_csv = load_results_csv(pick_csv)
-        df_base = df_csv if not df_csv.empty else pd.DataFrame(columns=["time","score","total","mode","run_id"])
-    else:
-        df_runs["time"] = pd.to_datetime(df_runs["time"], errors="coerce")
-        df_base = df_runs.copy()
+    dft = load_run_manifest(pick_uid, result_store.manifest_version(pick_uid))
 
-    if df_base.empty:
+    if dft.empty:
         st.info("该用户暂无成绩记录")
-        st.stop()
+        _st_stop()
+
+    me = cohort.user_summary(pick_uid)
+    pr = cohort.percentile(pick_uid)
+    if me is not None and pr is not None:
+        st.caption(f"共 {me['runs']} 次测评；最近一次得分率 {me['last_pct']}%，最好 {me['best_pct']}%；"
+                   f"最近一次超过 {pr:.0f}% 的学员")
 
-    dft = df_base.sort_values("time", ascending=True).copy()
-    dft["时间"] = pd.to_datetime(dft["time"]).dt.strftime("%Y-%m-%d %H:%M:%S")
-    dft["得分题数"] = pd.to_numeric(dft["score"], errors="coerce").fillna(0).astype(int)
-    dft["分数"] = dft["得分题数"] * 5
-    dft["题量"] = pd.to_numeric(dft["total"], errors="coerce").fillna(0).astype(int)
     df_show = dft[["时间","得分题数","题量","分数"]].reset_index(drop=True)
     df_show.index = range(1, len(df_show)+1)
     st.table(df_show)
 
-    options = [(f"测试 {row['时间']}", row["run_id"]) for _, row in dft.iterrows()]
-    labels = [x[0] for x in options]; rids = [x[1] for x in options]
+    df_m = mastery.vector(pick_uid, level=1)
+    if not df_m.empty:
+        df_m_show = pd.DataFrame({
+            "一级指标": df_m["indicator_id"], "作答": df_m["attempts"], "答对": df_m["correct"],
+            "掌握度": (df_m["score"] * 100).round(0).astype(int).astype(str) + "%",
+        })
+        df_m_show.index = range(1, len(df_m_show)+1)
+        st.markdown("##### 指标掌握度")
+        st.table(df_m_show)
+        weak = mastery.weakest(pick_uid)
+        if weak:
+            st.caption("掌握度最低：" + "；".join(f"{i} {n}（{s:.0%}）" for i, n, s in weak))
+
+    labels = [f"测试 {t}" for t in dft["时间"]]; rids = dft["run_id"].tolist()
     pick_label = st.selectbox("选择一次测试", labels, index=len(labels)-1)
     rid = rids[labels.index(pick_label)]
-    try:
-        with open(os.path.join(pick_runs, f"run_{rid}.json"), "r", encoding="utf-8") as f:
-            detail = json.load(f)
-        st.markdown("#### 🧩 逐题精讲", unsafe_allow_html=True)
-        for r in detail:
-            idn = f"{(r['indicator_id']+' ') if r['indicator_id'] else ''}{r['indicator_name'] or '未标注指标'}"
-            exp = r["explain"]; steps = "、".join(exp["how_to"])
-            explain_map = r["explain"]["why_wrong"]
-            wrong_brief = "；".join([f"{lab}：{txt}" for lab, txt in explain_map.items() if lab != r["correct"]])
-            st.markdown(
-                f"<div class='review-card'><span class='review-hd'>题 {r['index']}｜能力：</span>{idn}｜"
-                f"<b>正确 {r['correct']}</b>｜理由：{exp['why_right']}｜怎么做：{steps}｜"
-                f"{wrong_brief}｜边界：{exp['edge']}</div>", unsafe_allow_html=True
-            )
-    except FileNotFoundError:
+    with span("run_detail"):
+        detail = result_store.run_detail(pick_uid, rid, question_bank)
+    if detail is not None:
+        with st.expander("🧩 逐题精讲", expanded=False):
+            for r in detail:
+                idn = f"{(r['indicator_id']+' ') if r['indicator_id'] else ''}{r['indicator_name'] or '未标注指标'}"
+                exp = r["explain"]; steps = "、".join(exp["how_to"])
+                explain_map = r["explain"]["why_wrong"]
+                wrong_brief = "；".join([f"{lab}：{txt}" for lab, txt in explain_map.items() if lab != r["correct"]])
+                st.markdown(
+                    f"<div class='review-card'><span class='review-hd'>题 {r['index']}｜能力：</span>{idn}｜"
+                    f"<b>正确 {r['correct']}</b>｜理由：{exp['why_right']}｜怎么做：{steps}｜"
+                    f"{wrong_brief}｜边界：{exp['edge']}</div>", unsafe_allow_html=True
+                )
+    else:
         st.warning("该次明细缺失")
+
+# —— 本次重跑结束：存档剖析、写入耗时埋点（页面分支里提前结束的走 _st_stop / _st_rerun；异常中断的不记录） ——
+_end_rerun()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+核心逻辑基准：在合成案例库（默认 1k / 100k 行）上测 组卷 / 案例搜索 / 问答检索 / 个性化建议
+
+用法（项目根目录）：
+    python benchmarks/bench_core.py
+    python benchmarks/bench_core.py --sizes 1000 --rounds 20 --json bench.json
+
+每项先热身 1 次，再计时 rounds 轮，输出 min / median / mean / max（毫秒），口径同 pytest-benchmark 汇总表。
+只依赖 app/core（不导入 Streamlit）。
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+from core import (  # noqa: E402
+    prepare_cases, search_cases, StratIndex, generate_exam, generate_exam_cover7,
+    build_paragraph_advice, detail_row, simple_retrieve, BM25Index,
+)
+
+INDICATORS = [
+    "1.1.1能协助完成立项资料准备", "1.2.2能协助准备启动会材料", "2.2.1能协助完成受试者知情流程，并整理知情资料",
+    "2.2.4能提醒研究团队落实访视计划，确保访视如期完成", "2.3.1能协助记录样本采集与处理信息",
+    "3.1.2能协助更新伦理文件版本信息和归档相关资料", "3.2.1能协助收集SAE等安全性信息，并整理相关报告资料",
+    "4.1.3能协助核对试验用药在发放与回收过程中的关键信息", "5.1.2能协助整理试验资料并完成分类、归档、更新与定期检查",
+    "5.2.2能协助研究者核查各类试验记录中的数据逻辑与内容一致性", "6.1.1能配合监查与稽查", "7.2.1能持续学习法规与指南",
+]
+PHASES = ["筛选入组阶段", "访视执行阶段", "随访阶段", "结题阶段"]
+SUBJECTS = ["心电图报告", "知情同意书", "服药日记卡", "PK样本采血记录", "原始病历", "EDC录入", "药品回收记录"]
+ISSUES = ["缺少研究者签名", "时间记录错误", "版本不一致", "未及时上报", "纸质与系统不同步", "漏记关键信息"]
+ACTIONS = ["协助研究者补签并注明日期", "依据原始证据核对后单线划改", "纸质与系统同步修订", "按方案时限上报并留痕"]
+
+
+def synthetic_cases(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        subj, issue, act = rng.choice(SUBJECTS), rng.choice(ISSUES), rng.choice(ACTIONS)
+        rows.append({
+            "案例": f"{subj}{issue}问题-{i}",
+            "能力指标": rng.choice(INDICATORS),
+            "试验项目": f"合成项目{rng.randint(1, 40)}期临床试验",
+            "试验阶段": rng.choice(PHASES),
+            "岗位职责": "CRC协助研究者完成资料核对与留痕",
+            "问题": f"CRC在核对受试者{rng.randint(1, 999)}的{subj}时发现{issue}，影响数据可追溯。",
+            "解决方法": f"CRC当日反馈研究者，{act}，并由研究者复核签名。",
+            "整改结果": f"{subj}已补齐并归档，记录现完整一致。",
+            "反思": f"CRC应在访视结束前逐项核对{subj}，发现{issue}当场处理并留痕。",
+        })
+    return prepare_cases(pd.DataFrame(rows))
+
+
+def bench(fn, rounds):
+    fn()  # 热身
+    ts = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        ts.append((time.perf_counter() - t0) * 1000)
+    return {"min": min(ts), "median": statistics.median(ts), "mean": statistics.fmean(ts), "max": max(ts), "rounds": rounds}
+
+
+def cases_for(n, rounds):
+    df = synthetic_cases(n)
+    ix = StratIndex(df)
+    paper = generate_exam_cover7(df, n=20, seed=1, index=ix)
+    rng = random.Random(7)
+    detail = [detail_row(q, rng.choice("ABCD")) for q in paper]
+    bm25 = BM25Index(df)
+    seeds = iter(range(10**9))
+    return [
+        ("index_build", lambda: StratIndex(df), max(3, rounds // 4)),
+        ("exam_cover7_n20", lambda: generate_exam_cover7(df, n=20, seed=next(seeds), index=ix), rounds),
+        ("exam_filtered_n20", lambda: generate_exam_cover7(df, n=20, seed=next(seeds), filter_indicator="5.2",
+                                                          filter_phase="访视执行阶段", index=ix), rounds),
+        ("exam_retrain_n10", lambda: generate_exam(df, n=10, seed=next(seeds), filter_indicator="2.2.1",
+                                                   index=ix, exact_code=True), rounds),
+        ("search_cases", lambda: search_cases(df, "签名", "访视执行阶段"), rounds),
+        ("simple_retrieve", lambda: simple_retrieve("心电图 缺少研究者签名 补签", df, k=5), max(3, rounds // 4)),
+        ("bm25_build", lambda: BM25Index(df), max(3, rounds // 4)),
+        ("bm25_search", lambda: bm25.search("心电图缺少研究者签名如何补签", k=5), rounds),
+        ("paragraph_advice", lambda: build_paragraph_advice(detail), rounds),
+    ]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="core 基准测试")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000])
+    ap.add_argument("--rounds", type=int, default=10)
+    ap.add_argument("--json", default=None, help="结果另存为 JSON")
+    args = ap.parse_args(argv)
+
+    results = []
+    print(f"{'name':<22}{'cases':>9}{'min(ms)':>11}{'median':>11}{'mean':>11}{'max':>11}{'rounds':>8}")
+    for n in args.sizes:
+        for name, fn, rounds in cases_for(n, args.rounds):
+            r = bench(fn, rounds)
+            results.append({"name": name, "cases": n, **r})
+            print(f"{name:<22}{n:>9}{r['min']:>11.2f}{r['median']:>11.2f}{r['mean']:>11.2f}{r['max']:>11.2f}{rounds:>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
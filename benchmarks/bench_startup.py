@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+冷启动 / 导入耗时基准：在全新子进程里（python -X importtime）用 Streamlit AppTest 首次运行 streamlit_app.py 的某个页面，
+解析 importtime 输出，按模块 / 顶层包汇总导入耗时，超出预算时退出码为 1（可接入 CI）
+
+用法（项目根目录）：
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --page "📊 成绩反馈" --forbid ""
+    python benchmarks/bench_startup.py --budget-ms 800 --cold-budget-ms 3000 --json startup.json
+
+口径：
+- 子进程先导入 streamlit 与 AppTest 并打标记，标记之后的导入记为"应用导入"（应用脚本及该页面按需导入的模块）；
+  streamlit 自身的导入记为"基础"，只报告不计预算
+- 单个模块的耗时取 importtime 的 self 列（不含子模块）；顶层包 = 其下各模块 self 之和
+- 冷启动 = AppTest 首次 run() 的墙钟时间（含导入、读案例库、建索引等首屏工作）
+- --forbid 列出的顶层包若在该页面被导入即判失败（默认首页不应加载 plotly；装了 ollama 时启动即预载模型，不在此列）
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app", "streamlit_app.py")
+MARK = "bench_startup.app_begin"
+_RE_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def child(page, role):
+    """子进程：导入 streamlit / AppTest 后打标记，再冷启动应用；结果以 JSON 打到 stdout"""
+    from streamlit.testing.v1 import AppTest
+
+    sys.stderr.write(f"import time: 0 | 0 | {MARK}\n")  # 与 importtime 同格式的分界行
+    sys.stderr.flush()
+    at = AppTest.from_file(os.path.abspath(APP), default_timeout=300)
+    at.session_state["auth_user"] = {"user_id": "bench_startup", "name": "bench", "role": role}
+    at.session_state["menu"] = page
+    t0 = time.perf_counter()
+    at.run()
+    cold = (time.perf_counter() - t0) * 1000
+    print(json.dumps({"cold_ms": cold, "exception": [str(e.value) for e in at.exception]}, ensure_ascii=False))
+
+
+def parse_importtime(text):
+    """importtime 输出 → (基础, 应用)，各为 [(模块, self 微秒, cumulative 微秒, 嵌套深度), ...]"""
+    base, app = [], []
+    cur = base
+    for line in text.splitlines():
+        m = _RE_LINE.match(line)
+        if not m:
+            continue
+        name = m.group(4)
+        if name == MARK:
+            cur = app
+            continue
+        cur.append((name, int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return base, app
+
+
+def summarize(rows, top=15):
+    total = sum(s for _, s, _, _ in rows) / 1000
+    pkgs = {}
+    for name, s, _, _ in rows:
+        pkg = name.split(".")[0]
+        pkgs[pkg] = pkgs.get(pkg, 0) + s
+    by_pkg = sorted(((p, s / 1000) for p, s in pkgs.items()), key=lambda x: -x[1])
+    by_mod = sorted(((n, s / 1000, c / 1000) for n, s, c, _ in rows), key=lambda x: -x[1])
+    return {"total_ms": total, "modules": len(rows), "packages": by_pkg[:top], "slowest": by_mod[:top]}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="streamlit_app.py 冷启动 / 导入耗时基准")
+    ap.add_argument("--page", default="📝 能力评估", help="首次运行的页面（侧栏菜单名）")
+    ap.add_argument("--role", default="user", choices=["user", "admin"])
+    ap.add_argument("--budget-ms", type=float, default=1000, help="应用导入耗时预算（self 之和，毫秒）")
+    ap.add_argument("--cold-budget-ms", type=float, default=None, help="冷启动墙钟预算（毫秒，默认不检查）")
+    ap.add_argument("--forbid", default="plotly", help="该页面不应导入的顶层包（逗号分隔，空串不检查）")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--json", default=None, help="结果另存为 JSON")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    if args.child:
+        child(args.page, args.role)
+        return 0
+
+    proc = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child",
+                           "--page", args.page, "--role", args.role],
+                          capture_output=True, text=True, encoding="utf-8", errors="replace",
+                          env=dict(os.environ, PYTHONIOENCODING="utf-8"))
+    if proc.returncode != 0:
+        print(proc.stderr[-3000:], file=sys.stderr)
+        return 2
+    run = json.loads(proc.stdout.strip().splitlines()[-1])
+    base, app = parse_importtime(proc.stderr)
+    base_s, app_s = summarize(base, args.top), summarize(app, args.top)
+
+    print(f"页面 {args.page}：冷启动 {run['cold_ms']:.0f} ms；"
+          f"基础导入（streamlit 等）{base_s['total_ms']:.0f} ms / {base_s['modules']} 个模块；"
+          f"应用导入 {app_s['total_ms']:.0f} ms / {app_s['modules']} 个模块")
+    print(f"\n{'顶层包':<28}{'self(ms)':>10}")
+    for pkg, ms in app_s["packages"]:
+        print(f"{pkg:<28}{ms:>10.1f}")
+    print(f"\n{'模块':<48}{'self(ms)':>10}{'cumul(ms)':>11}")
+    for name, s, c in app_s["slowest"]:
+        print(f"{name:<48}{s:>10.1f}{c:>11.1f}")
+
+    failures = []
+    if run["exception"]:
+        failures.append(f"页面异常：{run['exception'][0][:200]}")
+    if app_s["total_ms"] > args.budget_ms:
+        failures.append(f"应用导入 {app_s['total_ms']:.0f} ms 超出预算 {args.budget_ms:.0f} ms")
+    if args.cold_budget_ms is not None and run["cold_ms"] > args.cold_budget_ms:
+        failures.append(f"冷启动 {run['cold_ms']:.0f} ms 超出预算 {args.cold_budget_ms:.0f} ms")
+    loaded = {name.split(".")[0] for name, _, _, _ in app}
+    for pkg in filter(None, (p.strip() for p in args.forbid.split(","))):
+        if pkg in loaded:
+            failures.append(f"页面 {args.page} 导入了 {pkg}（应按需导入）")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"page": args.page, "cold_ms": run["cold_ms"], "base": base_s, "app": app_s,
+                       "failures": failures}, f, ensure_ascii=False, indent=2)
+    for msg in failures:
+        print(f"\n失败：{msg}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
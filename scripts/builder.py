@@ -11,6 +11,9 @@ Neo4j 知识图谱导入（先清空再生成｜按你最新关系表｜Neo4j 4.
 - 解决方法 —产生→ 整改结果
 - 案例 —形成→ 反思
 
+全文索引（供应用下推检索，见 app/core/fulltext.py）：
+- caseText：Case.name + Problem/Action/Result/Reflection.desc，CJK 分析器；导入后等待索引填充完成
+
 注意点：
 - 提交事务统一使用 g.commit(tx)（你的 py2neo 推荐用法，避免 DeprecationWarning）。
 - 指标分层“属于”关系用 py2neo 的 Relationship。
@@ -18,17 +21,19 @@ Neo4j 知识图谱导入（先清空再生成｜按你最新关系表｜Neo4j 4.
 - 增加表头“兜底映射”，轻微改列名也能正常导入。
 """
 
+import os
 import re
 import hashlib
 import pandas as pd
 from py2neo import Graph, Node, Relationship
 
 # ===== 0) 基本配置 =====
-NEO4J_URI  = "bolt://localhost:7687"
-NEO4J_AUTH = ("neo4j", "dsm123456")
+# 均可用环境变量覆盖（应用后台任务 core.jobs 即以此传入路径与连接参数）
+NEO4J_URI  = os.getenv("NEO4J_URI", "bolt://localhost:7687")
+NEO4J_AUTH = (os.getenv("NEO4J_USER", "neo4j"), os.getenv("NEO4J_PASS", "dsm123456"))
 
-INDICATOR_XLSX = r"C:\Users\刘航博\Desktop\评价指标的分布.xlsx"
-CASE_XLSX      = r"C:\Users\刘航博\Desktop\临床试验协调过程案例库（知识图谱版）.xlsx"
+INDICATOR_XLSX = os.getenv("INDICATOR_XLSX", r"C:\Users\刘航博\Desktop\评价指标的分布.xlsx")
+CASE_XLSX      = os.getenv("CASE_XLSX", r"C:\Users\刘航博\Desktop\临床试验协调过程案例库（知识图谱版）.xlsx")
 
 BATCH_SZ = 500
 
@@ -104,6 +109,40 @@ def create_constraints(db: Graph):
             else:
                 raise
 
+# 全文索引（名称与 app/core/fulltext.py 的 FULLTEXT_INDEX 一致）
+FULLTEXT_INDEX  = "caseText"
+FULLTEXT_LABELS = ["Case", "Problem", "Action", "Result", "Reflection"]
+FULLTEXT_PROPS  = ["name", "desc"]
+
+def drop_fulltext_index(db: Graph):
+    # Neo4j 4.x 用过程删除；5.x 起过程已移除（ProcedureNotFound），改用 DROP INDEX 语法
+    try:
+        db.run("CALL db.index.fulltext.drop($name)", name=FULLTEXT_INDEX)
+        return
+    except Exception as e:
+        msg = str(e).lower()
+        if ("no procedure" not in msg) and ("procedurenotfound" not in msg):
+            if ("exist" in msg) or ("no such" in msg) or ("not found" in msg):
+                return  # 索引本来就不存在
+            raise
+    db.run("DROP INDEX {} IF EXISTS".format(FULLTEXT_INDEX))
+
+def create_fulltext_index(db: Graph):
+    # Neo4j 4.3 用过程创建；5.x 起过程已移除，改用 CREATE FULLTEXT INDEX 语法
+    try:
+        db.run("CALL db.index.fulltext.createNodeIndex($name, $labels, $props, {analyzer: 'cjk'})",
+               name=FULLTEXT_INDEX, labels=FULLTEXT_LABELS, props=FULLTEXT_PROPS)
+        return
+    except Exception as e:
+        msg = str(e).lower()
+        if ("already" in msg) or ("equivalent" in msg):
+            return
+        if ("no procedure" not in msg) and ("not found" not in msg) and ("unknown" not in msg):
+            raise
+    db.run("CREATE FULLTEXT INDEX {} IF NOT EXISTS FOR (n:{}) ON EACH [{}] "
+           "OPTIONS {{indexConfig: {{`fulltext.analyzer`: 'cjk'}}}}".format(
+               FULLTEXT_INDEX, "|".join(FULLTEXT_LABELS), ", ".join("n." + p for p in FULLTEXT_PROPS)))
+
 def eval_one(db: Graph, q: str, title: str):
     try:
         val = db.run(q).evaluate()
@@ -154,14 +193,18 @@ if CLEAR_ALL_DATA:
     g.run("MATCH (n) DETACH DELETE n")
     print("✅ 清空完成。")
     if RESET_CONSTRAINTS:
-        print("⚠️ 正在重置唯一性约束...")
+        print("⚠️ 正在重置唯一性约束与全文索引...")
         drop_constraints(g)
         create_constraints(g)
+        drop_fulltext_index(g)
+        create_fulltext_index(g)
         print("✅ 约束已重置。")
     else:
         create_constraints(g)
+        create_fulltext_index(g)
 else:
     create_constraints(g)
+    create_fulltext_index(g)
 
 # ===== 4) 指标体系（Center/属于 层级）=====
 df_ind = pd.read_excel(INDICATOR_XLSX)
@@ -352,6 +395,13 @@ for _, row in df_cases.iterrows():
 g.commit(tx)
 print("✅ 案例库导入完成！")
 
+# 全文索引随写入自动填充；等待填充完成，应用侧即可直接查询
+try:
+    g.run("CALL db.awaitIndexes(600)")
+    print("✅ 全文索引 {} 已就绪。".format(FULLTEXT_INDEX))
+except Exception as e:
+    print("全文索引等待出错：{}".format(e))
+
 # ===== 6) 体检（DISTINCT 口径）=====
 print("\n📊 体检汇总（DISTINCT）")
 eval_one(g, "MATCH (n) RETURN count(n)", "节点总数")
@@ -360,6 +410,8 @@ eval_one(g, "MATCH (c:Case)-[:`对应`]->(:Indicator) RETURN count(DISTINCT c)",
 eval_one(g, "MATCH (i:Indicator {level:'待校验'}) RETURN count(i)", "待校验指标数量")
 eval_one(g, "MATCH (c:Case) WHERE NOT (c)-[:`对应`]->(:Indicator) RETURN count(c)", "未挂指标案例")
 eval_one(g, "MATCH (c:Case) WHERE NOT (c)-[:`处于`]->(:Stage) RETURN count(c)", "未挂阶段案例")
+eval_one(g, "CALL db.index.fulltext.queryNodes('{}', '签名') YIELD node RETURN count(node)".format(FULLTEXT_INDEX),
+         "全文索引试查“签名”命中")
 
 print("\n✅ 完成。可在 Neo4j Browser 检查：")
 print("  MATCH (c:Case)-[:`对应`]->(i:Indicator) RETURN c,i LIMIT 20;")
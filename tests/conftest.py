@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+"""测试与应用一样以 app/ 为根导入 core.*"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app"))
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+
+from core.answer_cache import AnswerCache
+
+
+def _log(path, key, version, answer):
+    rec = {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "q": "漏签怎么办", "a": answer, "key": key,
+           "version": version, "llm": {"status": "ok", "model": "m"}}
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def test_warm_does_not_restore_other_versions(tmp_path):
+    user_dir = tmp_path / "user_data" / "u1"
+    user_dir.mkdir(parents=True)
+    log = str(user_dir / "qa_log.jsonl")
+    _log(log, "k_old", "v1", "旧答案")
+    _log(log, "k_new", "v2", "新答案")
+
+    cache = AnswerCache(str(tmp_path / "cache.db"))
+    cache.purge(keep_version="v2")
+    assert cache.warm(str(tmp_path / "user_data"), version="v2") == 1
+    assert cache.get("k_new") == "新答案"
+    assert cache.get("k_old") is None
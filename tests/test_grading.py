@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+
+from core.grading import grade_batch, save_paper
+
+
+def _question(i, answer):
+    return {"idx": i, "qid": f"q{i}", "stem": f"题干{i}", "answer": answer,
+            "options": {k: f"选项{k}" for k in "ABCD"},
+            "meta": {"indicator_id": "1.1", "indicator_name": "指标", "phase": "进行阶段", "error_cats": []},
+            "explain": {"why_right": "", "how_to": [], "edge": "", "why_wrong": {}}}
+
+
+class FakeBank:
+    def paper(self, qids):
+        return [_question(i, "ABCDA"[i - 1]) for i, _ in enumerate(qids, 1)]
+
+
+def test_short_answer_sheet_keeps_every_question(tmp_path):
+    save_paper("P1", [f"q{i}" for i in range(1, 6)], papers_dir=str(tmp_path))
+    sheet = pd.DataFrame({"user_id": ["u1"], "paper_id": ["P1"], "1": ["A"], "2": ["B"], "3": ["D"]})
+    (g,) = grade_batch(sheet, ["1", "2", "3"], FakeBank(), papers_dir=str(tmp_path))
+    assert g["total"] == 5
+    assert g["score"] == 2
+    assert len(g["detail"]) == 5
+    assert [d["your_answer"] for d in g["detail"]] == ["A", "B", "D", None, None]
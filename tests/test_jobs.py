@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import Future
+
+from core.jobs import JobRunner
+
+
+class HoldPool:
+    """不执行任务的进程池替身：提交的任务一直停在排队状态"""
+
+    def submit(self, *a, **kw):
+        return Future()
+
+
+def _runner(tmp_path):
+    runner = JobRunner(db_path=str(tmp_path / "jobs.db"))
+    runner.pool.shutdown(wait=False)
+    runner.pool = HoldPool()
+    return runner
+
+
+def test_same_kind_same_params_is_deduped(tmp_path):
+    runner = _runner(tmp_path)
+    a = runner.submit("export", fmt="parquet", start="2025-01-01", indicator=None)
+    b = runner.submit("export", indicator=None, start="2025-01-01", fmt="parquet")
+    assert a == b
+    assert runner.active() == 1
+
+
+def test_different_params_get_their_own_job(tmp_path):
+    runner = _runner(tmp_path)
+    a = runner.submit("export", fmt="parquet", start=None, indicator=None)
+    b = runner.submit("export", fmt="xlsx", start=None, indicator=None)
+    c = runner.submit("export", fmt="parquet", start=None, indicator="5.2")
+    assert len({a, b, c}) == 3
+    assert runner.job(b)["params"]["fmt"] == "xlsx"
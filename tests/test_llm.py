@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from core.llm import ChatStream, LLMScheduler
+
+
+class SlowClient:
+    """每个提示词逐字吐出 text，每段之间等 delay 秒"""
+
+    def __init__(self, text="半截答案", delay=0.2):
+        self.text = text
+        self.delay = delay
+        self.calls = 0
+
+    def chat(self, model, messages, stream=False, **kw):
+        if not messages:  # warm_up
+            return {}
+        self.calls += 1
+
+        def gen():
+            for ch in self.text:
+                yield {"message": {"content": ch}}
+                time.sleep(self.delay)
+            yield {"done": True}
+        return gen()
+
+
+def test_retry_after_abandon_does_not_join_stopped_job():
+    client = SlowClient()
+    sched = LLMScheduler(concurrency=2, client=client)
+    a = ChatStream("p", scheduler=sched, first_token_timeout=5, total_timeout=0.1)
+    list(a)
+    assert a.stats["status"] == "total_timeout"
+
+    b = ChatStream("p", scheduler=sched, first_token_timeout=5, total_timeout=10)
+    assert b._job is not a._job
+    list(b)
+    assert b.ok and b.text == client.text
+    assert client.calls == 2
+
+
+def test_stopped_job_is_not_reported_ok():
+    client = SlowClient(delay=0.05)
+    sched = LLMScheduler(concurrency=1, client=client)
+    a = ChatStream("q", scheduler=sched)
+    it = iter(a)
+    next(it)
+    it.close()  # 唯一的读者离开：任务被叫停
+    job = a._job
+    deadline = time.time() + 5
+    while not job.done and time.time() < deadline:
+        time.sleep(0.01)
+    assert job.done and job.error is not None
+    assert len(job.pieces) < len(client.text)
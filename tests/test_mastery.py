@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from core.mastery import Mastery, project_mastery
+from core.store import ResultStore
+
+
+def _run(items):
+    return [{"index": i, "qid": f"q{i}", "your_answer": "A", "correct": "A" if ok else "B",
+             "indicator_id": iid, "indicator_name": "指标"} for i, (iid, ok) in enumerate(items, 1)]
+
+
+def test_projection_matches_stored_update(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    mastery = Mastery(store)
+    store.add_run("u", "r1", _run([("5.2.1", True), ("5.2.1", False), ("3.1", True)]), 2)
+    run2 = _run([("5.2.1", True), ("5.3", False), ("3.1", False)])
+    projected = project_mastery(mastery.as_dict("u"),
+                                [(r["indicator_id"], r["indicator_name"], r["your_answer"] == r["correct"]) for r in run2])
+    store.add_run("u", "r2", run2, 1)
+    stored = mastery.as_dict("u")
+    assert projected.keys() == stored.keys()
+    for k, m in stored.items():
+        assert projected[k]["attempts"] == m["attempts"]
+        assert projected[k]["correct"] == m["correct"]
+        assert abs(projected[k]["score"] - m["score"]) < 1e-12
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import json
+
+from core.store import ResultStore, migrate_files
+
+
+def _write_run(user_data, uid, run_id, detail):
+    d = user_data / uid / "results_runs"
+    d.mkdir(parents=True, exist_ok=True)
+    (d / f"run_{run_id}.json").write_text(json.dumps(detail, ensure_ascii=False), encoding="utf-8")
+
+
+def test_legacy_keys_are_normalised_and_unscorable_rows_skipped(tmp_path):
+    user_data = tmp_path / "user_data"
+    _write_run(user_data, "u1", "20240101_120000", [
+        {"题号": 1, "你的答案": "a", "正确答案": "A", "indicator_id": "1.1"},
+        {"题号": 2, "你的答案": None, "正确答案": "B"},
+        {"题号": 3},  # 无正确答案：无法判分
+    ])
+    _write_run(user_data, "u1", "20240102_120000", [{"题号": 1}])
+    store = ResultStore(str(tmp_path / "results.db"))
+    skipped = []
+    assert migrate_files(store, str(user_data), skipped=skipped) == 1
+    assert len(skipped) == 2
+
+    runs = store.list_runs("u1")
+    assert runs["score"].tolist() == [1] and runs["total"].tolist() == [2]
+    rows = [tuple(r) for r in store.conn().execute("SELECT idx, your_answer, correct, is_correct FROM answers ORDER BY idx")]
+    assert rows == [(1, "A", "A", 1), (2, None, "B", 0)]
+
+
+def test_missing_answers_never_count_as_correct(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    store.add_run("u", "r1", [{"index": 1, "qid": "q1", "your_answer": None, "correct": None}], 0)
+    assert store.conn().execute("SELECT is_correct FROM answers").fetchone()[0] == 0
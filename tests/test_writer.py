@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from core.store import ResultStore
+from core.writer import BackgroundWriter
+
+
+def _detail(indicator="1.1"):
+    return [{"index": 1, "qid": "q1", "your_answer": "A", "correct": "A",
+             "indicator_id": indicator, "indicator_name": "指标"}]
+
+
+def test_bad_run_is_isolated_and_dead_lettered(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    writer = BackgroundWriter(dead_letter=str(tmp_path / "dead.jsonl"))
+    writer.add_run(store, "u", "r1", _detail(), 1)
+    writer.add_run(store, "u", "r2", _detail(indicator=object()), 1)  # SQLite 绑定不了：这一条失败
+    writer.add_run(store, "u", "r3", _detail(), 1)
+    assert writer.flush(5)
+    assert store.list_runs("u")["run_id"].tolist() == ["r1", "r3"]  # 同批其他测评照常提交
+    assert writer.dead_letters() == 1
+    assert writer.errors
+
+    assert writer.retry(store) == 1  # 死信里是 JSON 化后的载荷，可以写入
+    assert writer.dead_letters() == 0
+    assert sorted(store.list_runs("u")["run_id"]) == ["r1", "r2", "r3"]
+    writer.close()
+
+
+def test_failed_jsonl_append_is_dead_lettered(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    writer = BackgroundWriter(dead_letter=str(tmp_path / "dead.jsonl"))
+    writer.append_jsonl(str(blocker / "qa_log.jsonl"), {"q": "问题"})
+    assert writer.flush(5)
+    assert writer.dead_letters() == 1
+    writer.close()